@@ -0,0 +1,26 @@
+"""
+Admin access for operational endpoints (profiling, diagnostics).
+
+There are no admin accounts as such: the student IDs listed in
+ADMIN_STUDENT_IDS are admins.
+"""
+
+from functools import wraps
+
+from flask import current_app, jsonify
+from flask_login import current_user
+
+def is_admin(user):
+    """True if ``user`` is logged in and listed in ADMIN_STUDENT_IDS"""
+    if not getattr(user, 'is_authenticated', False):
+        return False
+    return user.student_id in current_app.config.get('ADMIN_STUDENT_IDS', ())
+
+def admin_required(f):
+    """Reject non-admins with a JSON 403 (use below @login_required)"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not is_admin(current_user):
+            return jsonify({'error': 'Admin access required'}), 403
+        return f(*args, **kwargs)
+    return decorated
@@ -1,182 +1,114 @@
 # ============================================================================
-# EVENTLET MONKEY PATCH - IMPROVED HANDLING
+# THRIFTIT APPLICATION
 # ============================================================================
+# Importing this module only defines the routes, models and helpers.
+# All configuration, optional integrations (eventlet, Cloudinary) and the
+# Socket.IO server are set up inside create_app(), so gunicorn workers and
+# scripts that only need the models pay nothing at import time.
 import os
-import sys
+import math
 
-# Check if we're in production and apply eventlet patch appropriately
-def setup_eventlet():
-    """Setup eventlet with proper error handling"""
-    try:
-        # Only patch if we're not already patched and we're in production
-        if not hasattr(sys.modules.get('socket', {}), '_original_socket'):
-            import eventlet
-            eventlet.monkey_patch()
-            print("🔧 Eventlet monkey patch applied successfully")
-            return True
-    except ImportError:
-        print("⚠️  Eventlet not available, falling back to threading mode")
-        return False
-    except Exception as e:
-        print(f"⚠️  Eventlet patch failed: {e}, falling back to threading mode")
-        return False
-    
-    return True
-
-# Apply eventlet patch
-eventlet_available = setup_eventlet()
-
-from flask import Flask, render_template, request, redirect, url_for, send_from_directory, flash, jsonify
-from flask_sqlalchemy import SQLAlchemy
-from flask_socketio import SocketIO, join_room, emit, send
-from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from werkzeug.utils import secure_filename
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
-import secrets
+from flask import Flask, Blueprint, render_template, request, redirect, url_for, send_from_directory, flash, jsonify, session, current_app
+from flask_socketio import join_room, emit, send, ConnectionRefusedError
+from flask_login import login_user, logout_user, login_required, current_user
+from datetime import datetime
 import logging
 
-# Cloudinary imports
-import cloudinary
-import cloudinary.uploader
-import cloudinary.utils
-
-# Load environment variables
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except ImportError:
-    print("python-dotenv not installed. Install with: pip install python-dotenv")
-
-app = Flask(__name__)
+from config import config
+from eventlet_setup import eventlet_available
+from extensions import db, socketio, login_manager
+from models import Product, User, Message, Wishlist, SavedSearch
+from storage import init_image_store, get_image_store
+from image_dedup import store_image, release_image
+from product_feed import CATEGORIES, publish_product_insert, publish_product_delete
+from user_search import search_users, index_user, ensure_search_indexes
+from cache import cache, newest_products, site_stats, invalidate_products, init_cache
+from invalidation import bus as invalidation_bus, init_invalidation
+from scheduler import start_scheduler, job_status
+from message_archive import archived_conversation, has_archived, latest_archived, ensure_archive_schema
+from listings import soft_delete_products, relist_products, ensure_listing_schema, init_listings, MAX_BULK_IDS
+from presence import (registry as presence, feed_registry, fanout as presence_fanout, init_presence, load_contacts,
+                      user_room, ConnectionLimitError)
+from recommendations import related_products
+from popularity import activity, trending_products
+from saved_searches import (save_search, saved_search_changed, notify_matches, search_filters, describe,
+                            percolator_stats, newest_listing_id, unseen_matches, mark_seen)
+from projections import product_cards, wishlist_cards, seller_listing_cards
+from facets import ProductFilters, facet_counts, CONDITIONS
+from rate_limit import limiter, rate_limit, socket_rate_limit, init_rate_limiter, client_ip
+from serialization import init_serialization, socketio_serializer, socket_timestamp
+from admin import admin_required
+from profiling import init_profiler, issue_profile_token, memory_report, start_memory_baseline, stop_memory_tracing
+from slow_queries import slow_queries, init_slow_query_log
+from lifecycle import lifecycle
+from outbox import outbox, init_outbox
+
+main = Blueprint('main', __name__)
 
 # ============================================================================
-# SECURITY CONFIGURATION - UPDATED
+# OPTIONAL INTEGRATIONS
 # ============================================================================
 
-# Secure secret key configuration
-SECRET_KEY = os.environ.get('SECRET_KEY')
-if not SECRET_KEY:
-    # Generate a random key if not set (for development only)
-    SECRET_KEY = secrets.token_urlsafe(32)
-    print("⚠️  WARNING: Using auto-generated secret key. Set SECRET_KEY environment variable for production!")
-
-app.secret_key = SECRET_KEY
-
-def get_database_url():
-    database_url = os.environ.get('DATABASE_URL', 'sqlite:///products.db')
-    # Handle postgres:// vs postgresql:// issue for Render
-    if database_url.startswith("postgres://"):
-        database_url = database_url.replace("postgres://", "postgresql://", 1)
-    return database_url
-
-# Enhanced security configuration
-app.config.update(
-    # File upload security
-    MAX_CONTENT_LENGTH=5 * 1024 * 1024,  # 5MB max file size
-    
-    # Session security
-    PERMANENT_SESSION_LIFETIME=timedelta(days=7),
-    SESSION_COOKIE_SECURE=os.environ.get('FLASK_ENV') == 'production',
-    SESSION_COOKIE_HTTPONLY=True,
-    SESSION_COOKIE_SAMESITE='Lax',
-    
-    # Database configuration with PostgreSQL URL fix
-    SQLALCHEMY_DATABASE_URI=get_database_url(),
-    SQLALCHEMY_TRACK_MODIFICATIONS=False,
-)
-
-# File upload configuration - Production ready
-if os.environ.get('RENDER') or os.environ.get('FLASK_ENV') == 'production':
-    # On Render and other cloud platforms, use /tmp directory
-    app.config["UPLOAD_FOLDER"] = "/tmp/uploads"
-    print("📁 Using production upload folder: /tmp/uploads")
-else:
-    # Local development - use uploads folder in project
-    app.config["UPLOAD_FOLDER"] = os.path.join(app.root_path, "uploads")
-    print(f"📁 Using development upload folder: {app.config['UPLOAD_FOLDER']}")
-
-# Create the upload directory
-os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
-
-# ============================================================================
-# CLOUDINARY CONFIGURATION
-# ============================================================================
-
-# Configure Cloudinary
-if os.environ.get('CLOUDINARY_CLOUD_NAME'):
-    cloudinary.config(
-        cloud_name=os.environ.get('CLOUDINARY_CLOUD_NAME'),
-        api_key=os.environ.get('CLOUDINARY_API_KEY'),
-        api_secret=os.environ.get('CLOUDINARY_API_SECRET'),
-        secure=True
-    )
-    print("✅ Cloudinary configured successfully")
-    print(f"   Cloud Name: {os.environ.get('CLOUDINARY_CLOUD_NAME')}")
-else:
-    print("⚠️ Cloudinary credentials not found, using local storage")
+def cloudinary_configured():
+    """Return True when Cloudinary credentials are configured"""
+    return bool(current_app.config.get('CLOUDINARY_CLOUD_NAME'))
 
 # ============================================================================
 # SOCKET.IO CONFIGURATION WITH IMPROVED ERROR HANDLING
 # ============================================================================
 
-def create_socketio():
-    """Create SocketIO instance with fallback configurations"""
-    is_production = os.environ.get('FLASK_ENV') == 'production'
-    
-    # Configuration options
+def init_socketio(app):
+    """Bind the Socket.IO server to ``app``, falling back to threading mode"""
     base_config = {
         'cors_allowed_origins': "*",
         'logger': False,  # Disable to reduce noise
         'engineio_logger': False,
-        'ping_timeout': 60,
-        'ping_interval': 25
+        'transports': app.config['SOCKETIO_TRANSPORTS'],
+        'ping_timeout': app.config['SOCKETIO_PING_TIMEOUT'],
+        'ping_interval': app.config['SOCKETIO_PING_INTERVAL'],
+        'http_compression': app.config['SOCKETIO_HTTP_COMPRESSION'],
+        'compression_threshold': app.config['SOCKETIO_COMPRESSION_THRESHOLD'],
+        'max_http_buffer_size': app.config['SOCKETIO_MAX_HTTP_BUFFER_SIZE'],
+        'serializer': socketio_serializer(app)
     }
+    if app.config.get('SOCKETIO_MESSAGE_QUEUE'):
+        base_config['message_queue'] = app.config['SOCKETIO_MESSAGE_QUEUE']
+    
+    preferred = app.config.get('SOCKETIO_ASYNC_MODE', 'threading')
+    if preferred == 'eventlet' and not eventlet_available():
+        app.logger.warning("⚠️  Eventlet not installed, falling back to threading mode")
+        preferred = 'threading'
     
-    # Try eventlet first if available
-    if eventlet_available and is_production:
+    modes = [preferred] if preferred == 'threading' else [preferred, 'threading']
+    for mode in modes:
         try:
-            socketio = SocketIO(app, async_mode='eventlet', **base_config)
-            print("🔌 Socket.IO initialized with eventlet for production")
+            socketio.init_app(app, async_mode=mode, **base_config)
+            app.logger.info(f"🔌 Socket.IO initialized with {mode}")
             return socketio
         except Exception as e:
-            print(f"⚠️  Eventlet SocketIO failed: {e}")
+            app.logger.warning(f"⚠️  {mode} SocketIO failed: {e}")
     
-    # Fallback to gevent
-    try:
-        socketio = SocketIO(app, async_mode='gevent', **base_config)
-        print("🔌 Socket.IO initialized with gevent (fallback)")
-        return socketio
-    except Exception as e:
-        print(f"⚠️  Gevent SocketIO failed: {e}")
-    
-    # Final fallback to threading
-    try:
-        socketio = SocketIO(app, async_mode='threading', **base_config)
-        print("🔌 Socket.IO initialized with threading (final fallback)")
-        return socketio
-    except Exception as e:
-        print(f"❌ All SocketIO modes failed: {e}")
-        raise
-
-# Create SocketIO instance
-socketio = create_socketio()
-
-db = SQLAlchemy(app)
-
-login_manager = LoginManager()
-login_manager.login_view = 'login'
-login_manager.init_app(app)
-
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
+    raise RuntimeError("All SocketIO modes failed")
+
+def socketio_client_options(app):
+    """Connection options handed to the browser Socket.IO clients"""
+    transports = app.config['SOCKETIO_TRANSPORTS']
+    options = {
+        'transports': transports,
+        # Only try upgrading when the connection starts on polling
+        'upgrade': transports[0] == 'polling' and 'websocket' in transports,
+        'rememberUpgrade': True
+    }
+    if socketio_serializer(app) == 'msgpack':
+        # Pages load static/socketio_msgpack.js and pass it as the parser
+        options['msgpack'] = True
+    return options
 
 # ============================================================================
 # SECURITY VALIDATION FUNCTION
 # ============================================================================
 
-def validate_security_config():
+def validate_security_config(app):
     """
     Validate that security configuration is properly set
     """
@@ -218,6 +150,7 @@ def validate_security_config():
         else:
             app.logger.info(f"   - Upload Folder: ✓ {upload_folder}")
 
+
 # ============================================================================
 # ENHANCED FILE UPLOAD SECURITY
 # ============================================================================
@@ -300,72 +233,12 @@ def validate_password(password):
         return False, "Password is too long"
     return True, password
 
-# ============================================================================
-# DATABASE MODELS
-# ============================================================================
-
-class Product(db.Model):
-    id             = db.Column(db.Integer, primary_key=True)
-    name           = db.Column(db.String(100), nullable=False)
-    price          = db.Column(db.Float, nullable=False)
-    image          = db.Column(db.String(500), nullable=False)  # Increased length for URLs
-    description    = db.Column(db.Text, nullable=True)
-    category       = db.Column(db.String(50), nullable=False)
-    condition      = db.Column(db.String(50), nullable=False)
-    multiple_items = db.Column(db.Boolean, default=False)
-    seller_id      = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    
-    # Relationship to User (seller)
-    seller = db.relationship('User', backref=db.backref('products', lazy=True))
-
-class User(db.Model, UserMixin):
-    id            = db.Column(db.Integer, primary_key=True)
-    student_id    = db.Column(db.String(50), unique=True, nullable=False)
-    student_email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(255), nullable=False)  # Increased from 128 to 255
-    full_name     = db.Column(db.String(100), nullable=True)
-    profile_picture = db.Column(db.String(500), nullable=True, default='default-avatar.png')  # Increased for URLs
-    messages_sent     = db.relationship('Message', foreign_keys='Message.sender_id', backref='sender', lazy='dynamic')
-    messages_received = db.relationship('Message', foreign_keys='Message.receiver_id', backref='receiver', lazy='dynamic')
-
-    def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
-
-    def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
-    
-    def get_profile_picture(self):
-        """Return the profile picture filename or default"""
-        return self.profile_picture if self.profile_picture else 'default-avatar.png'
-    
-    def get_display_name(self):
-        """Return full name if available, otherwise student ID"""
-        return self.full_name if self.full_name else self.student_id
-
-class Message(db.Model):
-    id          = db.Column(db.Integer, primary_key=True)
-    content     = db.Column(db.Text, nullable=False)
-    timestamp   = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    sender_id   = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    receiver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-
-class Wishlist(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
-    date_added = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    
-    # Relationships
-    user = db.relationship('User', backref=db.backref('wishlist_items', lazy=True))
-    product = db.relationship('Product', backref=db.backref('wishlisted_by', lazy=True))
-    
-    # Ensure a user can't add the same product twice
-    __table_args__ = (db.UniqueConstraint('user_id', 'product_id', name='unique_user_product'),)
 
 # ============================================================================
 # AUTHENTICATION ROUTES - ENHANCED WITH VALIDATION
 # ============================================================================
-@app.route('/login', methods=['GET', 'POST'])
+@main.route('/login', methods=['GET', 'POST'])
+@rate_limit('login_ip', key='ip', methods=('POST',))
 def login():
     if request.method == 'POST':
         sid = request.form.get('student_id', '').strip()
@@ -376,17 +249,25 @@ def login():
             flash('Please fill in all fields.', 'error')
             return render_template('login.html')
         
-        # Rate limiting could be added here
+        # Per-account bucket on top of the per-IP one, so one address can't
+        # spend its whole budget guessing a single student ID. Keyed by the
+        # address too: bad passwords from elsewhere can't lock the owner out.
+        allowed, retry_after = limiter.hit('login_account', f"{client_ip()}:{sid.lower()}")
+        if not allowed:
+            flash(f'Too many login attempts for this account. Try again in {math.ceil(retry_after)} seconds.', 'error')
+            return render_template('login.html'), 429
+
         user = User.query.filter_by(student_id=sid).first()
         if user and user.check_password(pwd):
             login_user(user)
             flash('Logged in successfully.', 'success')
-            return redirect(url_for('home'))
+            return redirect(url_for('main.home'))
         else:
             flash('Invalid Student ID or password.', 'error')
     return render_template('login.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@main.route('/register', methods=['GET', 'POST'])
+@rate_limit('register', key='ip', methods=('POST',))
 def register():
     if request.method == 'POST':
         sid = request.form.get('student_id', '').strip()
@@ -422,76 +303,78 @@ def register():
             new_user.set_password(pwd)
             db.session.add(new_user)
             db.session.commit()
+            index_user(new_user)
             flash('Registration successful! Please log in.', 'success')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         except Exception as e:
             db.session.rollback()
-            app.logger.error(f"Registration error: {str(e)}")
+            current_app.logger.error(f"Registration error: {str(e)}")
             flash('Registration failed. Please try again.', 'error')
     
     return render_template('login.html')
 
-@app.route('/logout')
+@main.route('/logout')
 @login_required
 def logout():
     logout_user()
     session.pop('_flashes', None)
     flash('You have been logged out.', 'info')
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
 # ============================================================================
 # APPLICATION ROUTES - ENHANCED WITH ERROR HANDLING
 # ============================================================================
     
-@app.route('/')
+@main.route('/')
 @login_required
 def home():
     try:
-        # grab the latest 4 products
-        featured_items = Product.query.order_by(Product.id.desc()).limit(4).all()
-        return render_template("home.html", featured_items=featured_items)
+        # the latest 4 products, kept warm by the cache_warmup job
+        featured_items = newest_products()
+        # the most viewed and wishlisted lately, rescored by the trending_refresh job
+        trending_items = trending_products()
+        return render_template("home.html", featured_items=featured_items, trending_items=trending_items)
     except Exception as e:
-        app.logger.error(f"Home page error: {str(e)}")
+        current_app.logger.error(f"Home page error: {str(e)}")
         flash('Error loading homepage. Please try again.', 'error')
-        return render_template("home.html", featured_items=[])
+        return render_template("home.html", featured_items=[], trending_items=[])
 
-@app.route("/products")
+@main.route("/products")
 @login_required
 def products():
     try:
-        # grab search **and** category query-params
-        search = request.args.get("q", "").strip()
-        category = request.args.get("category", "").strip()
-
-        # start building the base query
-        qry = Product.query
-
-        # filter by category if provided
-        if category:
-            qry = qry.filter_by(category=category)
+        filters = ProductFilters.from_args(request.args)
 
-        # filter by name search if provided
-        if search:
-            # Sanitize search input
-            search = search[:100]  # Limit search length
-            qry = qry.filter(Product.name.ilike(f"%{search}%"))
+        # deleted listings are never shown; cards carry only the columns the grid renders
+        products = product_cards(filters.apply(Product.live()).order_by(Product.id.desc()))
 
-        # finally, order & execute
-        products = qry.order_by(Product.id.desc()).all()
+        # saved-search matches listed while this user wasn't looking; shown once
+        newest_id = newest_listing_id()
+        match_alerts = unseen_matches(current_user.id, newest_id)
+        if match_alerts:
+            mark_seen(current_user.id, newest_id)
+            db.session.commit()
 
         return render_template(
             "products.html",
             products=products,
-            search=search,
-            active_category=category
+            search=filters.search,
+            active_category=filters.category,
+            filters=filters,
+            facets=facet_counts(filters),
+            conditions=CONDITIONS,
+            match_alerts=match_alerts
         )
     except Exception as e:
-        app.logger.error(f"Products page error: {str(e)}")
+        db.session.rollback()
+        current_app.logger.error(f"Products page error: {str(e)}")
         flash('Error loading products. Please try again.', 'error')
-        return render_template("products.html", products=[], search="", active_category="")
+        return render_template("products.html", products=[], search="", active_category="",
+                               filters=ProductFilters(), facets=None, conditions=CONDITIONS, match_alerts=[])
 
-@app.route("/upload", methods=["GET", "POST"])
+@main.route("/upload", methods=["GET", "POST"])
 @login_required
+@rate_limit('upload', methods=('POST',))
 def upload():
     if request.method == "POST":
         try:
@@ -515,7 +398,7 @@ def upload():
                 flash(price_result, 'error')
                 return render_template("upload.html")
             
-            if not category or category not in ['Books', 'Tech', 'Clothes', 'Others']:
+            if not category or category not in CATEGORIES:
                 flash('Please select a valid category.', 'error')
                 return render_template("upload.html")
             
@@ -525,34 +408,9 @@ def upload():
                 flash(file_msg, 'error')
                 return render_template("upload.html")
             
-            # Handle image upload (existing code)
-            image_url = None
-            
-            if os.environ.get('CLOUDINARY_CLOUD_NAME'):
-                try:
-                    upload_result = cloudinary.uploader.upload(
-                        image,
-                        folder="thriftit/products",
-                        transformation=[
-                            {"width": 800, "height": 600, "crop": "limit"},
-                            {"quality": "auto:good"}
-                        ],
-                        resource_type="image"
-                    )
-                    image_url = upload_result['secure_url']
-                    print(f"✅ Image uploaded to Cloudinary: {image_url}")
-                    
-                except Exception as e:
-                    print(f"⚠️ Cloudinary upload failed: {str(e)}")
-                    image_url = None
-            
-            if not image_url:
-                filename = secure_filename(image.filename)
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-                filename = timestamp + filename
-                image.save(os.path.join(app.config["UPLOAD_FOLDER"], filename))
-                image_url = filename
-                print(f"📁 Image saved locally: {filename}")
+            # Store the image with the configured backend (local disk, Cloudinary or S3);
+            # identical photos are stored once and shared between listings
+            image_url, similar_images = store_image(image, 'products')
             
             # Handle rental availability in description
             # Since we're repurposing multiple_items field, we store rental info in description
@@ -576,21 +434,40 @@ def upload():
             db.session.add(new_product)
             db.session.commit()
             
+            # Push the new listing to open product grids for this category
+            publish_product_insert(new_product)
+            invalidate_products(new_product.id)
+            
+            # Tell students whose saved searches it matches
+            try:
+                notify_matches(new_product)
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.error(f"Saved search matching error: {str(e)}")
+            
             if available_for_rental:
                 flash('Product uploaded successfully! Your item is now available for both purchase and rental.', 'success')
             else:
                 flash('Product uploaded successfully!', 'success')
+            
+            if similar_images:
+                similar_names = [p.name for p in Product.live().filter(
+                    Product.image.in_(similar_images), Product.id != new_product.id
+                ).limit(3)]
+                if similar_names:
+                    flash('Heads up: this photo looks almost identical to the one used for '
+                          + ', '.join(f'"{n}"' for n in similar_names) + '.', 'warning')
                 
-            return redirect(url_for("products"))
+            return redirect(url_for("main.products"))
             
         except Exception as e:
             db.session.rollback()
-            app.logger.error(f"Upload error: {str(e)}")
+            current_app.logger.error(f"Upload error: {str(e)}")
             flash('Error uploading product. Please try again.', 'error')
     
     return render_template("upload.html")
 
-@app.route("/uploads/<path:filename>")
+@main.route("/uploads/<path:filename>")
 @login_required
 def uploads(filename):
     # If filename is a full URL (Cloudinary), redirect to it
@@ -600,40 +477,43 @@ def uploads(filename):
     # Security: Validate filename for local files
     if '..' in filename or '/' in filename or '\\' in filename:
         flash('Invalid file request.', 'error')
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
     
     try:
-        return send_from_directory(app.config["UPLOAD_FOLDER"], filename)
+        return send_from_directory(current_app.config["UPLOAD_FOLDER"], filename)
     except FileNotFoundError:
         flash('File not found.', 'error')
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
 
-@app.route("/product/<int:product_id>")
+@main.route("/product/<int:product_id>")
 @login_required
 def product_detail(product_id):
     try:
-        product = Product.query.get_or_404(product_id)
-        recent_products = Product.query.order_by(Product.id.desc()).limit(10).all()
+        product = Product.live().filter_by(id=product_id).first_or_404()
+        recent_products = related_products(product, limit=current_app.config.get('RECOMMENDATIONS_TOP_K', 10))
         
         # Check if current user is the seller
         is_own_product = (product.seller_id == current_user.id)
+        if not is_own_product:
+            activity.view(product.id, current_user.id)
         
         return render_template("product_detail.html", 
                              product=product, 
                              recent_products=recent_products,
                              is_own_product=is_own_product)
     except Exception as e:
-        app.logger.error(f"Product detail error: {str(e)}")
+        current_app.logger.error(f"Product detail error: {str(e)}")
         flash('Error loading product details.', 'error')
-        return redirect(url_for('products'))
+        return redirect(url_for('main.products'))
     
-@app.route('/api/products/delete/<int:product_id>', methods=['DELETE'])
+@main.route('/api/products/delete/<int:product_id>', methods=['DELETE'])
 @login_required
+@rate_limit('bulk_listing')
 def delete_product(product_id):
     """API endpoint to delete a user's product"""
     try:
         # Get the product
-        product = Product.query.get_or_404(product_id)
+        product = Product.live().filter_by(id=product_id).first_or_404()
         
         # Check if the current user owns this product
         if product.seller_id != current_user.id:
@@ -642,16 +522,17 @@ def delete_product(product_id):
                 'message': 'You can only delete your own products'
             }), 403
         
-        # Remove from wishlists first (to avoid foreign key constraints)
-        Wishlist.query.filter_by(product_id=product_id).delete()
-        
-        # Store product name for success message
         product_name = product.name
         
-        # Delete the product
-        db.session.delete(product)
+        # Soft delete: wishlist rows and the image are cleaned up by the
+        # purge_deleted_products job once the relist window has passed
+        deleted = soft_delete_products(current_user.id, [product_id])
         db.session.commit()
         
+        for deleted_id, category in deleted:
+            publish_product_delete(deleted_id, category)
+        invalidate_products(*(deleted_id for deleted_id, _ in deleted))
+        
         return jsonify({
             'success': True,
             'message': f'"{product_name}" has been deleted successfully'
@@ -659,42 +540,112 @@ def delete_product(product_id):
         
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f"Error deleting product {product_id}: {str(e)}")
+        current_app.logger.error(f"Error deleting product {product_id}: {str(e)}")
         return jsonify({
             'success': False,
             'message': 'Error deleting product. Please try again.'
         }), 500
 
-@app.route("/chat_with_seller/<int:product_id>")
+def _requested_product_ids():
+    """Validate the ``ids`` list of a bulk listing request"""
+    ids = (request.get_json(silent=True) or {}).get('ids')
+    if not isinstance(ids, list) or not ids:
+        return None
+    try:
+        return {int(i) for i in ids[:MAX_BULK_IDS]}
+    except (TypeError, ValueError):
+        return None
+
+@main.route('/api/products/bulk_delete', methods=['POST'])
+@login_required
+@rate_limit('bulk_listing')
+def bulk_delete_products():
+    """Soft-delete several of the current user's listings in one statement"""
+    ids = _requested_product_ids()
+    if ids is None:
+        return jsonify({'success': False, 'message': 'Provide a list of product ids'}), 400
+    try:
+        deleted = soft_delete_products(current_user.id, ids)
+        db.session.commit()
+        
+        for deleted_id, category in deleted:
+            publish_product_delete(deleted_id, category)
+        invalidate_products(*(deleted_id for deleted_id, _ in deleted))
+        
+        return jsonify({
+            'success': True,
+            'deleted': [deleted_id for deleted_id, _ in deleted],
+            'message': f'{len(deleted)} listing(s) deleted'
+        })
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Bulk delete error: {str(e)}")
+        return jsonify({'success': False, 'message': 'Error deleting products. Please try again.'}), 500
+
+@main.route('/api/products/relist', methods=['POST'])
+@login_required
+@rate_limit('bulk_listing')
+def relist():
+    """Restore deleted listings that haven't been purged yet"""
+    ids = _requested_product_ids()
+    if ids is None:
+        return jsonify({'success': False, 'message': 'Provide a list of product ids'}), 400
+    try:
+        products = relist_products(current_user.id, ids)
+        db.session.commit()
+        
+        for product in products:
+            publish_product_insert(product)
+        invalidate_products(*(product.id for product in products))
+        
+        return jsonify({
+            'success': True,
+            'relisted': [p.id for p in products],
+            'message': f'{len(products)} listing(s) relisted'
+        })
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Relist error: {str(e)}")
+        return jsonify({'success': False, 'message': 'Error relisting products. Please try again.'}), 500
+
+@main.route("/chat_with_seller/<int:product_id>")
 @login_required
 def chat_with_seller(product_id):
     try:
-        product = Product.query.get_or_404(product_id)
+        product = Product.live().filter_by(id=product_id).first_or_404()
         
         # Check if user is trying to chat with themselves
         if product.seller_id == current_user.id:
             flash("You cannot chat with yourself about your own product!", "warning")
-            return redirect(url_for('product_detail', product_id=product_id))
+            return redirect(url_for('main.product_detail', product_id=product_id))
         
         # Redirect to chat with the seller
-        return redirect(url_for('chat', user_id=product.seller_id))
+        return redirect(url_for('main.chat', user_id=product.seller_id))
     except Exception as e:
-        app.logger.error(f"Chat with seller error: {str(e)}")
+        current_app.logger.error(f"Chat with seller error: {str(e)}")
         flash('Error starting chat.', 'error')
-        return redirect(url_for('products'))
+        return redirect(url_for('main.products'))
 
-@app.route("/send_message", methods=["GET"])
+@main.route("/send_message", methods=["GET"])
 @login_required
 def send_message():
+    # Recipients are looked up on demand through /api/users/search
+    return render_template("send_message.html")
+
+@main.route("/api/users/search")
+@login_required
+@rate_limit('search')
+def api_search_users():
+    """Typeahead lookup by student ID, name or email prefix"""
     try:
-        users = User.query.filter(User.id != current_user.id).all()
-        return render_template("send_message.html", users=users)
+        query = request.args.get('q', '')
+        limit = request.args.get('limit', 8, type=int)
+        return jsonify(search_users(query, limit=limit, exclude_id=current_user.id))
     except Exception as e:
-        app.logger.error(f"Send message error: {str(e)}")
-        flash('Error loading users.', 'error')
-        return render_template("send_message.html", users=[])
+        current_app.logger.error(f"User search error: {str(e)}")
+        return jsonify({'error': 'Error searching users'}), 500
 
-@app.route("/inbox")
+@main.route("/inbox")
 @login_required
 def inbox():
     try:
@@ -710,6 +661,10 @@ def inbox():
                 ((Message.sender_id == user.id) & (Message.receiver_id == current_user.id))
             ).order_by(Message.timestamp.desc()).first()
             
+            if not last_message:
+                # Older conversations may only have archived messages
+                last_message = latest_archived(current_user.id, user.id)
+            
             if last_message:
                 conversations.append({
                     'user': user,
@@ -731,75 +686,89 @@ def inbox():
         
         return render_template("inbox.html", conversations=conversations)
     except Exception as e:
-        app.logger.error(f"Inbox error: {str(e)}")
+        current_app.logger.error(f"Inbox error: {str(e)}")
         flash('Error loading inbox.', 'error')
         return render_template("inbox.html", conversations=[])
 
-@app.route("/api/conversations/<int:user_id>")
+@main.route("/api/conversations/<int:user_id>")
 @login_required
+@rate_limit('api')
 def get_conversation(user_id):
     try:
         # Validate user_id
         if user_id == current_user.id:
             return jsonify({'error': 'Cannot get conversation with yourself'}), 400
         
-        # Get all messages between current_user and the specified user
-        messages = Message.query.filter(
-            ((Message.sender_id == current_user.id) & (Message.receiver_id == user_id)) |
-            ((Message.sender_id == user_id) & (Message.receiver_id == current_user.id))
-        ).order_by(Message.timestamp).all()
-        
-        message_list = []
-        for msg in messages:
-            message_list.append({
-                'id': msg.id,
-                'content': msg.content,
-                'timestamp': msg.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-                'is_sender': msg.sender_id == current_user.id,
-                'sender_name': msg.sender.student_id
-            })
-        
-        return jsonify(message_list)
+        before_id = request.args.get('before_id', type=int)
+        if before_id is not None:
+            # Scrolling back past the live window: page through the archive
+            limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+            messages = archived_conversation(current_user.id, user_id, before_id, limit)
+            has_older = len(messages) == limit
+        else:
+            # Get all live messages between current_user and the specified user
+            messages = Message.query.filter(
+                ((Message.sender_id == current_user.id) & (Message.receiver_id == user_id)) |
+                ((Message.sender_id == user_id) & (Message.receiver_id == current_user.id))
+            ).order_by(Message.timestamp).all()
+            has_older = has_archived(current_user.id, user_id)
+        
+        # Only two people write in a conversation, so names come from one
+        # lookup rather than a query per message. Timestamps are left as
+        # datetimes for the JSON provider to encode.
+        other = User.query.get(user_id)
+        names = {current_user.id: current_user.student_id, user_id: other.student_id if other else 'User'}
+        message_list = [{
+            'id': msg.id,
+            'content': msg.content,
+            'timestamp': msg.timestamp,
+            'is_sender': msg.sender_id == current_user.id,
+            'sender_name': names.get(msg.sender_id, 'User')
+        } for msg in messages]
+        
+        response = jsonify(message_list)
+        # Tells the chat page whether "Load earlier messages" has anything to fetch
+        response.headers['X-Has-Older'] = 'true' if has_older else 'false'
+        return response
     except Exception as e:
-        app.logger.error(f"Get conversation error: {str(e)}")
+        current_app.logger.error(f"Get conversation error: {str(e)}")
         return jsonify({'error': 'Error loading conversation'}), 500
 
-@app.route("/chat/<int:user_id>")
+@main.route("/chat/<int:user_id>")
 @login_required
 def chat(user_id):
     try:
         if user_id == current_user.id:
             flash("You cannot chat with yourself!", "warning")
-            return redirect(url_for('inbox'))
+            return redirect(url_for('main.inbox'))
         
         other_user = User.query.get_or_404(user_id)
         return render_template("chat.html", other_user=other_user)
     except Exception as e:
-        app.logger.error(f"Chat error: {str(e)}")
+        current_app.logger.error(f"Chat error: {str(e)}")
         flash('Error loading chat.', 'error')
-        return redirect(url_for('inbox'))
+        return redirect(url_for('main.inbox'))
 
-@app.route('/wishlist')
+@main.route('/wishlist')
 @login_required
 def wishlist():
     try:
-        # Get all wishlist items for the current user with product details
-        wishlist_items = db.session.query(Wishlist, Product).join(
-            Product, Wishlist.product_id == Product.id
-        ).filter(Wishlist.user_id == current_user.id).all()
+        # The live listings on the current user's wishlist, as product cards
+        wishlist_items = wishlist_cards(current_user.id)
         
         return render_template('wishlist.html', wishlist_items=wishlist_items)
     except Exception as e:
-        app.logger.error(f"Wishlist error: {str(e)}")
+        current_app.logger.error(f"Wishlist error: {str(e)}")
         flash('Error loading wishlist.', 'error')
         return render_template('wishlist.html', wishlist_items=[])
 
-@app.route('/api/wishlist/add/<int:product_id>', methods=['POST'])
+@main.route('/api/wishlist/add/<int:product_id>', methods=['POST'])
 @login_required
+@rate_limit('wishlist')
 def add_to_wishlist(product_id):
     try:
         # Check if product exists
-        product = Product.query.get_or_404(product_id)
+        product = Product.live().filter_by(id=product_id).first_or_404()
         
         # Check if it's user's own product
         if product.seller_id == current_user.id:
@@ -818,16 +787,18 @@ def add_to_wishlist(product_id):
         wishlist_item = Wishlist(user_id=current_user.id, product_id=product_id)
         db.session.add(wishlist_item)
         db.session.commit()
+        activity.wishlisted(product_id)
         
         return jsonify({'success': True, 'message': 'Added to wishlist'})
     
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f"Add to wishlist error: {str(e)}")
+        current_app.logger.error(f"Add to wishlist error: {str(e)}")
         return jsonify({'success': False, 'message': 'Error adding to wishlist'})
 
-@app.route('/api/wishlist/remove/<int:product_id>', methods=['DELETE'])
+@main.route('/api/wishlist/remove/<int:product_id>', methods=['DELETE'])
 @login_required
+@rate_limit('wishlist')
 def remove_from_wishlist(product_id):
     try:
         wishlist_item = Wishlist.query.filter_by(
@@ -845,11 +816,12 @@ def remove_from_wishlist(product_id):
     
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f"Remove from wishlist error: {str(e)}")
+        current_app.logger.error(f"Remove from wishlist error: {str(e)}")
         return jsonify({'success': False, 'message': 'Error removing from wishlist'})
 
-@app.route('/api/wishlist/clear', methods=['DELETE'])
+@main.route('/api/wishlist/clear', methods=['DELETE'])
 @login_required
+@rate_limit('wishlist')
 def clear_wishlist():
     try:
         Wishlist.query.filter_by(user_id=current_user.id).delete()
@@ -859,10 +831,10 @@ def clear_wishlist():
     
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f"Clear wishlist error: {str(e)}")
+        current_app.logger.error(f"Clear wishlist error: {str(e)}")
         return jsonify({'success': False, 'message': 'Error clearing wishlist'})
 
-@app.route('/api/wishlist/check/<int:product_id>')
+@main.route('/api/wishlist/check/<int:product_id>')
 @login_required
 def check_wishlist_status(product_id):
     """Check if a product is in the user's wishlist"""
@@ -874,16 +846,83 @@ def check_wishlist_status(product_id):
         
         return jsonify({'in_wishlist': exists})
     except Exception as e:
-        app.logger.error(f"Check wishlist error: {str(e)}")
+        current_app.logger.error(f"Check wishlist error: {str(e)}")
         return jsonify({'in_wishlist': False})
 
-@app.route('/profile')
+# ============================================================================
+# SAVED SEARCHES
+# ============================================================================
+
+def saved_search_json(saved):
+    return {
+        'id': saved.id,
+        'label': describe(search_filters(saved)),
+        'url': url_for('main.products', q=saved.search or None, category=saved.category or None,
+                       condition=[c for c in saved.conditions.split('|') if c],
+                       min_price=saved.min_price, max_price=saved.max_price,
+                       rental='1' if saved.rental else None),
+        'created_at': saved.created_at,
+        'match_count': saved.match_count,
+        'last_match_at': saved.last_match_at
+    }
+
+@main.route('/api/saved_searches')
+@login_required
+def list_saved_searches():
+    """The current user's saved searches, newest first"""
+    searches = (SavedSearch.query.filter_by(user_id=current_user.id)
+                .order_by(SavedSearch.id.desc()).all())
+    return jsonify({'saved_searches': [saved_search_json(s) for s in searches]})
+
+@main.route('/api/saved_searches', methods=['POST'])
+@login_required
+@rate_limit('saved_search')
+def create_saved_search():
+    """Save the /products search given in the query string (q, category, condition, ...)"""
+    try:
+        filters = ProductFilters.from_args(request.args)
+        if not filters.search and not filters.active:
+            return jsonify({'success': False, 'message': 'Search for something or pick a filter first'}), 400
+
+        limit = current_app.config.get('SAVED_SEARCHES_PER_USER', 20)
+        if SavedSearch.query.filter_by(user_id=current_user.id).count() >= limit:
+            return jsonify({'success': False, 'message': f'You can save up to {limit} searches'}), 400
+
+        saved = save_search(current_user.id, filters)
+        db.session.commit()
+        saved_search_changed(saved.id)
+        return jsonify({'success': True, 'saved_search': saved_search_json(saved)})
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Save search error: {str(e)}")
+        return jsonify({'success': False, 'message': 'Error saving search'}), 500
+
+@main.route('/api/saved_searches/<int:search_id>', methods=['DELETE'])
+@login_required
+@rate_limit('saved_search')
+def delete_saved_search(search_id):
+    try:
+        deleted = SavedSearch.query.filter_by(id=search_id, user_id=current_user.id).delete()
+        db.session.commit()
+        if not deleted:
+            return jsonify({'success': False, 'message': 'Saved search not found'}), 404
+        saved_search_changed(search_id)
+        return jsonify({'success': True})
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Delete saved search error: {str(e)}")
+        return jsonify({'success': False, 'message': 'Error deleting saved search'}), 500
+
+@main.route('/profile')
 @login_required
 def profile():
-    return render_template('profile.html')
+    return render_template('profile.html', my_products=seller_listing_cards(current_user.id))
 
-@app.route('/edit_profile', methods=['GET', 'POST'])
+@main.route('/edit_profile', methods=['GET', 'POST'])
 @login_required
+@rate_limit('profile', methods=('POST',))
 def edit_profile():
     if request.method == 'POST':
         try:
@@ -898,53 +937,30 @@ def edit_profile():
                 if file and file.filename != '':
                     file_valid, file_msg = validate_file_upload(file)
                     if file_valid:
-                        image_url = None
-                        
-                        # Try Cloudinary first
-                        if os.environ.get('CLOUDINARY_CLOUD_NAME'):
-                            try:
-                                upload_result = cloudinary.uploader.upload(
-                                    file,
-                                    folder="thriftit/profiles",
-                                    transformation=[
-                                        {"width": 200, "height": 200, "crop": "fill", "gravity": "face"},
-                                        {"quality": "auto:good"}
-                                    ],
-                                    resource_type="image"
-                                )
-                                image_url = upload_result['secure_url']
-                                print(f"✅ Profile picture uploaded to Cloudinary: {image_url}")
-                                
-                            except Exception as e:
-                                print(f"⚠️ Cloudinary profile upload failed: {str(e)}")
-                        
-                        if not image_url:
-                            # Fallback to local storage
-                            filename = secure_filename(file.filename)
-                            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-                            filename = timestamp + filename
-                            file.save(os.path.join(app.config["UPLOAD_FOLDER"], filename))
-                            image_url = filename
+                        image_url, _ = store_image(file, 'profiles')
                         
                         # Update user's profile picture
+                        release_image(current_user.profile_picture)
                         current_user.profile_picture = image_url
                     else:
                         flash(file_msg, 'error')
                         return render_template('edit_profile.html')
             
             db.session.commit()
+            index_user(current_user)
             flash('Profile updated successfully!', 'success')
         except Exception as e:
             db.session.rollback()
-            app.logger.error(f"Edit profile error: {str(e)}")
+            current_app.logger.error(f"Edit profile error: {str(e)}")
             flash('Error updating profile. Please try again.', 'error')
         
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
     
     return render_template('edit_profile.html')
 
-@app.route('/api/upload_profile_picture', methods=['POST'])
+@main.route('/api/upload_profile_picture', methods=['POST'])
 @login_required
+@rate_limit('profile')
 def upload_profile_picture():
     """API endpoint for AJAX profile picture upload"""
     try:
@@ -959,51 +975,27 @@ def upload_profile_picture():
         if not file_valid:
             return jsonify({'success': False, 'message': file_msg})
         
-        image_url = None
-        
-        # Try Cloudinary first
-        if os.environ.get('CLOUDINARY_CLOUD_NAME'):
-            try:
-                upload_result = cloudinary.uploader.upload(
-                    file,
-                    folder="thriftit/profiles",
-                    transformation=[
-                        {"width": 200, "height": 200, "crop": "fill", "gravity": "face"},
-                        {"quality": "auto:good"}
-                    ],
-                    resource_type="image"
-                )
-                image_url = upload_result['secure_url']
-                print(f"✅ Profile picture uploaded to Cloudinary: {image_url}")
-                
-            except Exception as e:
-                print(f"⚠️ Cloudinary profile upload failed: {str(e)}")
-        
-        if not image_url:
-            # Fallback to local storage
-            filename = secure_filename(file.filename)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-            filename = timestamp + filename
-            file.save(os.path.join(app.config["UPLOAD_FOLDER"], filename))
-            image_url = filename
+        image_url, _ = store_image(file, 'profiles')
         
         # Update user's profile picture
+        release_image(current_user.profile_picture)
         current_user.profile_picture = image_url
         db.session.commit()
         
         return jsonify({
             'success': True, 
             'message': 'Profile picture updated successfully!',
-            'new_image_url': image_url if image_url.startswith('http') else url_for('uploads', filename=image_url)
+            'new_image_url': image_url if image_url.startswith('http') else url_for('main.uploads', filename=image_url)
         })
     
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f"Upload profile picture error: {str(e)}")
+        current_app.logger.error(f"Upload profile picture error: {str(e)}")
         return jsonify({'success': False, 'message': 'Error uploading profile picture'})
     
-@app.route('/api/change_password', methods=['POST'])
+@main.route('/api/change_password', methods=['POST'])
 @login_required
+@rate_limit('change_password')
 def api_change_password():
     """API endpoint for AJAX password change"""
     try:
@@ -1040,24 +1032,43 @@ def api_change_password():
     
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f"Change password error: {str(e)}")
+        current_app.logger.error(f"Change password error: {str(e)}")
         return jsonify({'success': False, 'message': 'Error changing password. Please try again.'})
 
 # ============================================================================
 # ENHANCED SOCKET.IO EVENT HANDLERS WITH DEBUGGING
 # ============================================================================
 
+def socket_client_key():
+    """Rate-limit sockets per user across all their tabs, else per connection"""
+    user_id = presence.user_for(request.sid)
+    return f"user:{user_id}" if user_id else f"sid:{request.sid}"
+
 @socketio.on('connect')
 def handle_connect():
     """Handle client connection"""
+    if lifecycle.draining:
+        # Shutting down. socket.io clients don't retry a refused connection on
+        # their own; the pages schedule a jittered reconnect on this message
+        raise ConnectionRefusedError('Server restarting')
+    user_id = current_user.id if current_user.is_authenticated else None
+    try:
+        presence.register(request.sid, user_id)
+    except ConnectionLimitError as e:
+        print(f"🚫 Connection refused for {request.sid}: {e}")
+        raise ConnectionRefusedError(str(e))
+    presence.start_reaper()
+    presence_fanout.start()
+    
     print(f"🔗 Client connected: {request.sid}")
     print(f"   User Agent: {request.headers.get('User-Agent', 'Unknown')}")
     print(f"   Remote Address: {request.remote_addr}")
     emit('connection_confirmed', {'status': 'connected', 'sid': request.sid})
 
 @socketio.on('disconnect')
-def handle_disconnect():
+def handle_disconnect(reason=None):
     """Handle client disconnection"""
+    presence.unregister(request.sid)
     print(f"🔌 Client disconnected: {request.sid}")
 
 @socketio.on_error_default
@@ -1068,23 +1079,35 @@ def default_error_handler(e):
     emit('error', {'message': 'A server error occurred'})
 
 @socketio.on('join')
+@socket_rate_limit('socket_join', key_func=socket_client_key)
 def handle_join(data):
     """Enhanced join handler with debugging"""
     try:
         user_id = data.get('user_id')
         print(f"👥 Join request from session {request.sid}: user_id={user_id}")
         
-        if not user_id:
-            print(f"   ❌ Invalid join request: missing user_id")
+        owner_id = presence.user_for(request.sid)
+        # Only the logged-in user's own room can be joined: it carries their
+        # messages, presence and typing
+        if not user_id or owner_id is None or str(user_id) != str(owner_id):
+            print(f"   ❌ Invalid join request: user_id={user_id}, session user={owner_id}")
             emit('error', {'message': 'Invalid join request'})
             return
         
-        room = f"user_{user_id}"
-        join_room(room)
-        print(f"   ✅ User {user_id} joined room {room}")
+        room = user_room(owner_id)
+        # A socket only needs to join its user room once
+        if presence.mark_joined(request.sid):
+            join_room(room)
+            print(f"   ✅ User {user_id} joined room {room}")
+            
+            # Follow the presence of inbox contacts and send their current state
+            contacts = presence_fanout.watch(owner_id, load_contacts(owner_id))
+            emit('presence', {'users': presence_fanout.snapshot(contacts)})
         
-        # Send confirmation back to client
-        emit('joined', {'room': room, 'user_id': user_id})
+        # Send confirmation back to client, after replaying what it missed
+        # since the last sequence number it handled
+        if outbox.resume(owner_id, request.sid, data, {'room': room, 'user_id': user_id}):
+            print(f"   ⚠️  Outbox gap for user {owner_id}, client will refetch")
         
     except Exception as e:
         print(f"   ❌ Error in join handler: {str(e)}")
@@ -1092,10 +1115,50 @@ def handle_join(data):
         traceback.print_exc()
         emit('error', {'message': 'Failed to join room'})
 
+@socketio.on('watch')
+@socket_rate_limit('socket_watch', key_func=socket_client_key)
+def handle_watch(data):
+    """Follow the presence of conversation partners, e.g. one past the inbox limit"""
+    user_id = presence.user_for(request.sid)
+    if user_id is None:
+        return
+    presence.touch(request.sid)
+    try:
+        if not isinstance(data, dict) or not isinstance(data.get('user_ids'), list):
+            raise TypeError
+        user_ids = {int(u) for u in data['user_ids'][:50]}
+    except (TypeError, ValueError):
+        emit('error', {'message': 'Invalid watch request'})
+        return
+    # Only people this user has exchanged messages with
+    user_ids &= load_contacts(user_id, limit=None)
+    presence_fanout.watch(user_id, user_ids)
+    emit('presence', {'users': presence_fanout.snapshot(user_ids)})
+
+@socketio.on('typing')
+@socket_rate_limit('socket_typing', key_func=socket_client_key, notify=False)
+def handle_typing(data):
+    """Forward typing state to the receiver, dropping redundant updates"""
+    sender_id = presence.user_for(request.sid)
+    if sender_id is None:
+        return
+    presence.touch(request.sid)
+    if not isinstance(data, dict):
+        return
+    try:
+        receiver_id = int(data.get('receiver_id'))
+    except (TypeError, ValueError):
+        return
+    # Only to conversation partners, which the sender watches since joining
+    if presence_fanout.is_watching(sender_id, receiver_id):
+        presence_fanout.typing(sender_id, receiver_id, bool(data.get('typing')))
+
 @socketio.on('send_message')
+@socket_rate_limit('socket_send_message', key_func=socket_client_key)
 def handle_socket_message(data):
     """Enhanced message handler with comprehensive debugging"""
     try:
+        presence.touch(request.sid)
         print(f"💬 Message received from session {request.sid}")
         print(f"   Data: {data}")
         
@@ -1150,6 +1213,10 @@ def handle_socket_message(data):
         db.session.commit()
         
         print(f"   ✅ Message saved to database with ID: {msg.id}")
+        presence_fanout.clear_typing(sender_id, receiver_id)
+        # A new conversation: from now on each follows the other's presence
+        presence_fanout.watch(sender_id, {receiver_id})
+        presence_fanout.watch(receiver_id, {sender_id})
 
         # Prepare message data
         message_data = {
@@ -1157,24 +1224,14 @@ def handle_socket_message(data):
             'content': content,
             'sender_id': sender_id,
             'receiver_id': receiver_id,
-            'timestamp': msg.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+            'timestamp': socket_timestamp(msg.timestamp),
             'sender_name': sender.student_id
         }
 
-        # Emit to receiver's room
-        receiver_room = f"user_{receiver_id}"
-        print(f"   📤 Sending to receiver room: {receiver_room}")
-        socketio.emit('new_message', message_data, room=receiver_room)
-        
-        # Emit confirmation to sender
-        sender_room = f"user_{sender_id}"
-        print(f"   📤 Sending confirmation to sender room: {sender_room}")
-        socketio.emit('message_sent', {
-            'id': msg.id,
-            'content': content,
-            'receiver_id': receiver_id,
-            'timestamp': msg.timestamp.strftime("%Y-%m-%d %H:%M:%S")
-        }, room=sender_room)
+        # The receiver gets the message, the sender's tabs take it as the
+        # send confirmation. Each copy is numbered in its user's outbox.
+        print(f"   📤 Sending to rooms: user_{receiver_id}, user_{sender_id}")
+        outbox.send([receiver_id, sender_id], 'new_message', message_data)
         
         print(f"   ✅ Message handling completed successfully")
         
@@ -1189,7 +1246,7 @@ def handle_socket_message(data):
         emit('error', {'message': 'Failed to send message'})
 
 # Add a test endpoint to check Socket.IO status
-@app.route('/api/socket_status')
+@main.route('/api/socket_status')
 @login_required
 def socket_status():
     """Check Socket.IO server status"""
@@ -1199,31 +1256,154 @@ def socket_status():
             'status': 'running',
             'async_mode': socketio.async_mode,
             'logger_enabled': hasattr(socketio, 'logger'),
-            'cors_allowed_origins': '*' if socketio.server.cors_allowed_origins == '*' else 'restricted',
-            'eventlet_available': eventlet_available,
-            'cloudinary_configured': bool(os.environ.get('CLOUDINARY_CLOUD_NAME'))
+            'cors_allowed_origins': '*' if socketio.server.eio.cors_allowed_origins == '*' else 'restricted',
+            'eventlet_available': eventlet_available(),
+            'cloudinary_configured': cloudinary_configured(),
+            'transports': current_app.config['SOCKETIO_TRANSPORTS'],
+            'ping_interval': current_app.config['SOCKETIO_PING_INTERVAL'],
+            'ping_timeout': current_app.config['SOCKETIO_PING_TIMEOUT'],
+            'compression_threshold': current_app.config['SOCKETIO_COMPRESSION_THRESHOLD']
         }
         
         return jsonify(status)
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@main.route('/api/socket_stats')
+@login_required
+@admin_required
+def socket_stats():
+    """Live Socket.IO connection counts and memory estimates"""
+    try:
+        return jsonify({**presence.stats(), **presence_fanout.stats(), 'rate_limiter': limiter.stats(),
+                        'outbox': outbox.stats(), 'feed': feed_registry.stats()})
+    except Exception as e:
+        current_app.logger.error(f"Socket stats error: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@main.route('/api/stats')
+@login_required
+def marketplace_stats():
+    """Cached marketplace counts (refreshed by the stats_refresh job)"""
+    try:
+        return jsonify(site_stats())
+    except Exception as e:
+        current_app.logger.error(f"Stats error: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@main.route('/api/jobs')
+@login_required
+@admin_required
+def jobs_status():
+    """Registered background jobs and their latest run"""
+    try:
+        return jsonify(job_status())
+    except Exception as e:
+        current_app.logger.error(f"Job status error: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+# ============================================================================
+# ADMIN DIAGNOSTICS
+# ============================================================================
+
+@main.route('/api/admin/profile_token')
+@login_required
+@admin_required
+def admin_profile_token():
+    """Signed token for profiling requests from scripts (see profiling.py)"""
+    return jsonify({
+        'token': issue_profile_token(current_user),
+        'header': 'X-Profile-Token',
+        'expires_in': current_app.config['PROFILER_TOKEN_MAX_AGE']
+    })
+
+@main.route('/api/admin/memory')
+@login_required
+@admin_required
+def admin_memory():
+    """Top allocation sites and object counts, as growth since the baseline if one is set"""
+    try:
+        limit = max(1, min(request.args.get('limit', 25, type=int), 200))
+        group_by = request.args.get('group_by', 'lineno')
+        if group_by not in ('lineno', 'filename', 'traceback'):
+            return jsonify({'error': 'group_by must be lineno, filename or traceback'}), 400
+        return jsonify(memory_report(limit, group_by))
+    except Exception as e:
+        current_app.logger.error(f"Memory report error: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@main.route('/api/admin/memory/baseline', methods=['POST'])
+@login_required
+@admin_required
+def admin_memory_baseline():
+    """Start allocation tracing and snapshot the baseline later reports diff against"""
+    try:
+        frames = max(1, min(request.args.get('frames', 25, type=int), 100))
+        return jsonify(start_memory_baseline(frames))
+    except Exception as e:
+        current_app.logger.error(f"Memory baseline error: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@main.route('/api/admin/memory', methods=['DELETE'])
+@login_required
+@admin_required
+def admin_memory_stop():
+    """Stop allocation tracing (it slows every allocation while on)"""
+    stop_memory_tracing()
+    return jsonify({'success': True, 'tracing': False})
+
+@main.route('/api/admin/slow_queries')
+@login_required
+@admin_required
+def admin_slow_queries():
+    """This worker's slow statements by fingerprint, with plans, and the latest executions"""
+    try:
+        limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+        sort = request.args.get('sort', 'total')
+        if sort not in slow_queries.SORT_KEYS:
+            return jsonify({'error': f"sort must be one of {', '.join(slow_queries.SORT_KEYS)}"}), 400
+        return jsonify(slow_queries.report(limit, sort))
+    except Exception as e:
+        current_app.logger.error(f"Slow query report error: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@main.route('/api/admin/slow_queries', methods=['DELETE'])
+@login_required
+@admin_required
+def admin_slow_queries_reset():
+    """Clear this worker's slow-query log"""
+    slow_queries.reset()
+    return jsonify({'success': True})
+
+@main.route('/api/admin/caches')
+@login_required
+@admin_required
+def admin_caches():
+    """This worker's cache counters, invalidation bus state, unflushed view counts and saved-search index"""
+    return jsonify({'cache': cache.stats(), 'invalidation': invalidation_bus.stats(),
+                    'view_counters': activity.stats(), 'saved_searches': percolator_stats()})
+
+@main.app_context_processor
+def inject_socketio_options():
+    """Expose the client transport policy to every template"""
+    return {'socketio_options': socketio_client_options(current_app)}
+
 # ============================================================================
 # ERROR HANDLERS
 # ============================================================================
 
-@app.errorhandler(404)
+@main.app_errorhandler(404)
 def not_found_error(error):
     flash('Page not found.', 'error')
-    return redirect(url_for('home'))
+    return redirect(url_for('main.home'))
 
-@app.errorhandler(500)
+@main.app_errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     flash('Internal server error. Please try again.', 'error')
-    return redirect(url_for('home'))
+    return redirect(url_for('main.home'))
 
-@app.errorhandler(413)
+@main.app_errorhandler(413)
 def too_large(error):
     flash('File too large. Maximum size is 5MB.', 'error')
     return redirect(request.url)
@@ -1237,11 +1417,11 @@ def log_socketio_config():
     print("\n🔌 Socket.IO Configuration:")
     print(f"   Async Mode: {socketio.async_mode}")
     print(f"   Logger Enabled: {hasattr(socketio, 'logger')}")
-    print(f"   Eventlet Available: {eventlet_available}")
+    print(f"   Eventlet Available: {eventlet_available()}")
     
     # Safe access to server attributes
     try:
-        cors_origins = getattr(socketio.server, 'cors_allowed_origins', 'unknown')
+        cors_origins = getattr(socketio.server.eio, 'cors_allowed_origins', 'unknown')
         print(f"   CORS Origins: {cors_origins}")
     except Exception:
         print(f"   CORS Origins: configured")
@@ -1263,7 +1443,7 @@ def log_socketio_config():
 # HEALTH CHECK ENDPOINTS
 # ============================================================================
 
-@app.route('/health')
+@main.route('/health')
 def health_check():
     """Health check endpoint for monitoring"""
     try:
@@ -1271,7 +1451,7 @@ def health_check():
         db.session.execute(db.text('SELECT 1'))
         
         # Test file system access
-        upload_folder_exists = os.path.exists(app.config.get('UPLOAD_FOLDER', ''))
+        upload_folder_exists = os.path.exists(current_app.config.get('UPLOAD_FOLDER', ''))
         
         health_info = {
             'status': 'healthy',
@@ -1279,8 +1459,12 @@ def health_check():
             'database': 'connected',
             'upload_folder': 'accessible' if upload_folder_exists else 'not_accessible',
             'socketio_mode': socketio.async_mode,
-            'eventlet_available': eventlet_available,
-            'cloudinary_configured': bool(os.environ.get('CLOUDINARY_CLOUD_NAME'))
+            'eventlet_available': eventlet_available(),
+            'cloudinary_configured': cloudinary_configured(),
+            'transports': current_app.config['SOCKETIO_TRANSPORTS'],
+            'ping_interval': current_app.config['SOCKETIO_PING_INTERVAL'],
+            'ping_timeout': current_app.config['SOCKETIO_PING_TIMEOUT'],
+            'compression_threshold': current_app.config['SOCKETIO_COMPRESSION_THRESHOLD']
         }
         
         return jsonify(health_info), 200
@@ -1291,19 +1475,34 @@ def health_check():
             'timestamp': datetime.utcnow().isoformat(),
             'error': str(e),
             'socketio_mode': socketio.async_mode,
-            'eventlet_available': eventlet_available,
-            'cloudinary_configured': bool(os.environ.get('CLOUDINARY_CLOUD_NAME'))
+            'eventlet_available': eventlet_available(),
+            'cloudinary_configured': cloudinary_configured(),
+            'transports': current_app.config['SOCKETIO_TRANSPORTS'],
+            'ping_interval': current_app.config['SOCKETIO_PING_INTERVAL'],
+            'ping_timeout': current_app.config['SOCKETIO_PING_TIMEOUT'],
+            'compression_threshold': current_app.config['SOCKETIO_COMPRESSION_THRESHOLD']
         }
         
         return jsonify(health_info), 500
 
-@app.route('/api/status')
+@main.route('/health/live')
+def liveness_check():
+    """Liveness probe: the process can still serve requests (no database)"""
+    return jsonify({'status': 'alive', **lifecycle.status()}), 200
+
+@main.route('/health/ready')
+def readiness_check():
+    """Readiness probe: started up and not draining (no database; /health checks that)"""
+    status = lifecycle.status()
+    return jsonify({'status': 'ready' if status['ready'] else 'not_ready', **status}), 200 if status['ready'] else 503
+
+@main.route('/api/status')
 def api_status():
     """API status endpoint with detailed information"""
     try:
         # Get database statistics
         user_count = db.session.query(User).count()
-        product_count = db.session.query(Product).count()
+        product_count = Product.live().count()
         message_count = db.session.query(Message).count()
         
         status_info = {
@@ -1322,7 +1521,8 @@ def api_status():
                 'status': 'initialized'
             },
             'storage': {
-                'cloudinary_configured': bool(os.environ.get('CLOUDINARY_CLOUD_NAME')),
+                'backend': get_image_store().name,
+                'cloudinary_configured': cloudinary_configured(),
                 'local_fallback': True
             },
             'features': {
@@ -1330,7 +1530,7 @@ def api_status():
                 'file_upload': True,
                 'wishlist': True,
                 'user_profiles': True,
-                'persistent_images': bool(os.environ.get('CLOUDINARY_CLOUD_NAME'))
+                'persistent_images': get_image_store().name != 'local'
             }
         }
         
@@ -1349,7 +1549,7 @@ def api_status():
 # INITIALIZATION AND STARTUP
 # ============================================================================
 
-def initialize_app():
+def initialize_app(app):
     """Initialize database and validate configuration"""
     with app.app_context():
         try:
@@ -1366,6 +1566,10 @@ def initialize_app():
                 # Only create missing tables, don't drop existing ones
                 db.create_all()
             
+            ensure_listing_schema()
+            ensure_archive_schema()
+            ensure_search_indexes()
+            
             # Verify tables exist
             tables = inspector.get_table_names()
             print(f"📋 Available tables: {tables}")
@@ -1373,7 +1577,7 @@ def initialize_app():
             # Log table counts for verification
             if tables:
                 user_count = db.session.query(User).count()
-                product_count = db.session.query(Product).count()
+                product_count = Product.live().count()
                 print(f"📊 Database stats: {user_count} users, {product_count} products")
             
             print("✓ Database initialization completed successfully")
@@ -1386,7 +1590,7 @@ def initialize_app():
 
     # Validate security configuration
     try:
-        validate_security_config()
+        validate_security_config(app)
     except Exception as e:
         app.logger.error(f"Security validation failed: {str(e)}")
         if not app.debug:
@@ -1395,10 +1599,23 @@ def initialize_app():
     # Log SocketIO configuration
     log_socketio_config()
 
-# Configure logging for production
-if not app.debug:
+    # Periodic maintenance jobs
+    start_scheduler(app)
+
+    # Evict cached data when other workers change it
+    invalidation_bus.start()
+
+    # Write buffered product views and wishlist additions in batches
+    activity.start(app)
+
+    # Drain connections on SIGTERM, then report ready
+    lifecycle.install(app)
+    lifecycle.mark_ready()
+
+def configure_logging(app):
+    """Configure rotating file logging for production"""
     # Create logs directory
-    logs_dir = os.path.join(os.path.dirname(__file__), 'logs')
+    logs_dir = app.config['LOG_DIR']
     os.makedirs(logs_dir, exist_ok=True)
     
     # Set up file logging
@@ -1416,6 +1633,46 @@ if not app.debug:
     app.logger.setLevel(logging.INFO)
     app.logger.info('ThriftIt startup - Production mode')
 
+# ============================================================================
+# APPLICATION FACTORY
+# ============================================================================
+
+def create_app(config_name=None):
+    """
+    Create and configure a ThriftIt application.
+    ``config_name`` selects a class from config.py; it defaults to FLASK_ENV.
+    """
+    config_name = config_name or os.environ.get('FLASK_ENV', 'default')
+    app = Flask(__name__)
+    app.config.from_object(config.get(config_name, config['default']))
+
+    if app.config.get('LOG_TO_FILE') and not app.debug:
+        configure_logging(app)
+
+    if not app.config.get('SECRET_KEY_FROM_ENV') and not app.testing:
+        app.logger.warning("⚠️  WARNING: Using auto-generated secret key. Set SECRET_KEY environment variable for production!")
+
+    # Create the upload directory
+    os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
+    app.logger.info(f"📁 Using upload folder: {app.config['UPLOAD_FOLDER']}")
+
+    init_serialization(app)
+    db.init_app(app)
+    init_listings(app)
+    init_slow_query_log(app)
+    init_invalidation(app)
+    init_cache(app)
+    login_manager.init_app(app)
+    init_image_store(app)
+    init_socketio(app)
+    init_presence(app)
+    init_outbox(app)
+    init_rate_limiter(app)
+    init_profiler(app)
+
+    app.register_blueprint(main)
+    return app
+
 # ============================================================================
 # MAIN EXECUTION - THIS MUST BE AT THE VERY END
 # ============================================================================
@@ -1423,6 +1680,9 @@ if not app.debug:
 if __name__ == "__main__":
     print("🔍 Starting ThriftIt debug mode...")
     
+    # Use run.py for eventlet: the monkey patch must happen before these imports
+    app = create_app()
+    
     # Get port from environment
     port = int(os.environ.get('PORT', 5000))
     print(f"🌐 Port from environment: {port}")
@@ -1430,8 +1690,7 @@ if __name__ == "__main__":
     
     try:
         print("🔧 Initializing database...")
-        with app.app_context():
-            db.create_all()
+        initialize_app(app)
         print("✅ Database initialized")
         
         print(f"🔌 SocketIO async mode: {socketio.async_mode}")
@@ -1459,4 +1718,4 @@ if __name__ == "__main__":
             app.run(host='0.0.0.0', port=port, debug=False)
         except Exception as e2:
             print(f"❌ Flask fallback also failed: {str(e2)}")
-            traceback.print_exc()
\ No newline at end of file
+            traceback.print_exc()
@@ -0,0 +1,411 @@
+"""
+ASGI entry point: a native asyncio server for HTTP and Socket.IO.
+
+    uvicorn asgi:application --host 0.0.0.0 --port $PORT
+
+This is the alternative to wsgi.py, and it needs no eventlet monkey patch.
+Socket.IO runs on python-socketio's AsyncServer on the event loop. The chat
+events (join, watch, typing, send_message) are coroutines that read and
+write through an async SQLAlchemy engine (aiosqlite or asyncpg). All other
+HTTP routes are the unchanged Flask app, which a2wsgi runs in a pool of
+ASGI_HTTP_WORKERS threads.
+
+Events and payloads match the Flask-SocketIO handlers in app.py and
+product_feed.py (the /products namespace), so the same front end works
+against either server. Connection caps, presence and rate limits use the
+same registry, fan-out and limiter objects. Code that emits outside a
+handler (presence frames, the outbox, product deltas) goes through emit
+hooks that are pointed at the AsyncServer here.
+"""
+
+import asyncio
+import os
+import signal
+import time
+
+# Here the Flask-SocketIO server only hosts background jobs, so it must not
+# pull in eventlet
+os.environ['SOCKETIO_ASYNC_MODE'] = 'threading'
+
+# Load environment variables before the configuration classes read them
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+import socketio
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from werkzeug.http import parse_cookie
+
+from app import create_app, initialize_app
+from extensions import db
+from lifecycle import lifecycle, NAMESPACES
+from models import User, Message
+from outbox import outbox
+import product_feed
+from product_feed import category_room, requested_categories
+from presence import (registry as presence, feed_registry, fanout as presence_fanout, contacts_query, user_room,
+                      ConnectionLimitError)
+from rate_limit import limiter
+from serialization import socketio_serializer, socket_timestamp
+from slow_queries import slow_queries
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+def async_database_url(url):
+    """The app's (already resolved) database URL with an asyncio driver"""
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"No asyncio database driver configured for {backend}")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+def create_asgi_app(config_name=None):
+    """Build the Flask app and wrap it, with an AsyncServer, in one ASGI app"""
+    flask_app = create_app(config_name)
+    initialize_app(flask_app)
+    # initialize_app() put lifecycle's SIGTERM handler in front of uvicorn's;
+    # its drain only knows the Flask-SocketIO server. startup() installs ours.
+    lifecycle.uninstall()
+    config = flask_app.config
+
+    with flask_app.app_context():
+        url = async_database_url(db.engine.url)
+    if url.get_backend_name() == 'sqlite':
+        # SQLite allows one writer at a time; a single shared connection
+        # queues writers on the event loop instead of in busy-timeout retries
+        engine = create_async_engine(url, pool_size=1, max_overflow=0)
+    else:
+        engine = create_async_engine(url, pool_pre_ping=True)
+    # Plans for these statements are captured when the Flask routes run them
+    slow_queries.instrument(engine.sync_engine, context='asgi socket', explain=False)
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+
+    queue = config.get('SOCKETIO_MESSAGE_QUEUE')
+    sio = socketio.AsyncServer(
+        async_mode='asgi',
+        client_manager=socketio.AsyncRedisManager(queue) if queue else None,
+        cors_allowed_origins='*',
+        logger=False,
+        engineio_logger=False,
+        transports=config['SOCKETIO_TRANSPORTS'],
+        ping_timeout=config['SOCKETIO_PING_TIMEOUT'],
+        ping_interval=config['SOCKETIO_PING_INTERVAL'],
+        http_compression=config['SOCKETIO_HTTP_COMPRESSION'],
+        compression_threshold=config['SOCKETIO_COMPRESSION_THRESHOLD'],
+        max_http_buffer_size=config['SOCKETIO_MAX_HTTP_BUFFER_SIZE'],
+        serializer=socketio_serializer(flask_app)
+    )
+    loop = None  # the server's event loop, set in startup()
+
+    def emit_soon(event, data, room, namespace='/'):
+        """
+        Schedule an emit from the event loop or from a Flask route running
+        in an HTTP worker thread. Emits are queued in call order.
+        """
+        coro = sio.emit(event, data, to=room, namespace=namespace)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not None:
+            return asyncio.ensure_future(coro)
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    presence_fanout.emit = emit_soon
+    # Outbox emits are scheduled in order while it holds its lock
+    outbox.emit = emit_soon
+    # Product deltas, sent by upload() and the listing routes
+    product_feed.emit_to_feed = lambda event, data, room: emit_soon(event, data, room, product_feed.NAMESPACE)
+
+    session_serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    session_max_age = int(config['PERMANENT_SESSION_LIFETIME'].total_seconds())
+
+    def session_user_id(environ):
+        """The logged-in user from the Flask session cookie, or None"""
+        cookie = parse_cookie(environ.get('HTTP_COOKIE', '')).get(config['SESSION_COOKIE_NAME'])
+        if not cookie or session_serializer is None:
+            return None
+        try:
+            return int(session_serializer.loads(cookie, max_age=session_max_age)['_user_id'])
+        except Exception:
+            return None
+
+    async def rate_limited(sid, rule, notify=True):
+        """Same buckets as socket_rate_limit(); True if the event must be dropped"""
+        user_id = presence.user_for(sid)
+        allowed, retry_after = limiter.hit(rule, f"user:{user_id}" if user_id else f"sid:{sid}")
+        if not allowed and notify:
+            retry_after = max(1, int(retry_after + 0.999))
+            await sio.emit('error', {'message': f'Too many requests. Try again in {retry_after} seconds.',
+                                     'retry_after': retry_after}, to=sid)
+        return not allowed
+
+    # ------------------------------------------------------------------
+    # Socket.IO events
+    # ------------------------------------------------------------------
+
+    @sio.event
+    async def connect(sid, environ, auth=None):
+        if lifecycle.draining:
+            # The pages reconnect after a jittered delay on this message
+            raise socketio.exceptions.ConnectionRefusedError('Server restarting')
+        user_id = session_user_id(environ)
+        try:
+            presence.register(sid, user_id)
+        except ConnectionLimitError as e:
+            print(f"🚫 Connection refused for {sid}: {e}")
+            raise socketio.exceptions.ConnectionRefusedError(str(e))
+        await sio.emit('connection_confirmed', {'status': 'connected', 'sid': sid}, to=sid)
+
+    @sio.event
+    async def disconnect(sid, reason=None):
+        presence.unregister(sid)
+
+    @sio.event
+    async def join(sid, data):
+        if await rate_limited(sid, 'socket_join'):
+            return
+        owner_id = presence.user_for(sid)
+        user_id = (data or {}).get('user_id')
+        # Only the logged-in user's own room can be joined
+        if not user_id or owner_id is None or str(user_id) != str(owner_id):
+            await sio.emit('error', {'message': 'Invalid join request'}, to=sid)
+            return
+        room = user_room(owner_id)
+        try:
+            if presence.mark_joined(sid):
+                await sio.enter_room(sid, room)
+                async with Session() as session:
+                    contacts = {c for (c,) in await session.execute(contacts_query(owner_id))}
+                watched = presence_fanout.watch(owner_id, contacts)
+                await sio.emit('presence', {'users': presence_fanout.snapshot(watched)}, to=sid)
+            outbox.resume(owner_id, sid, data, {'room': room, 'user_id': user_id})
+        except Exception as e:
+            print(f"❌ Error in join handler: {str(e)}")
+            await sio.emit('error', {'message': 'Failed to join room'}, to=sid)
+
+    # ------------------------------------------------------------------
+    # /products namespace: the live product feed
+    # ------------------------------------------------------------------
+
+    @sio.on('connect', namespace=product_feed.NAMESPACE)
+    async def feed_connect(sid, environ, auth=None):
+        user_id = session_user_id(environ)
+        if user_id is None:
+            return False
+        if lifecycle.draining:
+            raise socketio.exceptions.ConnectionRefusedError('Server restarting')
+        try:
+            feed_registry.register(sid, user_id)
+        except ConnectionLimitError as e:
+            print(f"🚫 Feed connection refused for {sid}: {e}")
+            raise socketio.exceptions.ConnectionRefusedError(str(e))
+
+    @sio.on('disconnect', namespace=product_feed.NAMESPACE)
+    async def feed_disconnect(sid, reason=None):
+        feed_registry.unregister(sid)
+
+    @sio.on('subscribe', namespace=product_feed.NAMESPACE)
+    async def feed_subscribe(sid, data):
+        feed_registry.touch(sid)
+        categories = requested_categories(data)
+        for category in categories:
+            await sio.enter_room(sid, category_room(category), namespace=product_feed.NAMESPACE)
+        await sio.emit('subscribed', {'categories': categories}, to=sid, namespace=product_feed.NAMESPACE)
+
+    @sio.on('unsubscribe', namespace=product_feed.NAMESPACE)
+    async def feed_unsubscribe(sid, data):
+        feed_registry.touch(sid)
+        categories = requested_categories(data)
+        for category in categories:
+            await sio.leave_room(sid, category_room(category), namespace=product_feed.NAMESPACE)
+        await sio.emit('unsubscribed', {'categories': categories}, to=sid, namespace=product_feed.NAMESPACE)
+
+    @sio.event
+    async def watch(sid, data):
+        if await rate_limited(sid, 'socket_watch'):
+            return
+        user_id = presence.user_for(sid)
+        if user_id is None:
+            return
+        presence.touch(sid)
+        try:
+            if not isinstance(data, dict) or not isinstance(data.get('user_ids'), list):
+                raise TypeError
+            user_ids = {int(u) for u in data['user_ids'][:50]}
+        except (TypeError, ValueError):
+            await sio.emit('error', {'message': 'Invalid watch request'}, to=sid)
+            return
+        # Only people this user has exchanged messages with
+        async with Session() as session:
+            user_ids &= {c for (c,) in await session.execute(contacts_query(user_id, limit=None))}
+        presence_fanout.watch(user_id, user_ids)
+        await sio.emit('presence', {'users': presence_fanout.snapshot(user_ids)}, to=sid)
+
+    @sio.event
+    async def typing(sid, data):
+        if await rate_limited(sid, 'socket_typing', notify=False):
+            return
+        sender_id = presence.user_for(sid)
+        if sender_id is None:
+            return
+        presence.touch(sid)
+        if not isinstance(data, dict):
+            return
+        try:
+            receiver_id = int(data.get('receiver_id'))
+        except (TypeError, ValueError):
+            return
+        # Only to conversation partners, which the sender watches since joining
+        if presence_fanout.is_watching(sender_id, receiver_id):
+            presence_fanout.typing(sender_id, receiver_id, bool(data.get('typing')))
+
+    @sio.event
+    async def send_message(sid, data):
+        if await rate_limited(sid, 'socket_send_message'):
+            return
+        presence.touch(sid)
+
+        async def error(message):
+            await sio.emit('error', {'message': message}, to=sid)
+
+        data = data or {}
+        for field in ('sender_id', 'receiver_id', 'content'):
+            if field not in data:
+                return await error(f'Missing required field: {field}')
+        try:
+            sender_id = int(data['sender_id'])
+            receiver_id = int(data['receiver_id'])
+        except (TypeError, ValueError):
+            return await error('Invalid data format')
+        content = data['content']
+
+        if not isinstance(content, str) or not content.strip():
+            return await error('Message content cannot be empty')
+        if len(content) > 1000:
+            return await error('Message too long (max 1000 characters)')
+        if sender_id == receiver_id:
+            return await error('Cannot send message to yourself')
+        if sender_id != presence.user_for(sid):
+            return await error('Sender not found')
+
+        try:
+            async with Session() as session:
+                names = dict((await session.execute(
+                    select(User.id, User.student_id).where(User.id.in_((sender_id, receiver_id)))
+                )).all())
+                if receiver_id not in names:
+                    return await error('Receiver not found')
+                msg = Message(content=content.strip(), sender_id=sender_id, receiver_id=receiver_id)
+                session.add(msg)
+                await session.commit()
+        except Exception as e:
+            print(f"❌ Unexpected error in message handler: {str(e)}")
+            return await error('Failed to send message')
+
+        presence_fanout.clear_typing(sender_id, receiver_id)
+        presence_fanout.watch(sender_id, {receiver_id})
+        presence_fanout.watch(receiver_id, {sender_id})
+        outbox.send([receiver_id, sender_id], 'new_message', {
+            'id': msg.id,
+            'content': content,
+            'sender_id': sender_id,
+            'receiver_id': receiver_id,
+            'timestamp': socket_timestamp(msg.timestamp),
+            'sender_name': names[sender_id]
+        })
+
+    # ------------------------------------------------------------------
+    # Background tasks
+    # ------------------------------------------------------------------
+
+    async def flush_presence():
+        while True:
+            await sio.sleep(presence_fanout.flush_interval)
+            try:
+                presence_fanout.flush()
+            except Exception as e:
+                print(f"⚠️  Presence flush failed: {str(e)}")
+
+    async def reap_idle():
+        interval = max(5, min(60, presence.idle_timeout // 4))
+        while True:
+            await sio.sleep(interval)
+            for registry in (presence, feed_registry):
+                sids = registry.idle_sids()
+                for sid in sids:
+                    await sio.emit('idle_timeout', {}, to=sid, namespace=registry.namespace)
+                    await sio.disconnect(sid, namespace=registry.namespace)
+                    registry.unregister(sid)
+                registry.reaped += len(sids)
+
+    # ------------------------------------------------------------------
+    # Draining (see lifecycle.py)
+    # ------------------------------------------------------------------
+
+    lifecycle.server = sio
+    uvicorn_sigterm = None  # uvicorn's SIGTERM handler, called once drained
+
+    async def drain():
+        """Lifecycle._drain on the event loop, then let uvicorn shut down"""
+        timeout = config.get('DRAIN_TIMEOUT', 25)
+        window = config.get('DRAIN_RECONNECT_WINDOW', 10)
+        try:
+            for namespace in NAMESPACES:
+                await sio.emit('server_draining', {'reconnect_window_ms': int(window * 1000)}, namespace=namespace)
+            await asyncio.to_thread(lifecycle.run_hooks, flask_app)
+
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline and lifecycle.connected_sids():
+                await sio.sleep(0.5)
+
+            remaining = lifecycle.connected_sids()
+            for namespace, sid in remaining:
+                await sio.disconnect(sid, namespace=namespace)
+            print(f"🚰 Drained after {time.time() - lifecycle.drain_started_at:.1f}s "
+                  f"({len(remaining)} connection(s) closed at the deadline)")
+        finally:
+            lifecycle.drained = True
+            stop_server()
+
+    def stop_server():
+        signal.signal(signal.SIGTERM, uvicorn_sigterm or signal.SIG_DFL)
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    def handle_sigterm(signum, frame):
+        # Runs on the loop's thread, between two steps of the loop
+        if lifecycle.mark_draining():
+            loop.call_soon_threadsafe(sio.start_background_task, drain)
+        else:
+            loop.call_soon_threadsafe(stop_server)  # a second SIGTERM: stop now
+
+    async def startup():
+        nonlocal loop, uvicorn_sigterm
+        loop = asyncio.get_running_loop()
+        # uvicorn installed its handler before startup; it would close every
+        # socket at once, so it only runs once the clients have been drained
+        try:
+            uvicorn_sigterm = signal.signal(signal.SIGTERM, handle_sigterm)
+        except ValueError:
+            pass  # not the main thread: no draining
+        sio.start_background_task(flush_presence)
+        if presence.idle_timeout:
+            sio.start_background_task(reap_idle)
+        print(f"⚡ ASGI server ready ({engine.url.drivername})")
+
+    async def shutdown():
+        # uvicorn has closed the sockets by now; flush buffered writes again
+        await asyncio.to_thread(lifecycle.run_hooks, flask_app)
+        await engine.dispose()
+
+    http = WSGIMiddleware(flask_app, workers=config.get('ASGI_HTTP_WORKERS', 10))
+    return socketio.ASGIApp(sio, other_asgi_app=http,
+                            on_startup=startup, on_shutdown=shutdown)
+
+application = create_asgi_app(os.environ.get('FLASK_ENV', 'production'))
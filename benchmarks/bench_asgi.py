@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Eventlet vs ASGI server benchmark for ThriftIt
+Seeds a throwaway SQLite database, then starts each server in turn in a
+child process and puts the same load on it:
+
+    eventlet  - Flask-SocketIO on eventlet (what gunicorn -k eventlet runs)
+    asgi      - asgi.py under uvicorn (AsyncServer + async SQLAlchemy)
+
+For each server it reports:
+- how fast N logged-in sockets connect and join their rooms
+- the server's memory per socket
+- message round-trip latency (send_message -> the sender's own copy of
+  new_message) while every socket chats with a partner
+- throughput and latency of the HTTP workers hitting /products and
+  /api/conversations over the same period
+- the server's CPU use during the mixed traffic
+
+Needs the async client extras: pip install "python-socketio[asyncio_client]"
+
+Usage:
+    python benchmarks/bench_asgi.py --sockets 200 --duration 10
+    python benchmarks/bench_asgi.py --servers asgi --sockets 500
+"""
+
+import argparse
+import asyncio
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# Shared by the seeding process and both servers so session cookies verify
+os.environ['SECRET_KEY'] = secrets.token_urlsafe(32)
+
+import aiohttp
+import socketio
+
+CONFIGURE = """
+import sys, tempfile
+sys.path.insert(0, {root!r})
+from config import TestingConfig
+TestingConfig.SQLALCHEMY_DATABASE_URI = {db_url!r}
+TestingConfig.UPLOAD_FOLDER = tempfile.mkdtemp()
+TestingConfig.SOCKETIO_TRANSPORTS = ['websocket', 'polling']
+TestingConfig.SOCKETIO_MAX_CONNECTIONS = 100000
+TestingConfig.SOCKETIO_MAX_CONNECTIONS_PER_USER = 100
+"""
+
+SERVERS = {
+    'eventlet': CONFIGURE + """
+from eventlet_setup import setup_eventlet
+setup_eventlet()
+TestingConfig.SOCKETIO_ASYNC_MODE = 'eventlet'
+from app import create_app
+from extensions import socketio
+app = create_app('testing')
+socketio.run(app, host='127.0.0.1', port={port}, log_output=False)
+""",
+    'asgi': CONFIGURE + """
+import os
+os.environ['FLASK_ENV'] = 'testing'
+import uvicorn
+import asgi
+uvicorn.run(asgi.application, host='127.0.0.1', port={port}, log_level='warning')
+""",
+}
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def rss_kb(pid):
+    """Resident set size of a process in KB (Linux only)"""
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+def cpu_seconds(pid):
+    """User + system CPU time used by a process so far (Linux only)"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+def seed(db_url, users, products=200):
+    """Create the schema, ``users`` users and some listings; returns session cookies by user id"""
+    from config import TestingConfig
+    TestingConfig.SQLALCHEMY_DATABASE_URI = db_url
+    TestingConfig.UPLOAD_FOLDER = tempfile.mkdtemp()
+    from app import create_app
+    from extensions import db
+    from models import User, Product
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add_all(User(student_id=f"{10000000 + i}", student_email=f"bench{i}@example.com",
+                                password_hash='x') for i in range(users))
+        db.session.flush()
+        ids = [u.id for u in User.query.order_by(User.id)]
+        db.session.add_all(Product(name=f"Item {i}", price=5 + i % 100, image='default-avatar.png',
+                                   category='Books', condition='Like New', seller_id=ids[i % len(ids)])
+                           for i in range(products))
+        db.session.commit()
+    serializer = app.session_interface.get_signing_serializer(app)
+    name = app.config['SESSION_COOKIE_NAME']
+    return {uid: f"{name}={serializer.dumps({'_user_id': str(uid), '_fresh': True})}" for uid in ids}
+
+def start_server(kind, port, db_url):
+    proc = subprocess.Popen(
+        [sys.executable, '-c', SERVERS[kind].format(root=REPO_ROOT, db_url=db_url, port=port)],
+        cwd=REPO_ROOT, env=dict(os.environ), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{kind} server did not start")
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+async def open_socket(url, user_id, cookie, partner_id, latencies):
+    client = socketio.AsyncClient(reconnection=False)
+    pending = {}
+
+    @client.on('new_message')
+    async def on_message(data):
+        if data.get('sender_id') != user_id:
+            return
+        started = pending.pop(data.get('content'), None)
+        if started is not None:
+            latencies.append(time.perf_counter() - started)
+
+    joined = asyncio.Event()
+    client.on('joined', lambda data: joined.set())
+    await client.connect(url, headers={'Cookie': cookie}, transports=['websocket'], wait_timeout=10)
+    await client.emit('join', {'user_id': user_id})
+    await asyncio.wait_for(joined.wait(), 10)
+    return client, pending
+
+async def chat(client, pending, user_id, partner_id, until, interval):
+    n = 0
+    while time.perf_counter() < until:
+        content = f"{user_id}:{n}"
+        n += 1
+        pending[content] = time.perf_counter()
+        await client.emit('send_message', {'sender_id': user_id, 'receiver_id': partner_id, 'content': content})
+        await asyncio.sleep(interval)
+
+async def http_worker(session, url, cookie, partner_id, until, latencies):
+    paths = ['/products', f'/api/conversations/{partner_id}']
+    n = 0
+    while time.perf_counter() < until:
+        started = time.perf_counter()
+        async with session.get(url + paths[n % 2], headers={'Cookie': cookie}) as response:
+            await response.read()
+            if response.status == 200:
+                latencies.append(time.perf_counter() - started)
+        n += 1
+
+async def run_load(kind, url, pid, cookies, args):
+    user_ids = sorted(cookies)[:args.sockets]
+    partner = {uid: user_ids[i ^ 1] for i, uid in enumerate(user_ids) if (i ^ 1) < len(user_ids)}
+    msg_latencies, http_latencies = [], []
+
+    base = rss_kb(pid)
+    started = time.perf_counter()
+    sockets = await asyncio.gather(*(
+        open_socket(url, uid, cookies[uid], partner.get(uid), msg_latencies) for uid in user_ids
+    ))
+    connect_time = time.perf_counter() - started
+    await asyncio.sleep(1)
+    per_socket = (rss_kb(pid) - base) / len(sockets)
+
+    until = time.perf_counter() + args.duration
+    cpu_before = cpu_seconds(pid)
+    async with aiohttp.ClientSession() as session:
+        tasks = [chat(client, pending, uid, partner[uid], until, args.interval)
+                 for (client, pending), uid in zip(sockets, user_ids) if uid in partner]
+        tasks += [http_worker(session, url, cookies[user_ids[i]], partner[user_ids[i]], until, http_latencies)
+                  for i in range(args.http_workers)]
+        await asyncio.gather(*tasks)
+    cpu = (cpu_seconds(pid) - cpu_before) / args.duration
+    await asyncio.sleep(1)  # let the last confirmations arrive
+    for client, _ in sockets:
+        await client.disconnect()
+
+    print(f"   {kind:<9} {len(sockets) / connect_time:8.1f} conn/s  {per_socket:7.1f} KB/socket"
+          f"   msg p50 {percentile(msg_latencies, 50) * 1000:7.1f} ms  p95 {percentile(msg_latencies, 95) * 1000:7.1f} ms"
+          f" ({len(msg_latencies) / args.duration:6.1f} msg/s)"
+          f"   http {len(http_latencies) / args.duration:7.1f} req/s  p95 {percentile(http_latencies, 95) * 1000:7.1f} ms"
+          f"   server CPU {cpu * 100:5.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the eventlet and ASGI servers")
+    parser.add_argument('--sockets', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=10, help="seconds of mixed traffic")
+    parser.add_argument('--interval', type=float, default=1.0, help="seconds between messages per socket")
+    parser.add_argument('--http-workers', type=int, default=8)
+    parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS))
+    args = parser.parse_args()
+    args.sockets += args.sockets % 2  # sockets chat in pairs
+
+    workdir = tempfile.mkdtemp()
+    print(f"⚡ {args.sockets} sockets, {args.http_workers} HTTP workers, {args.duration:.0f}s of mixed traffic")
+    for kind in args.servers:
+        # A fresh database per server so both start from the same state
+        db_url = f"sqlite:///{os.path.join(workdir, kind + '.db')}"
+        cookies = seed(db_url, args.sockets)
+        port = free_port()
+        server = start_server(kind, port, db_url)
+        try:
+            asyncio.run(run_load(kind, f"http://127.0.0.1:{port}", server.pid, cookies, args))
+        finally:
+            server.terminate()
+            server.wait()
+
+if __name__ == '__main__':
+    main()
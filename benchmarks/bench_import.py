@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Bulk import check for ThriftIt
+Writes a users CSV where some rows carry an explicit id and some leave it
+blank, interleaved inside every batch, and imports it with import_data.py.
+Then checks that every row arrived, that the explicit ids were kept, and
+that the blank ones got fresh ids. It also reports the import rate.
+
+On PostgreSQL the generated ids come from the id sequence, which must be
+moved past the explicit ids before each generated group goes in; pass
+--database-url to run against one (add --copy to load through COPY).
+By default it uses a throwaway SQLite database.
+
+Exits non-zero if a check fails.
+
+Usage:
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --database-url postgresql://localhost/thriftit_bench --copy
+"""
+
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+def write_users(path, rows):
+    """
+    Every third row has no id. The others count down to 1, so each batch
+    holds ids below the previous one's: a sequence that isn't moved past a
+    batch's explicit ids before its blank rows go in hands out ids that a
+    later batch uses.
+    """
+    explicit = {}
+    next_id = rows - rows // 3
+    with open(path, 'w', newline='', encoding='utf-8') as fh:
+        writer = csv.writer(fh)
+        writer.writerow(['id', 'student_id', 'student_email', 'password_hash'])
+        for i in range(rows):
+            student_id = f'imp{i:06d}'
+            user_id = ''
+            if i % 3 != 2:
+                user_id = explicit[student_id] = next_id
+                next_id -= 1
+            writer.writerow([user_id, student_id, f'{student_id}@student.edu', 'x'])
+    return explicit
+
+def check(condition, message):
+    print(f"   {'✅' if condition else '❌'} {message}")
+    return condition
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a users file with mixed explicit and generated ids")
+    parser.add_argument('--database-url', help="database to import into (default: a throwaway SQLite file)")
+    parser.add_argument('--rows', type=int, default=3000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--copy', action='store_true', help="load through PostgreSQL COPY")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        os.environ.update(FLASK_ENV='production', SECRET_KEY='benchmark-secret-key', SCHEDULER_ENABLED='false',
+                          DATABASE_URL=args.database_url or f"sqlite:///{os.path.join(scratch, 'bench.db')}")
+        from sqlalchemy import select
+        from app import create_app
+        from extensions import db
+        from import_data import run_import, stream_records
+        from models import User
+
+        path = os.path.join(scratch, 'users.csv')
+        explicit = write_users(path, args.rows)
+
+        app = create_app('production')
+        with app.app_context():
+            db.engine.echo = False
+            started = time.perf_counter()
+            try:
+                run_import(users=stream_records(path), batch_size=args.batch_size,
+                           workers=1, use_copy=args.copy, reset=True)
+            except Exception as e:
+                print(f"   ❌ import failed: {e}")
+                sys.exit(1)
+            elapsed = time.perf_counter() - started
+            print(f"📥 {args.rows} users ({len(explicit)} with ids) in batches of {args.batch_size}: "
+                  f"{elapsed:.2f}s ({args.rows / elapsed:,.0f} rows/s)")
+
+            ids = dict(db.session.execute(select(User.student_id, User.id)).all())
+            generated = [ids[sid] for sid in ids if sid not in explicit]
+            ok = check(len(ids) == args.rows, f"all {args.rows} rows imported")
+            ok &= check(all(ids.get(sid) == uid for sid, uid in explicit.items()), "explicit ids kept")
+            ok &= check(len(set(ids.values())) == len(ids), "ids are unique")
+            ok &= check(not set(generated) & set(explicit.values()), "generated ids don't reuse explicit ones")
+
+            # A row added after the import must not collide either
+            db.session.add(User(student_id='after', student_email='after@student.edu', password_hash='x'))
+            try:
+                db.session.commit()
+                ok &= check(True, "the next insert gets a free id")
+            except Exception as e:
+                db.session.rollback()
+                ok &= check(False, f"the next insert gets a free id ({e.__class__.__name__})")
+            db.drop_all()
+            db.engine.dispose()
+
+    if not ok:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+List-view benchmark for ThriftIt
+Loads one /products page of N live listings both ways and reports the
+latency and the memory each holds:
+
+    orm         - Product entities, as the page used to load them: every
+                  column including ``description``, each row registered
+                  in the session's identity map
+    projection  - product_cards() (projections.py): only the columns a card
+                  renders, as ProductCard namedtuples outside the session
+
+Latency is the best-of-N wall time of the query plus building the rows.
+Memory is measured with tracemalloc while the page is held (as it is
+while the template renders, before the session is removed): "held" is
+what is still allocated, "peak" the high-water mark while loading.
+
+Uses a throwaway SQLite database, so only the relative numbers matter.
+
+Usage:
+    python benchmarks/bench_projections.py
+    python benchmarks/bench_projections.py --rows 10000 --description-length 500 --runs 7
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+def seed(db, rows, description_length):
+    """One seller and ``rows`` live listings, inserted in bulk"""
+    from models import Product, User
+    from facets import CONDITIONS
+    from product_feed import CATEGORIES
+
+    seller = User(student_id='bench0001', student_email='bench@student.edu', password_hash='x')
+    db.session.add(seller)
+    db.session.flush()
+    description = ('Barely used, selling because I am graduating. ' * 40)[:description_length]
+    db.session.execute(Product.__table__.insert(), [{
+        'name': f'Listing {i}',
+        'price': 5 + i % 300,
+        'image': f'products/{i:08x}.jpg',
+        'description': description,
+        'category': CATEGORIES[i % len(CATEGORIES)],
+        'condition': CONDITIONS[i % len(CONDITIONS)],
+        'multiple_items': i % 7 == 0,
+        'seller_id': seller.id,
+    } for i in range(rows)])
+    db.session.commit()
+
+def load_orm():
+    from models import Product
+    return Product.live().order_by(Product.id.desc()).all()
+
+def load_projection():
+    from models import Product
+    from projections import product_cards
+    return product_cards(Product.live().order_by(Product.id.desc()))
+
+def measure(label, loader, db, runs):
+    timings = []
+    for _ in range(runs):
+        db.session.remove()
+        gc.collect()
+        start = time.perf_counter()
+        rows = loader()
+        timings.append(time.perf_counter() - start)
+        del rows
+
+    db.session.remove()
+    gc.collect()
+    tracemalloc.start()
+    rows = loader()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    identity_map = len(db.session.identity_map)
+    count = len(rows)
+    del rows
+    db.session.remove()
+
+    print(f"   {label:<11} {min(timings) * 1000:8.1f} ms   held {held / 1024 / 1024:7.2f} MB"
+          f"   peak {peak / 1024 / 1024:7.2f} MB   {held / count:7.0f} B/row"
+          f"   identity map {identity_map}")
+    return min(timings), held
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ORM entities and column projections for list pages")
+    parser.add_argument('--rows', type=int, default=10000, help="live listings on the page")
+    parser.add_argument('--description-length', type=int, default=500,
+                        help="characters of description per listing (upload() caps it at 500)")
+    parser.add_argument('--runs', type=int, default=5, help="timed loads per path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        os.environ.update(FLASK_ENV='production', SECRET_KEY='benchmark-secret-key',
+                          DATABASE_URL=f"sqlite:///{os.path.join(scratch, 'bench.db')}",
+                          SCHEDULER_ENABLED='false')
+        from app import create_app
+        from extensions import db
+
+        app = create_app('production')
+        with app.app_context():
+            db.create_all()
+            seed(db, args.rows, args.description_length)
+
+            print(f"📋 {args.rows} listings, {args.description_length}-character descriptions, best of {args.runs}")
+            orm_time, orm_held = measure("orm", load_orm, db, args.runs)
+            proj_time, proj_held = measure("projection", load_projection, db, args.runs)
+            print(f"\n   projection: {orm_time / proj_time:.1f}x faster, {orm_held / proj_held:.1f}x less memory held")
+            db.engine.dispose()
+
+if __name__ == '__main__':
+    main()
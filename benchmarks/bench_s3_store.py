@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+S3 image store round trip for ThriftIt
+Runs S3ImageStore (storage.py) through save, owns and delete against an
+S3-compatible server, checks that every step did what it should, and
+reports how long each upload took. One image is small enough for a single
+PUT. The other is large enough to go through the multipart path.
+
+By default the server is moto's in-process S3 stand-in (pip install moto),
+so nothing needs to be running. Pass --endpoint to use a real server
+instead, e.g. a local MinIO:
+
+    docker run -p 9000:9000 minio/minio server /data
+    python benchmarks/bench_s3_store.py --endpoint http://localhost:9000 \\
+        --access-key minioadmin --secret-key minioadmin
+
+Exits non-zero if a check fails.
+
+Usage:
+    python benchmarks/bench_s3_store.py
+    python benchmarks/bench_s3_store.py --large-mb 24
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from werkzeug.datastructures import FileStorage
+
+from storage import S3ImageStore
+
+# S3 rejects multipart parts under 5 MB (except the last)
+MIN_PART = 5 * 1024 * 1024
+
+def upload(name, size):
+    data = os.urandom(size)
+    return data, FileStorage(stream=io.BytesIO(data), filename=name, content_type='image/jpeg')
+
+def check(condition, message):
+    print(f"   {'✅' if condition else '❌'} {message}")
+    return condition
+
+def round_trip(store, label, size):
+    """Save, read back and delete one image; returns whether every check passed"""
+    data, file = upload(f'{label}.jpg', size)
+    start = time.perf_counter()
+    ref = store.save(file, 'products')
+    seconds = time.perf_counter() - start
+    print(f"   {label:<6} {size / 1024 / 1024:7.2f} MB uploaded in {seconds * 1000:8.1f} ms")
+
+    key = store.key_for(ref)
+    stored = store.client.get_object(Bucket=store.bucket, Key=key)
+    ok = check(store.owns(ref), f"{label}: the store owns {ref}")
+    ok &= check(key.startswith('products/'), f"{label}: key is under products/")
+    ok &= check(stored['Body'].read() == data, f"{label}: stored bytes match")
+    ok &= check(stored['ContentType'] == 'image/jpeg', f"{label}: content type kept")
+    ok &= check(store.delete(ref), f"{label}: delete() reports it owned the image")
+    remaining = store.client.list_objects_v2(Bucket=store.bucket, Prefix=key).get('KeyCount', 0)
+    ok &= check(remaining == 0, f"{label}: object is gone after delete()")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Round-trip the S3 image store against MinIO or moto")
+    parser.add_argument('--endpoint', help="S3-compatible endpoint (default: in-process moto)")
+    parser.add_argument('--bucket', default='thriftit-bench')
+    parser.add_argument('--access-key', default='testing')
+    parser.add_argument('--secret-key', default='testing')
+    parser.add_argument('--region', default='us-east-1')
+    parser.add_argument('--small-kb', type=int, default=300, help="size of the single-PUT image")
+    parser.add_argument('--large-mb', type=int, default=12, help="size of the multipart image")
+    args = parser.parse_args()
+
+    if args.endpoint:
+        server = contextlib.nullcontext()
+    else:
+        try:
+            from moto import mock_aws
+        except ImportError:
+            sys.exit("moto is not installed: pip install moto, or pass --endpoint")
+        server = mock_aws()
+
+    with server:
+        store = S3ImageStore(
+            bucket=args.bucket,
+            endpoint_url=args.endpoint,
+            region=args.region,
+            access_key=args.access_key,
+            secret_key=args.secret_key,
+            multipart_threshold=MIN_PART,
+            multipart_chunksize=MIN_PART
+        )
+        existing = {b['Name'] for b in store.client.list_buckets().get('Buckets', [])}
+        if args.bucket not in existing:
+            store.client.create_bucket(Bucket=args.bucket)
+
+        print(f"🪣 S3 image store against {args.endpoint or 'moto (in process)'}, bucket {args.bucket}")
+        ok = round_trip(store, 'small', args.small_kb * 1024)
+        ok &= round_trip(store, 'large', max(args.large_mb * 1024 * 1024, MIN_PART + 1))
+
+        foreign = 'https://res.cloudinary.com/demo/image/upload/v1/products/x.jpg'
+        ok &= check(not store.owns(foreign), "a Cloudinary URL is not claimed")
+        ok &= check(store.delete(foreign) is False, "delete() of a foreign ref is a no-op")
+
+    if not ok:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
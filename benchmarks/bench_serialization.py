@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Serialization micro-benchmark for ThriftIt
+Encodes the payloads the chat sends most often with each encoder and
+reports the encoded size, the bytes on the wire and the encode CPU time
+per message:
+
+    socket   - one chat message as Socket.IO packets. "before" is the old
+               send path (new_message to the receiver plus a separate
+               message_sent to the sender, both JSON). The others are the
+               single new_message packet sent to both rooms, as JSON text
+               and as msgpack.
+    api      - a /api/conversations response of N messages: the old
+               strftime + standard library jsonify, and the ISO provider
+               with json and orjson (serialization.py)
+
+No server is needed; the packets are built with python-socketio's own
+packet classes, so the byte counts match what goes over the socket (before
+Engine.IO framing). A packet emitted to both rooms is encoded once and
+written to both sockets, so it counts twice on the wire.
+
+Usage:
+    python benchmarks/bench_serialization.py
+    python benchmarks/bench_serialization.py --messages 500 --content-length 400
+"""
+
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from socketio import packet
+from socketio.msgpack_packet import MsgPackPacket
+
+from serialization import IsoJSONProvider, OrjsonProvider, socket_timestamp
+
+def time_per_call(fn, repeat):
+    """Best-of-5 seconds per call"""
+    return min(timeit.repeat(fn, number=repeat, repeat=5)) / repeat
+
+def chat_message(n, content_length):
+    return {
+        'id': 100000 + n,
+        'content': ('Is the desk lamp still available? ' * 20)[:content_length],
+        'sender_id': 1234,
+        'receiver_id': 5678,
+        'timestamp': datetime(2026, 3, 14, 15, 9, 26) + timedelta(seconds=n),
+        'sender_name': '20231234'
+    }
+
+def socket_cases(content_length):
+    msg = chat_message(0, content_length)
+
+    def before():
+        timestamp = msg['timestamp'].strftime("%Y-%m-%d %H:%M:%S")
+        received = packet.Packet(packet.EVENT, namespace='/', data=['new_message', dict(msg, timestamp=timestamp)])
+        sent = packet.Packet(packet.EVENT, namespace='/', data=['message_sent', {
+            'id': msg['id'], 'content': msg['content'],
+            'receiver_id': msg['receiver_id'], 'timestamp': timestamp
+        }])
+        return [(received.encode(), 1), (sent.encode(), 1)]
+
+    def single(packet_class):
+        def encode():
+            data = dict(msg, timestamp=socket_timestamp(msg['timestamp']))
+            return [(packet_class(packet.EVENT, namespace='/', data=['new_message', data]).encode(), 2)]
+        return encode
+
+    return {
+        'before (2x json)': before,
+        'json': single(packet.Packet),
+        'msgpack': single(MsgPackPacket),
+    }
+
+def api_cases(messages, content_length):
+    app = Flask(__name__)
+    rows = [chat_message(n, content_length) for n in range(messages)]
+    stdlib, iso, fast = DefaultJSONProvider(app), IsoJSONProvider(app), OrjsonProvider(app)
+
+    def before():
+        body = stdlib.dumps([dict(r, timestamp=r['timestamp'].strftime("%Y-%m-%d %H:%M:%S")) for r in rows])
+        return [(body.encode(), 1)]
+
+    return {
+        'before (strftime)': before,
+        'iso json': lambda: [(iso.dumps(rows).encode(), 1)],
+        'orjson': lambda: [(fast._encode(rows), 1)],
+    }
+
+def report(title, cases, repeat, per):
+    print(f"\n{title}")
+    baseline = None
+    for name, fn in cases.items():
+        encoded = fn()
+        size = sum(len(data) for data, _ in encoded)
+        wire = sum(len(data) * recipients for data, recipients in encoded)
+        seconds = time_per_call(fn, repeat)
+        baseline = baseline or (wire, seconds)
+        print(f"   {name:<18} {size / per:8.1f} B encoded  {wire / per:8.1f} B wire"
+              f"   {seconds / per * 1e6:7.2f} µs/msg"
+              f"   ({wire / baseline[0] * 100:5.1f}% wire, {seconds / baseline[1] * 100:5.1f}% CPU)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON and msgpack encoding of chat payloads")
+    parser.add_argument('--messages', type=int, default=200, help="messages in the conversation response")
+    parser.add_argument('--content-length', type=int, default=80, help="characters per message")
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"📦 {args.content_length}-character messages")
+    report("Socket.IO chat message (one send, both rooms)",
+           socket_cases(args.content_length), args.repeat, 1)
+    report(f"/api/conversations response ({args.messages} messages)",
+           api_cases(args.messages, args.content_length), max(1, args.repeat // args.messages), args.messages)
+
+if __name__ == '__main__':
+    main()
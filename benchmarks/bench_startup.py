@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for ThriftIt
+Times a fresh interpreter importing the application and building it with
+create_app(). Pass --baseline <git ref> to time the same cold start on an
+older revision (where everything happened at import) for comparison.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 10 --baseline HEAD~1
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import io
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_ONLY = """
+import time
+start = time.perf_counter()
+import app
+print(time.perf_counter() - start)
+"""
+
+FACTORY = """
+import time
+start = time.perf_counter()
+import app
+if hasattr(app, 'create_app'):
+    app.create_app({config!r})
+print(time.perf_counter() - start)
+"""
+
+def time_child(code, cwd, env):
+    """Run ``code`` in a fresh interpreter and return the time it reports"""
+    result = subprocess.run(
+        [sys.executable, '-c', code], cwd=cwd, env=env,
+        capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+def measure(label, code, cwd, env, runs):
+    samples = [time_child(code, cwd, env) for _ in range(runs)]
+    print(f"   {label:<28} median {statistics.median(samples) * 1000:8.1f} ms"
+          f"   min {min(samples) * 1000:8.1f} ms")
+    return statistics.median(samples)
+
+def export_revision(ref, target):
+    """Extract ``ref`` from git into ``target`` without touching the work tree"""
+    archive = subprocess.run(['git', 'archive', '--format=tar', ref],
+                             cwd=REPO_ROOT, capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(target)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure ThriftIt cold-start time")
+    parser.add_argument('--runs', type=int, default=5, help="interpreters per scenario")
+    parser.add_argument('--config', default='production', help="config name for create_app()")
+    parser.add_argument('--baseline', help="git ref to compare against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        env = dict(os.environ,
+                   FLASK_ENV=args.config,
+                   DATABASE_URL=f"sqlite:///{os.path.join(scratch, 'bench.db')}",
+                   SECRET_KEY='benchmark-secret-key')
+
+        print(f"🚀 Cold start, {args.runs} runs each (config: {args.config})")
+        current = measure("import app", IMPORT_ONLY, REPO_ROOT, env, args.runs)
+        measure("import + create_app()", FACTORY.format(config=args.config), REPO_ROOT, env, args.runs)
+
+        if args.baseline:
+            baseline_dir = os.path.join(scratch, 'baseline')
+            export_revision(args.baseline, baseline_dir)
+            print(f"\n📦 Baseline {args.baseline}")
+            baseline = measure("import app", IMPORT_ONLY, baseline_dir, env, args.runs)
+            if current:
+                print(f"\n📊 Import is {baseline / current:.1f}x faster than {args.baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Socket.IO transport benchmark for ThriftIt
+Starts the app in a child process and opens N client connections with each
+transport policy, reporting connections per second and the server's resident
+memory per open connection.
+
+    websocket        - WebSocket only (the default policy's first attempt)
+    polling          - long-polling only
+    polling-upgrade  - long-polling first, then upgrade (the old chat.js policy)
+
+Needs python-socketio's client extras: pip install "python-socketio[client]"
+
+Usage:
+    python benchmarks/bench_transport.py --connections 100
+    python benchmarks/bench_transport.py --async-mode eventlet --modes websocket polling
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import socketio
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    'websocket': ['websocket'],
+    'polling': ['polling'],
+    'polling-upgrade': ['polling', 'websocket'],
+}
+
+SERVER = """
+import sys
+sys.path.insert(0, {root!r})
+from app import create_app
+from extensions import db, socketio
+app = create_app('testing')
+with app.app_context():
+    db.create_all()
+socketio.run(app, host='127.0.0.1', port={port}, allow_unsafe_werkzeug=True, log_output=False)
+"""
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def rss_kb(pid):
+    """Resident set size of a process in KB (Linux only)"""
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+def start_server(port, async_mode):
+    env = dict(os.environ, SOCKETIO_ASYNC_MODE=async_mode,
+               SOCKETIO_TRANSPORTS='websocket,polling')
+    proc = subprocess.Popen(
+        [sys.executable, '-c', SERVER.format(root=REPO_ROOT, port=port)],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Server did not start")
+
+def run_mode(name, url, pid, connections):
+    transports = MODES[name]
+    clients = []
+    base = rss_kb(pid)
+    start = time.perf_counter()
+    for _ in range(connections):
+        client = socketio.Client(reconnection=False)
+        client.connect(url, transports=transports, wait_timeout=10)
+        clients.append(client)
+    elapsed = time.perf_counter() - start
+    # Let upgrades and handshakes settle before sampling memory
+    time.sleep(1)
+    per_conn = (rss_kb(pid) - base) / connections
+    upgraded = sum(1 for c in clients if c.transport() == 'websocket')
+    for client in clients:
+        client.disconnect()
+    time.sleep(0.5)
+    print(f"   {name:<16} {connections / elapsed:8.1f} conn/s"
+          f"   {per_conn:8.1f} KB/conn   websocket {upgraded}/{connections}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Socket.IO transports")
+    parser.add_argument('--connections', type=int, default=50)
+    parser.add_argument('--async-mode', default='threading')
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+    args = parser.parse_args()
+
+    port = free_port()
+    server = start_server(port, args.async_mode)
+    url = f"http://127.0.0.1:{port}"
+    print(f"🔌 {args.connections} connections per mode, async_mode={args.async_mode}")
+    try:
+        for name in args.modes:
+            run_mode(name, url, server.pid, args.connections)
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == '__main__':
+    main()
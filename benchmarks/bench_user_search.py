@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+User search check for ThriftIt
+Seeds a user directory and runs typeahead queries through search_users()
+(user_search.py). Each result is compared with a brute-force answer built
+from search_keys(): the users with a key starting with the query, ordered
+by their smallest such key, then by id. Reports the median query time.
+
+SQLite answers from the in-memory prefix index and PostgreSQL from the
+trigram index, so run it against both to check that they agree. By
+default it uses a throwaway SQLite database.
+
+Exits non-zero if any query differs.
+
+Usage:
+    python benchmarks/bench_user_search.py
+    python benchmarks/bench_user_search.py --database-url postgresql://localhost/thriftit_bench
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+FIRST = ['Aisha', 'Ahmad', 'Bob', 'Bobby', 'Chen', 'Daniel', 'Dani', 'Farah', 'Hui Min', 'Jun', 'Mei', 'Nur']
+LAST = ['Tan', 'Bo', 'Lim', 'Abdullah', 'Wong', 'Lee', 'Tanaka', 'Ng', 'Ong', 'Ramasamy', 'Smith']
+
+def seed(db, rows, rng):
+    from models import User
+    users = []
+    for i in range(rows):
+        name = f"{rng.choice(FIRST)} {rng.choice(LAST)}" if i % 5 else None
+        student_id = f"{rng.choice('ABC')}{rng.randrange(10**6):06d}"
+        users.append({'student_id': f"{student_id}{i}", 'student_email': f"{student_id.lower()}.{i}@student.edu",
+                      'full_name': name, 'password_hash': 'x'})
+    db.session.execute(User.__table__.insert(), users)
+    db.session.commit()
+
+def expected(users, query, limit, exclude_id):
+    """Brute force over search_keys(), in the order the prefix index returns"""
+    from user_search import search_keys
+    ranked = []
+    for user_id, student_id, full_name, email in users:
+        if user_id == exclude_id:
+            continue
+        keys = [key for key in search_keys(student_id, full_name, email) if key.startswith(query)]
+        if keys:
+            ranked.append((min(keys), user_id))
+    return [user_id for _, user_id in sorted(ranked)[:limit]]
+
+def queries(users, rng, count):
+    """Prefixes of real keys, plus a few that match nothing or contain LIKE wildcards"""
+    from user_search import search_keys
+    picked = ['b', 'bo', 'bob', 'tan', 'hui min', 'a0', 'zzz', '%', 'a_', '.', '@student']
+    while len(picked) < count:
+        _, student_id, full_name, email = rng.choice(users)
+        key = rng.choice(sorted(search_keys(student_id, full_name, email)))
+        picked.append(key[:rng.randint(1, min(len(key), 6))])
+    return picked
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that user search gives the same answers on every backend")
+    parser.add_argument('--database-url', help="database to seed (default: a throwaway SQLite file)")
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        os.environ.update(FLASK_ENV='production', SECRET_KEY='benchmark-secret-key', SCHEDULER_ENABLED='false',
+                          DATABASE_URL=args.database_url or f"sqlite:///{os.path.join(scratch, 'bench.db')}")
+        from sqlalchemy import select
+        from app import create_app
+        from extensions import db
+        from models import User
+        from user_search import search_users, ensure_search_indexes, MAX_LIMIT
+
+        app = create_app('production')
+        with app.app_context():
+            db.engine.echo = False
+            db.drop_all()
+            db.create_all()
+            ensure_search_indexes()
+            seed(db, args.rows, rng)
+            users = db.session.execute(
+                select(User.id, User.student_id, User.full_name, User.student_email)).all()
+
+            print(f"🔎 {args.rows} users on {db.engine.dialect.name}, {args.queries} queries")
+            timings, failures = [], 0
+            for query in queries(users, rng, args.queries):
+                exclude_id = rng.choice(users)[0]
+                start = time.perf_counter()
+                got = [u['id'] for u in search_users(query, limit=MAX_LIMIT, exclude_id=exclude_id)]
+                timings.append(time.perf_counter() - start)
+                want = expected(users, query.strip().lower(), MAX_LIMIT, exclude_id)
+                if got != want:
+                    failures += 1
+                    if failures <= 5:
+                        print(f"   ❌ {query!r}: got {got[:6]}, expected {want[:6]}")
+
+            print(f"   median {statistics.median(timings) * 1000:.2f} ms per query")
+            print(f"   {'✅' if not failures else '❌'} {args.queries - failures}/{args.queries} queries match")
+            db.drop_all()
+            db.engine.dispose()
+
+    if failures:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
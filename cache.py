@@ -0,0 +1,114 @@
+"""
+Small in-process cache for read-mostly data.
+
+Values are stored with an expiry time and recomputed on the next read once
+they expire. Routes read through ``get_or_set``. Write paths publish the
+entities they change on the invalidation bus (invalidation.py), and every
+worker evicts the keys built from them. Keys that are evicted this way can
+live for CACHE_DEFAULT_TTL. Counts of messages and wishlist rows are not
+published, so site stats keep a short TTL. The scheduler warms the hot keys
+in the background so page loads rarely wait on a recompute.
+"""
+
+import threading
+import time
+
+from sqlalchemy import func
+
+from extensions import db
+from invalidation import bus
+from models import Product, User, Message, Wishlist
+from projections import seller_cards
+
+class TTLCache:
+    """Thread-safe dict of key -> (expires_at, value)"""
+
+    def __init__(self, default_ttl=300):
+        self.default_ttl = default_ttl
+        self._data = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return default
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+        return value
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_or_set(self, key, loader, ttl=None):
+        """Return the cached value, computing and storing it on a miss"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = self.set(key, loader(), ttl)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {'keys': len(self._data), 'hits': self.hits, 'misses': self.misses}
+
+cache = TTLCache()
+
+# ============================================================================
+# CACHED VIEWS
+# ============================================================================
+
+NEWEST_PRODUCTS_KEY = 'newest_products'
+SITE_STATS_KEY = 'site_stats'
+SITE_STATS_TTL = 600
+
+def load_newest_products(limit=4):
+    """The latest listings as product cards"""
+    return seller_cards(Product.live().order_by(Product.id.desc()), limit)
+
+def newest_products():
+    return cache.get_or_set(NEWEST_PRODUCTS_KEY, load_newest_products)
+
+def load_site_stats():
+    """Marketplace-wide counts"""
+    by_category = dict(
+        db.session.query(Product.category, func.count(Product.id))
+        .filter(Product.deleted_at.is_(None)).group_by(Product.category).all()
+    )
+    return {
+        'users': db.session.query(func.count(User.id)).scalar(),
+        'products': sum(by_category.values()),
+        'products_by_category': by_category,
+        'messages': db.session.query(func.count(Message.id)).scalar(),
+        'wishlist_items': db.session.query(func.count(Wishlist.id)).scalar()
+    }
+
+def site_stats():
+    return cache.get_or_set(SITE_STATS_KEY, load_site_stats, ttl=SITE_STATS_TTL)
+
+def invalidate_products(*product_ids):
+    """Call after products are created, deleted or relisted; every worker evicts its copies"""
+    bus.publish('product', *product_ids)
+
+@bus.on('product')
+def _evict_product_views(product_ids):
+    # Both views span all listings, so any listing change makes them stale
+    cache.delete(NEWEST_PRODUCTS_KEY, SITE_STATS_KEY)
+
+def init_cache(app):
+    cache.default_ttl = app.config.get('CACHE_DEFAULT_TTL', cache.default_ttl)
+    return cache
@@ -1,47 +1,226 @@
 import os
+import secrets
 from datetime import timedelta
 
+def get_database_url():
+    database_url = os.environ.get('DATABASE_URL', 'sqlite:///products.db')
+    # Handle postgres:// vs postgresql:// issue for Render
+    if database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
+    return database_url
+
 class Config:
     """Application configuration class"""
-    
+
     # Security Configuration
-    SECRET_KEY = os.environ.get('SECRET_KEY') or os.urandom(24)
-    
+    # A random key is generated when SECRET_KEY is not set (development only)
+    SECRET_KEY = os.environ.get('SECRET_KEY') or secrets.token_urlsafe(32)
+    SECRET_KEY_FROM_ENV = bool(os.environ.get('SECRET_KEY'))
+
     # Database Configuration
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///products.db'
+    SQLALCHEMY_DATABASE_URI = get_database_url()
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    
+
     # Upload Configuration
-    UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
+    UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     MAX_CONTENT_LENGTH = 5 * 1024 * 1024  # 5MB max file size
-    
+
     # Session Configuration
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
     SESSION_COOKIE_SECURE = os.environ.get('FLASK_ENV') == 'production'
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
-    
+
     # File Upload Security
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-    
+
     # Socket.IO Configuration
-    SOCKETIO_ASYNC_MODE = 'threading'
+    SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE', 'threading')
+
+    # Transports in the order clients try them. WebSocket first skips the
+    # long-polling handshake; polling stays as the fallback for proxies that
+    # block upgrades. Set SOCKETIO_TRANSPORTS=polling,websocket to go back.
+    SOCKETIO_TRANSPORTS = [
+        t.strip() for t in os.environ.get('SOCKETIO_TRANSPORTS', 'websocket,polling').split(',') if t.strip()
+    ]
+
+    # Engine.IO heartbeat: the server pings every PING_INTERVAL seconds and
+    # drops a client that doesn't answer within PING_TIMEOUT seconds
+    SOCKETIO_PING_INTERVAL = int(os.environ.get('SOCKETIO_PING_INTERVAL', 25))
+    SOCKETIO_PING_TIMEOUT = int(os.environ.get('SOCKETIO_PING_TIMEOUT', 60))
+
+    # Payloads smaller than the threshold (bytes) are sent uncompressed
+    SOCKETIO_HTTP_COMPRESSION = os.environ.get('SOCKETIO_HTTP_COMPRESSION', 'true').lower() == 'true'
+    SOCKETIO_COMPRESSION_THRESHOLD = int(os.environ.get('SOCKETIO_COMPRESSION_THRESHOLD', 1024))
+    SOCKETIO_MAX_HTTP_BUFFER_SIZE = int(os.environ.get('SOCKETIO_MAX_HTTP_BUFFER_SIZE', 1000000))
+
+    # Connection limits: a global cap, a per-account cap (open tabs), and the
+    # number of seconds without events after which a socket is disconnected
+    # (0 disables reaping)
+    SOCKETIO_MAX_CONNECTIONS = int(os.environ.get('SOCKETIO_MAX_CONNECTIONS', 1000))
+    SOCKETIO_MAX_CONNECTIONS_PER_USER = int(os.environ.get('SOCKETIO_MAX_CONNECTIONS_PER_USER', 5))
+    SOCKETIO_IDLE_TIMEOUT = int(os.environ.get('SOCKETIO_IDLE_TIMEOUT', 1800))
+
+    # Presence: online changes are batched into one frame per watcher every
+    # PRESENCE_FLUSH_INTERVAL seconds; a "typing" state is re-sent at most
+    # once per TYPING_REFRESH_INTERVAL seconds
+    PRESENCE_FLUSH_INTERVAL = float(os.environ.get('PRESENCE_FLUSH_INTERVAL', 2))
+    TYPING_REFRESH_INTERVAL = float(os.environ.get('TYPING_REFRESH_INTERVAL', 3))
+
+    # Outbox (outbox.py): the last OUTBOX_SIZE chat events per user are kept
+    # for OUTBOX_RETENTION seconds, so a reconnecting client gets only the gap
+    OUTBOX_SIZE = int(os.environ.get('OUTBOX_SIZE', 200))
+    OUTBOX_RETENTION = int(os.environ.get('OUTBOX_RETENTION', 900))
+
+    # Optional message queue (e.g. redis://localhost:6379/0) so room emits
+    # reach sockets held by other worker processes
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+
+    # Packet format: 'default' (JSON text) or 'msgpack' (binary frames; every
+    # page then loads static/socketio_msgpack.js), see serialization.py
+    SOCKETIO_SERIALIZER = os.environ.get('SOCKETIO_SERIALIZER', 'default')
+
+    # Encoder behind jsonify(): 'orjson' or 'json' (the standard library)
+    JSON_ENCODER = os.environ.get('JSON_ENCODER', 'orjson')
+
+    # Threads running the Flask routes under the ASGI server (asgi.py)
+    ASGI_HTTP_WORKERS = int(os.environ.get('ASGI_HTTP_WORKERS', 10))
+
+    # Image Storage Configuration: 'local', 'cloudinary' or 's3'
+    # (defaults to cloudinary when its credentials are set, else local)
+    IMAGE_STORE = os.environ.get('IMAGE_STORE')
+
+    # Cloudinary Configuration (optional, imported lazily when set)
+    CLOUDINARY_CLOUD_NAME = os.environ.get('CLOUDINARY_CLOUD_NAME')
+    CLOUDINARY_API_KEY = os.environ.get('CLOUDINARY_API_KEY')
+    CLOUDINARY_API_SECRET = os.environ.get('CLOUDINARY_API_SECRET')
+
+    # S3-compatible object storage (AWS S3, MinIO, R2, ...)
+    S3_BUCKET = os.environ.get('S3_BUCKET')
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')
+    S3_REGION = os.environ.get('S3_REGION')
+    S3_ACCESS_KEY_ID = os.environ.get('S3_ACCESS_KEY_ID')
+    S3_SECRET_ACCESS_KEY = os.environ.get('S3_SECRET_ACCESS_KEY')
+    S3_PUBLIC_URL = os.environ.get('S3_PUBLIC_URL')
+    S3_MULTIPART_THRESHOLD = 8 * 1024 * 1024
+    S3_MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+
+    # Message tiering: messages older than MESSAGE_HOT_DAYS move to the
+    # archive table; archived messages older than MESSAGE_RETENTION_DAYS are
+    # deleted (unset keeps them forever)
+    MESSAGE_HOT_DAYS = int(os.environ.get('MESSAGE_HOT_DAYS', 90))
+    MESSAGE_RETENTION_DAYS = int(os.environ['MESSAGE_RETENTION_DAYS']) if os.environ.get('MESSAGE_RETENTION_DAYS') else None
+    MESSAGE_ARCHIVE_BATCH = 5000
+
+    # Deleted listings can be relisted for this many days before they are
+    # purged along with their images
+    PRODUCT_PURGE_AFTER_DAYS = int(os.environ.get('PRODUCT_PURGE_AFTER_DAYS', 7))
+    PRODUCT_PURGE_BATCH = 500
+
+    # Background jobs (see scheduler.py). Leave SCHEDULER_ENABLED off when a
+    # separate `python scheduler.py` worker runs them instead.
+    SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'true').lower() == 'true'
+    SCHEDULER_TICK = int(os.environ.get('SCHEDULER_TICK', 30))
+    ORPHAN_IMAGE_GRACE = 3600  # seconds before an unreferenced upload may be removed
+    ORPHAN_IMAGE_GC_DELETE = True
+
+    # Related listings on the product page (see recommendations.py)
+    RECOMMENDATIONS_TOP_K = 10
+    RECOMMENDATION_MAX_TERMS = 20000
+    RECOMMENDATION_WEIGHTS = {'text': 0.45, 'wishlist': 0.25, 'category': 0.15, 'condition': 0.05, 'price': 0.10}
+
+    # View counts and the home page "Trending" section (see popularity.py)
+    VIEW_FLUSH_INTERVAL = int(os.environ.get('VIEW_FLUSH_INTERVAL', 30))  # seconds between batched writes
+    VIEW_BUFFER_MAX_PRODUCTS = 10000  # unflushed products kept while the database is unreachable
+    TRENDING_HALF_LIFE_HOURS = float(os.environ.get('TRENDING_HALF_LIFE_HOURS', 24))
+    TRENDING_WEIGHTS = {'view': 1.0, 'wishlist': 5.0}
+    TRENDING_MIN_SCORE = 1.0
+
+    # Saved searches matched against new listings (see saved_searches.py)
+    SAVED_SEARCHES_PER_USER = 20
+
+    # Rate limiting (see rate_limit.py): rule -> (burst capacity, seconds to
+    # refill it). Buckets are per process unless RATE_LIMIT_STORAGE_URL
+    # points at a shared Redis.
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_STORAGE_URL = os.environ.get('RATE_LIMIT_STORAGE_URL', 'memory://')
+    RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', 100000))
+    RATE_LIMIT_PROXY_COUNT = int(os.environ.get('RATE_LIMIT_PROXY_COUNT', 0))  # trusted proxies in front of the app
+    RATE_LIMITS = {
+        'login_ip': (20, 300),
+        'login_account': (5, 300),     # per address and student ID
+        'register': (5, 3600),
+        'upload': (20, 3600),
+        'profile': (10, 300),
+        'change_password': (5, 900),
+        'bulk_listing': (30, 60),
+        'wishlist': (60, 60),
+        'search': (30, 10),
+        'saved_search': (20, 300),
+        'api': (120, 60),
+        'socket_send_message': (20, 10),
+        'socket_typing': (20, 10),
+        'socket_join': (10, 60),
+        'socket_watch': (20, 60),
+    }
+
+    # Student IDs allowed to use the admin endpoints (comma-separated)
+    ADMIN_STUDENT_IDS = {s.strip() for s in os.environ.get('ADMIN_STUDENT_IDS', '').split(',') if s.strip()}
+
+    # On-demand request profiling (see profiling.py)
+    PROFILER_INTERVAL = float(os.environ.get('PROFILER_INTERVAL', 0.005))  # seconds between stack samples
+    PROFILER_MAX_SECONDS = 30
+    PROFILER_TOKEN_MAX_AGE = 3600
+
+    # Cache invalidation across workers (see invalidation.py): 'auto',
+    # 'postgres' (LISTEN/NOTIFY), 'file' (SQLite development) or 'none'
+    INVALIDATION_TRANSPORT = os.environ.get('INVALIDATION_TRANSPORT', 'auto')
+    INVALIDATION_FILE = os.environ.get('INVALIDATION_FILE')  # default: next to the SQLite database
+    INVALIDATION_POLL_INTERVAL = 0.5
+    # Cached views are evicted by the bus, so they can live long
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 3600))
+
+    # Slow-query log (see slow_queries.py): statements slower than the
+    # threshold are fingerprinted, EXPLAINed once and kept per process
+    SLOW_QUERY_ENABLED = os.environ.get('SLOW_QUERY_ENABLED', 'true').lower() == 'true'
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200))
+    SLOW_QUERY_LOG_SIZE = 500
+    SLOW_QUERY_MAX_FINGERPRINTS = 200
+    SLOW_QUERY_EXPLAIN = True
+
+    # Graceful shutdown (see lifecycle.py): on SIGTERM clients are asked to
+    # reconnect at a random moment within DRAIN_RECONNECT_WINDOW seconds, and
+    # the process exits once they have or after DRAIN_TIMEOUT seconds. Keep
+    # gunicorn's --graceful-timeout above DRAIN_TIMEOUT.
+    DRAIN_TIMEOUT = float(os.environ.get('DRAIN_TIMEOUT', 25))
+    DRAIN_RECONNECT_WINDOW = float(os.environ.get('DRAIN_RECONNECT_WINDOW', 10))
+
+    # Logging Configuration
+    LOG_TO_FILE = False
+    LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
 
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
     SQLALCHEMY_ECHO = True  # Log SQL queries
+    ORPHAN_IMAGE_GC_DELETE = False  # Only report orphans against a local dev database
 
 class ProductionConfig(Config):
-    """Production configuration"""  
+    """Production configuration"""
     DEBUG = False
     SESSION_COOKIE_SECURE = True
+    # On Render and other cloud platforms, use /tmp directory
+    UPLOAD_FOLDER = '/tmp/uploads'
+    SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE', 'eventlet')
+    LOG_TO_FILE = True
 
 class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    SCHEDULER_ENABLED = False
+    RATE_LIMIT_ENABLED = False
 
 # Configuration dictionary
 config = {
@@ -49,4 +228,4 @@ config = {
     'production': ProductionConfig,
     'testing': TestingConfig,
     'default': DevelopmentConfig
-}
\ No newline at end of file
+}
@@ -0,0 +1,32 @@
+# ============================================================================
+# EVENTLET MONKEY PATCH - IMPROVED HANDLING
+# ============================================================================
+# Kept free of Flask/SQLAlchemy imports so entry points can patch the
+# standard library before anything else is loaded.
+import sys
+import importlib.util
+
+def eventlet_available():
+    """Check whether eventlet is installed without importing it"""
+    return importlib.util.find_spec('eventlet') is not None
+
+def setup_eventlet():
+    """
+    Apply the eventlet monkey patch. Entry points that run their own server
+    call this first; gunicorn's eventlet worker patches itself.
+    """
+    try:
+        # Only patch if we're not already patched
+        if not hasattr(sys.modules.get('socket', {}), '_original_socket'):
+            import eventlet
+            eventlet.monkey_patch()
+            print("🔧 Eventlet monkey patch applied successfully")
+            return True
+    except ImportError:
+        print("⚠️  Eventlet not available, falling back to threading mode")
+        return False
+    except Exception as e:
+        print(f"⚠️  Eventlet patch failed: {e}, falling back to threading mode")
+        return False
+    
+    return True
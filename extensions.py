@@ -0,0 +1,17 @@
+"""
+Flask extension instances for ThriftIt.
+
+The extensions are created unbound here and attached to an application
+inside create_app(), so importing them has no side effects.
+"""
+
+from flask_sqlalchemy import SQLAlchemy
+from flask_socketio import SocketIO
+from flask_login import LoginManager
+
+db = SQLAlchemy()
+
+socketio = SocketIO()
+
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'
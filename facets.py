@@ -0,0 +1,154 @@
+"""
+Faceted filtering for the products page.
+
+Shoppers can narrow listings by category, condition, price range and
+rental availability. The page shows a count next to each facet value. As
+usual for faceted search, a facet's own selection is ignored when counting
+that facet's values. Ticking "Like New" doesn't make the other conditions
+drop to zero, but it does change the category counts.
+
+All counts come from one grouped query over the live listings that match
+the search box. It groups by category, condition, price bucket, rental and
+whether the price is inside the chosen range. That yields at most a few
+hundred rows, which are then summed per facet in Python. The listing query
+itself is served by the partial (category, price), (condition, price) and
+(price) indexes on product.
+"""
+
+from collections import Counter
+
+from sqlalchemy import func, case, and_, literal, true
+
+from extensions import db
+from models import Product
+from product_feed import CATEGORIES
+
+CONDITIONS = ['Brand New', 'Like New', 'Lightly Used', 'Well Used', 'Heavily Used']
+
+# (label, low, high): low <= price < high; None is unbounded
+PRICE_BUCKETS = [
+    ('Under RM10', None, 10),
+    ('RM10 - RM25', 10, 25),
+    ('RM25 - RM50', 25, 50),
+    ('RM50 - RM100', 50, 100),
+    ('RM100 - RM250', 100, 250),
+    ('RM250 and above', 250, None),
+]
+
+class ProductFilters:
+    """Filters parsed from the /products query string"""
+
+    def __init__(self, search='', category='', conditions=(), min_price=None, max_price=None, rental=False):
+        self.search = search
+        self.category = category
+        self.conditions = list(conditions)
+        self.min_price = min_price
+        self.max_price = max_price
+        self.rental = rental
+
+    @classmethod
+    def from_args(cls, args):
+        def price(name):
+            value = args.get(name, type=float)
+            return value if value is not None and value >= 0 else None
+
+        category = args.get('category', '').strip()
+        return cls(
+            search=args.get('q', '').strip()[:100],
+            category=category if category in CATEGORIES else '',
+            conditions=[c for c in args.getlist('condition') if c in CONDITIONS],
+            min_price=price('min_price'),
+            max_price=price('max_price'),
+            rental=args.get('rental') == '1'
+        )
+
+    @property
+    def active(self):
+        return bool(self.category or self.conditions or self.rental
+                    or self.min_price is not None or self.max_price is not None)
+
+    def search_clause(self):
+        """Case-insensitive substring match on the name; % and _ in the search are literal, as in matches()"""
+        return Product.name.icontains(self.search, autoescape=True)
+
+    def price_clause(self):
+        clauses = []
+        if self.min_price is not None:
+            clauses.append(Product.price >= self.min_price)
+        if self.max_price is not None:
+            clauses.append(Product.price <= self.max_price)
+        return and_(*clauses) if clauses else true()
+
+    def apply(self, query):
+        """Narrow a Product query by every active filter"""
+        if self.search:
+            query = query.filter(self.search_clause())
+        if self.category:
+            query = query.filter(Product.category == self.category)
+        if self.conditions:
+            query = query.filter(Product.condition.in_(self.conditions))
+        if self.rental:
+            query = query.filter(Product.multiple_items.is_(True))
+        if self.min_price is not None or self.max_price is not None:
+            query = query.filter(self.price_clause())
+        return query
+
+    def matches(self, product):
+        """True if ``product`` would be listed under these filters (the Python twin of apply())"""
+        if self.search and self.search.lower() not in product.name.lower():
+            return False
+        if self.category and product.category != self.category:
+            return False
+        if self.conditions and product.condition not in self.conditions:
+            return False
+        if self.rental and not product.multiple_items:
+            return False
+        if self.min_price is not None and product.price < self.min_price:
+            return False
+        if self.max_price is not None and product.price > self.max_price:
+            return False
+        return True
+
+def price_bucket_expr():
+    """SQL expression giving each listing's index into PRICE_BUCKETS"""
+    whens = [(Product.price < high, i) for i, (_, _, high) in enumerate(PRICE_BUCKETS) if high is not None]
+    return case(*whens, else_=len(PRICE_BUCKETS) - 1)
+
+def facet_counts(filters):
+    """
+    {'category': {...}, 'condition': {...}, 'price': [(label, low, high, n)],
+    'rental': n} for the live listings matching ``filters.search``
+    """
+    bucket = price_bucket_expr()
+    in_range = case((filters.price_clause(), literal(1)), else_=literal(0))
+    query = db.session.query(
+        Product.category, Product.condition, bucket, Product.multiple_items, in_range, func.count(Product.id)
+    ).filter(Product.deleted_at.is_(None))
+    if filters.search:
+        query = query.filter(filters.search_clause())
+    cells = query.group_by(Product.category, Product.condition, bucket, Product.multiple_items, in_range).all()
+
+    def matches(category, condition, rental, priced, skip):
+        return ((skip == 'category' or not filters.category or category == filters.category)
+                and (skip == 'condition' or not filters.conditions or condition in filters.conditions)
+                and (skip == 'rental' or not filters.rental or rental)
+                and (skip == 'price' or priced))
+
+    categories, conditions, prices = Counter(), Counter(), Counter()
+    rental_count = 0
+    for category, condition, bucket_index, rental, priced, count in cells:
+        if matches(category, condition, rental, priced, 'category'):
+            categories[category] += count
+        if matches(category, condition, rental, priced, 'condition'):
+            conditions[condition] += count
+        if matches(category, condition, rental, priced, 'price'):
+            prices[bucket_index] += count
+        if rental and matches(category, condition, rental, priced, 'rental'):
+            rental_count += count
+
+    return {
+        'category': {c: categories.get(c, 0) for c in CATEGORIES},
+        'condition': {c: conditions.get(c, 0) for c in CONDITIONS},
+        'price': [(label, low, high, prices.get(i, 0)) for i, (label, low, high) in enumerate(PRICE_BUCKETS)],
+        'rental': rental_count
+    }
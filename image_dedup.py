@@ -0,0 +1,198 @@
+"""
+Content deduplication for uploaded images.
+
+Uploads are hashed in fixed-size chunks (SHA-256) before anything is written
+to the image store. Byte-identical files map to a single ImageBlob whose
+reference count is bumped instead of storing another copy. New images also
+get a 64-bit perceptual difference hash (dHash) computed with Pillow, which
+is used to warn sellers about near-duplicate photos.
+
+Reference counts only change with single UPDATE statements, so two requests
+adding and dropping references to the same blob can't lose an update. A
+blob whose count reaches zero is deleted in the releasing transaction, but
+its stored object is only removed once that transaction commits. If the
+commit fails, the rows pointing at the image still have their file.
+"""
+
+import hashlib
+
+from flask import current_app
+from sqlalchemy import or_, update, delete, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import ImageBlob
+from storage import CHUNK_SIZE, save_image, delete_image
+
+# Maximum Hamming distance between two dHashes that counts as "near duplicate".
+# Must stay below the number of bands (4) for the banded lookup to be exact.
+NEAR_DUPLICATE_DISTANCE = 3
+
+def sha256_stream(stream):
+    """Hash a stream chunk by chunk and rewind it; returns (hexdigest, size)"""
+    digest = hashlib.sha256()
+    size = 0
+    stream.seek(0)
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+    stream.seek(0)
+    return digest.hexdigest(), size
+
+def difference_hash(stream):
+    """
+    Return the 64-bit dHash of an image stream as an int, or None if the
+    stream can't be decoded (or Pillow isn't installed). Rewinds the stream.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    try:
+        stream.seek(0)
+        with Image.open(stream) as img:
+            # Let JPEG decode at reduced size; we only need a 9x8 thumbnail
+            img.draft('L', (64, 64))
+            small = img.convert('L').resize((9, 8), Image.LANCZOS)
+            pixels = list(small.getdata())
+    except Exception:
+        return None
+    finally:
+        stream.seek(0)
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+def phash_bands(value):
+    """Split a 64-bit hash into four 16-bit bands"""
+    return [(value >> shift) & 0xFFFF for shift in (48, 32, 16, 0)]
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+def find_near_duplicates(value):
+    """Return ImageBlobs whose dHash is within NEAR_DUPLICATE_DISTANCE of ``value``"""
+    if value is None:
+        return []
+    b0, b1, b2, b3 = phash_bands(value)
+    candidates = ImageBlob.query.filter(or_(
+        ImageBlob.phash_b0 == b0,
+        ImageBlob.phash_b1 == b1,
+        ImageBlob.phash_b2 == b2,
+        ImageBlob.phash_b3 == b3
+    ))
+    return [
+        blob for blob in candidates
+        if blob.phash and hamming(int(blob.phash, 16), value) <= NEAR_DUPLICATE_DISTANCE
+    ]
+
+def _acquire(blob):
+    """Add one reference to an existing blob; None if it was released meanwhile"""
+    added = db.session.execute(
+        update(ImageBlob).where(ImageBlob.id == blob.id, ImageBlob.ref_count > 0)
+        .values(ref_count=ImageBlob.ref_count + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not added:
+        return None
+    db.session.refresh(blob)
+    return blob
+
+def store_image(file, kind):
+    """
+    Store an upload, reusing an existing copy when the bytes are identical.
+    Returns (ref, near_duplicates) where near_duplicates is a list of refs of
+    visually similar images that were stored earlier. The caller commits.
+    """
+    sha256, size = sha256_stream(file.stream)
+
+    existing = ImageBlob.query.filter_by(sha256=sha256).first()
+    if existing and _acquire(existing):
+        current_app.logger.info(f"♻️  Reusing stored image {existing.ref} ({existing.ref_count} refs)")
+        return existing.ref, []
+
+    value = difference_hash(file.stream)
+    near = find_near_duplicates(value)
+
+    ref = save_image(file, kind)
+    blob = ImageBlob(sha256=sha256, ref=ref, size=size, ref_count=1)
+    if value is not None:
+        blob.phash = f"{value:016x}"
+        blob.phash_b0, blob.phash_b1, blob.phash_b2, blob.phash_b3 = phash_bands(value)
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(blob)
+    except IntegrityError:
+        # Another request stored the same bytes first: use its copy. Nothing
+        # references ours yet, so it can go at once.
+        existing = ImageBlob.query.filter_by(sha256=sha256).first()
+        if existing is None or not _acquire(existing):
+            raise
+        delete_image(ref)
+        return existing.ref, []
+
+    return ref, [b.ref for b in near]
+
+def _decrement(ref):
+    """Drop one reference in a single statement; returns (blob id, references left) or None"""
+    stmt = (update(ImageBlob).where(ImageBlob.ref == ref)
+            .values(ref_count=ImageBlob.ref_count - 1)
+            .execution_options(synchronize_session=False))
+    if db.engine.dialect.update_returning:
+        row = db.session.execute(stmt.returning(ImageBlob.id, ImageBlob.ref_count)).first()
+        return tuple(row) if row else None
+    if not db.session.execute(stmt).rowcount:
+        return None
+    # The UPDATE holds the row lock, so this reads our own decrement
+    return tuple(db.session.execute(
+        db.select(ImageBlob.id, ImageBlob.ref_count).where(ImageBlob.ref == ref)).first())
+
+def release_image(ref):
+    """
+    Drop one reference to a stored image. When the last reference goes away
+    the blob row is removed, and the stored object is deleted after the
+    caller commits. Images uploaded before deduplication existed have no
+    blob and are left untouched. Returns True if the image is going away.
+    """
+    if not ref:
+        return False
+    released = _decrement(ref)
+    if released is None:
+        return False
+    blob_id, remaining = released
+    if remaining > 0:
+        return False
+
+    db.session.execute(delete(ImageBlob).where(ImageBlob.id == blob_id, ImageBlob.ref_count <= 0)
+                       .execution_options(synchronize_session=False))
+    db.session.info.setdefault('released_images', []).append(ref)
+    return True
+
+# ============================================================================
+# DELETING RELEASED IMAGES AFTER COMMIT
+# ============================================================================
+
+@event.listens_for(Session, 'after_commit')
+def _delete_released_images(session):
+    for ref in session.info.pop('released_images', []):
+        try:
+            delete_image(ref)
+        except Exception as e:
+            # Only orphaned storage: no row points at it any more
+            current_app.logger.warning(f"Could not delete stored image {ref}: {str(e)}")
+
+@event.listens_for(Session, 'after_rollback')
+def _keep_released_images(session):
+    # The blob rows are back, so their images must stay
+    session.info.pop('released_images', None)
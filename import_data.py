@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Bulk data import tool for ThriftIt
+Streams CSV or JSONL files for users, products, messages and wishlists
+into the database in batches.
+
+Usage:
+    python import_data.py --users users.csv --products products.jsonl \
+        --messages messages.csv --wishlists wishlists.csv
+
+Foreign keys can be given either as raw ids (seller_id, sender_id, ...) or
+as student IDs (seller_student_id, sender_student_id, receiver_student_id,
+student_id) which are resolved against the users table.
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, select, text
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from extensions import db
+from models import User, Product, Message, Wishlist
+
+DEFAULT_BATCH_SIZE = 1000
+
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y', 'on'}
+
+# ============================================================================
+# INPUT STREAMING
+# ============================================================================
+
+def stream_records(path):
+    """Yield one dict per row from a .csv or .jsonl/.ndjson file"""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, newline='', encoding='utf-8') as fh:
+        if ext == '.csv':
+            yield from csv.DictReader(fh)
+        elif ext in ('.jsonl', '.ndjson'):
+            for line_no, line in enumerate(fh, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"{path}:{line_no}: invalid JSON ({e})") from e
+        else:
+            raise ValueError(f"Unsupported file type for {path}: use .csv or .jsonl")
+
+def batched(iterable, size):
+    """Split an iterable into lists of at most ``size`` items"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+# ============================================================================
+# ROW PREPARATION
+# ============================================================================
+
+def _coerce(column, value):
+    """Convert a raw CSV/JSON value to the Python type of ``column``"""
+    if value is None or (value == '' and (column.nullable or column.primary_key)):
+        return None
+
+    col_type = column.type
+    if isinstance(col_type, Boolean):
+        return value if isinstance(value, bool) else str(value).strip().lower() in TRUE_VALUES
+    if isinstance(col_type, Integer):
+        return int(value)
+    if isinstance(col_type, Float):
+        return float(value)
+    if isinstance(col_type, DateTime):
+        return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    return str(value)
+
+def prepare_row(table, record):
+    """
+    Build a complete insert row for ``table`` from ``record``.
+    Every column is present in the result, a missing primary key as None;
+    Python-side column defaults are applied for missing values.
+    """
+    row = {}
+    for column in table.columns:
+        value = _coerce(column, record.get(column.name))
+        if value is None and column.default is not None:
+            default = column.default
+            value = default.arg(None) if default.is_callable else default.arg
+        row[column.name] = value
+    return row
+
+def split_by_keys(table, rows):
+    """
+    Split prepared rows into batches that each share the same keys: rows
+    with an explicit primary key, and rows without one (the key column left
+    out so the database assigns it). An executemany or COPY needs one
+    column list for the whole batch. Returns (explicit, generated).
+    """
+    pk_names = [column.name for column in table.primary_key.columns]
+    explicit, generated = [], []
+    for row in rows:
+        if any(row[name] is None for name in pk_names):
+            generated.append({k: v for k, v in row.items() if k not in pk_names})
+        else:
+            explicit.append(row)
+    return explicit, generated
+
+# ============================================================================
+# BATCH WRITERS
+# ============================================================================
+
+def _copy_batch(table, rows):
+    """Load a batch with PostgreSQL COPY ... FROM STDIN"""
+    columns = list(rows[0].keys())
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([
+            '' if row[c] is None else
+            ('t' if row[c] else 'f') if isinstance(row[c], bool) else
+            row[c].isoformat() if isinstance(row[c], datetime) else
+            row[c]
+            for c in columns
+        ])
+    buffer.seek(0)
+
+    connection = db.session.connection()
+    preparer = connection.dialect.identifier_preparer
+    column_sql = ', '.join(preparer.quote(c) for c in columns)
+    sql = f"COPY {preparer.format_table(table)} ({column_sql}) FROM STDIN WITH (FORMAT csv)"
+
+    cursor = connection.connection.driver_connection.cursor()
+    try:
+        cursor.copy_expert(sql, buffer)
+    finally:
+        cursor.close()
+
+def _insert_batch(table, rows, use_copy):
+    if use_copy:
+        _copy_batch(table, rows)
+    else:
+        db.session.execute(table.insert(), rows)
+
+def supports_copy():
+    """COPY is only available on PostgreSQL through psycopg2"""
+    return db.engine.dialect.name == 'postgresql' and db.engine.dialect.driver == 'psycopg2'
+
+def reset_sequence(table):
+    """Move a PostgreSQL id sequence past ids that were imported explicitly"""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    db.session.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('\"{table.name}\"', 'id'), "
+        f"COALESCE((SELECT MAX(id) FROM \"{table.name}\"), 1))"
+    ))
+
+# ============================================================================
+# IMPORT STATISTICS
+# ============================================================================
+
+class ImportStats:
+    """Row count and throughput for one imported entity"""
+
+    def __init__(self, entity):
+        self.entity = entity
+        self.rows = 0
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+        return self
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (f"{self.entity}: {self.rows} rows in {self.seconds:.2f}s "
+                f"({self.rows_per_second:,.0f} rows/s)")
+
+# ============================================================================
+# ENTITY IMPORTERS
+# ============================================================================
+
+def _student_id_lookup():
+    """Map student_id -> user id for resolving natural-key references"""
+    return dict(db.session.execute(select(User.student_id, User.id)).all())
+
+def _resolve(record, field, lookup):
+    """Replace ``<field>_student_id`` with ``<field>_id`` using ``lookup``"""
+    key = f"{field}_student_id"
+    if record.get(f"{field}_id") in (None, '') and record.get(key):
+        try:
+            record[f"{field}_id"] = lookup[record[key]]
+        except KeyError:
+            raise ValueError(f"Unknown {key}: {record[key]}") from None
+    return record
+
+def _import(table, entity, records, batch_size, use_copy, transform=None):
+    stats = ImportStats(entity)
+    for batch in batched(records, batch_size):
+        if transform:
+            batch = transform(batch)
+        rows = [prepare_row(table, record) for record in batch]
+        explicit, generated = split_by_keys(table, rows)
+        if explicit:
+            _insert_batch(table, explicit, use_copy)
+            # Generated ids must start past the ones just inserted
+            reset_sequence(table)
+        if generated:
+            _insert_batch(table, generated, use_copy)
+        db.session.commit()
+        stats.rows += len(rows)
+    return stats.finish()
+
+def import_users(records, batch_size=DEFAULT_BATCH_SIZE, use_copy=False, pool=None):
+    """
+    Import users. Rows carry either a plain ``password`` (hashed here, in
+    ``pool`` when one is given) or an existing ``password_hash``.
+    """
+    def hash_batch(batch):
+        batch = [dict(r) for r in batch]
+        pending = [r for r in batch if not r.get('password_hash')]
+        passwords = [r.pop('password', '') or '' for r in pending]
+        if pool is not None and len(passwords) > 1:
+            chunksize = max(1, len(passwords) // ((os.cpu_count() or 1) * 4))
+            hashes = pool.map(generate_password_hash, passwords, chunksize=chunksize)
+        else:
+            hashes = map(generate_password_hash, passwords)
+        for record, password_hash in zip(pending, hashes):
+            record['password_hash'] = password_hash
+        return batch
+
+    return _import(User.__table__, 'users', records, batch_size, use_copy, hash_batch)
+
+def import_products(records, batch_size=DEFAULT_BATCH_SIZE, use_copy=False):
+    """Import products; sellers may be given as seller_student_id"""
+    lookup = _student_id_lookup()
+    resolve = lambda batch: [_resolve(dict(r), 'seller', lookup) for r in batch]
+    return _import(Product.__table__, 'products', records, batch_size, use_copy, resolve)
+
+def import_messages(records, batch_size=DEFAULT_BATCH_SIZE, use_copy=False):
+    """Import messages; parties may be given as sender/receiver_student_id"""
+    lookup = _student_id_lookup()
+    resolve = lambda batch: [
+        _resolve(_resolve(dict(r), 'sender', lookup), 'receiver', lookup) for r in batch
+    ]
+    return _import(Message.__table__, 'messages', records, batch_size, use_copy, resolve)
+
+def import_wishlists(records, batch_size=DEFAULT_BATCH_SIZE, use_copy=False):
+    """Import wishlist rows; the owner may be given as student_id"""
+    lookup = _student_id_lookup()
+
+    def resolve(batch):
+        resolved = []
+        for record in batch:
+            record = dict(record)
+            if record.get('user_id') in (None, '') and record.get('student_id'):
+                record['user_student_id'] = record['student_id']
+            resolved.append(_resolve(record, 'user', lookup))
+        return resolved
+
+    return _import(Wishlist.__table__, 'wishlists', records, batch_size, use_copy, resolve)
+
+def run_import(users=None, products=None, messages=None, wishlists=None,
+               batch_size=DEFAULT_BATCH_SIZE, workers=None, use_copy=False, reset=False):
+    """
+    Import the given iterables of records in dependency order.
+    Must be called inside an application context. Returns a list of
+    ImportStats, one per imported entity.
+    """
+    if use_copy and not supports_copy():
+        print("⚠️  COPY requires PostgreSQL with psycopg2, using batched INSERT instead")
+        use_copy = False
+
+    if reset:
+        db.drop_all()
+    db.create_all()
+
+    results = []
+    pool = ProcessPoolExecutor(max_workers=workers) if users is not None and workers != 1 else None
+    try:
+        if users is not None:
+            results.append(import_users(users, batch_size, use_copy, pool))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if products is not None:
+        results.append(import_products(products, batch_size, use_copy))
+    if messages is not None:
+        results.append(import_messages(messages, batch_size, use_copy))
+    if wishlists is not None:
+        results.append(import_wishlists(wishlists, batch_size, use_copy))
+    return results
+
+# ============================================================================
+# COMMAND LINE
+# ============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import ThriftIt data from CSV/JSONL files")
+    parser.add_argument('--users', help="users file (.csv or .jsonl)")
+    parser.add_argument('--products', help="products file (.csv or .jsonl)")
+    parser.add_argument('--messages', help="messages file (.csv or .jsonl)")
+    parser.add_argument('--wishlists', help="wishlists file (.csv or .jsonl)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"rows per INSERT/COPY batch (default {DEFAULT_BATCH_SIZE})")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="password hashing processes (default: CPU count)")
+    parser.add_argument('--copy', action='store_true',
+                        help="use PostgreSQL COPY instead of batched INSERT")
+    parser.add_argument('--reset', action='store_true',
+                        help="drop and recreate all tables before importing")
+    args = parser.parse_args(argv)
+
+    sources = {
+        name: stream_records(path) if path else None
+        for name, path in (('users', args.users), ('products', args.products),
+                           ('messages', args.messages), ('wishlists', args.wishlists))
+    }
+    if not any(source is not None for source in sources.values()):
+        parser.error("nothing to import: pass at least one of --users/--products/--messages/--wishlists")
+
+    app = create_app()
+    with app.app_context():
+        # Statement echo (DevelopmentConfig) would dominate a bulk load
+        db.engine.echo = False
+        print("📥 Importing data...")
+        started = time.perf_counter()
+        results = run_import(batch_size=args.batch_size, workers=args.workers,
+                             use_copy=args.copy, reset=args.reset, **sources)
+        elapsed = time.perf_counter() - started
+
+    for stats in results:
+        print(f"   ✅ {stats}")
+    total = sum(stats.rows for stats in results)
+    rate = total / elapsed if elapsed else 0.0
+    print(f"\n📊 Imported {total} rows in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Cross-worker cache invalidation bus.
+
+Every worker keeps its own in-process caches (cache.py, the user search
+prefix index). When one worker changes an entity it publishes an event such
+as ``('product', [12, 13])``. Every worker then runs the handlers that
+caches registered for that entity, so each evicts exactly what went stale.
+
+    bus.publish('product', product.id)
+
+    @bus.on('product')
+    def evict(ids): ...          # ids == () means "all of them"
+
+Handlers run in the publishing worker at once, and in the others when the
+event arrives over the transport (INVALIDATION_TRANSPORT):
+
+* postgres: NOTIFY on the ``thriftit_invalidate`` channel. Each worker
+  LISTENs on one dedicated connection.
+* file (SQLite development): JSON lines appended to a file next to the
+  database, which every worker tails every INVALIDATION_POLL_INTERVAL.
+* none: a single process, nothing to tell.
+* auto (default): postgres on PostgreSQL, otherwise file (none for
+  in-memory SQLite).
+
+Events are not replayed. After the listener loses its connection, or the
+file is truncated, every handler runs with ``()`` so a worker never keeps
+serving data it might have missed changes to.
+"""
+
+import json
+import os
+import socket
+import threading
+from collections import defaultdict
+
+from sqlalchemy import text
+
+from extensions import db, socketio
+
+CHANNEL = 'thriftit_invalidate'
+MAX_PAYLOAD = 3500  # bytes; larger id lists are sent as "all" (NOTIFY caps at 8000)
+
+def _origin():
+    # Evaluated per message: forked workers share the parent's import state
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+# ============================================================================
+# TRANSPORTS
+# ============================================================================
+
+class PostgresTransport:
+    """NOTIFY to publish; LISTEN on a dedicated psycopg2 connection to receive"""
+
+    name = 'postgres'
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def send(self, payload):
+        with self.engine.connect() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"), {'channel': CHANNEL, 'payload': payload})
+            conn.commit()
+
+    def listen(self, deliver, connected, sleep):
+        import select
+        conn = self.engine.raw_connection()
+        conn.detach()  # held for the life of the listener, not returned to the pool
+        try:
+            raw = conn.dbapi_connection
+            raw.autocommit = True
+            raw.cursor().execute(f"LISTEN {CHANNEL}")
+            connected()
+            while True:
+                if select.select([raw], [], [], 5.0)[0]:
+                    raw.poll()
+                    while raw.notifies:
+                        deliver(raw.notifies.pop(0).payload)
+        finally:
+            conn.close()
+
+class FileTransport:
+    """Appends one JSON line per event to ``path``; every worker tails it"""
+
+    name = 'file'
+
+    def __init__(self, path, poll_interval=0.5, max_bytes=1024 * 1024):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.max_bytes = max_bytes
+
+    def send(self, payload):
+        # O_APPEND writes of one short line don't interleave between processes
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, payload.encode() + b'\n')
+            if os.fstat(fd).st_size > self.max_bytes:
+                os.truncate(self.path, 0)
+        finally:
+            os.close(fd)
+
+    def listen(self, deliver, connected, sleep):
+        position = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        connected()
+        while True:
+            sleep(self.poll_interval)
+            try:
+                size = os.path.getsize(self.path)
+            except FileNotFoundError:
+                size = 0
+            if size < position:
+                # Truncated since the last read: events may have been missed
+                raise TransportReset()
+            if size == position:
+                continue
+            with open(self.path, 'rb') as f:
+                f.seek(position)
+                chunk = f.read(size - position)
+            # Only consume whole lines; a write in progress is read next time
+            complete = chunk.rfind(b'\n') + 1
+            position += complete
+            for line in chunk[:complete].splitlines():
+                if line:
+                    deliver(line.decode())
+
+class TransportReset(Exception):
+    """The transport may have dropped events"""
+
+# ============================================================================
+# BUS
+# ============================================================================
+
+class InvalidationBus:
+    """Entity-change events fanned out to every worker's cache handlers"""
+
+    def __init__(self):
+        self.transport = None
+        self._handlers = defaultdict(list)
+        self._lock = threading.Lock()
+        self._started = False
+        self._needs_resync = False
+        self.connected = False
+        self.published = 0
+        self.received = 0
+        self.resyncs = 0
+        self.errors = 0
+
+    def configure(self, transport):
+        self.transport = transport
+
+    def on(self, entity):
+        """Decorator: call ``handler(ids)`` whenever ``entity`` changes in any worker"""
+        def decorator(handler):
+            self._handlers[entity].append(handler)
+            return handler
+        return decorator
+
+    def dispatch(self, entity, ids):
+        for handler in self._handlers.get(entity, ()):
+            try:
+                handler(ids)
+            except Exception as e:
+                self.errors += 1
+                print(f"⚠️  Invalidation handler {handler.__name__} failed: {str(e)}")
+
+    def resync(self):
+        """Evict everything: run every handler with ids == ()"""
+        self.resyncs += 1
+        for entity in list(self._handlers):
+            self.dispatch(entity, ())
+
+    def publish(self, entity, *ids, local=True):
+        """Announce that ``ids`` of ``entity`` changed (no ids: all of them)"""
+        ids = tuple(int(i) for i in ids)
+        if local:
+            self.dispatch(entity, ids)
+        if self.transport is None:
+            return
+        payload = json.dumps({'o': _origin(), 'e': entity, 'i': ids})
+        if len(payload) > MAX_PAYLOAD:
+            payload = json.dumps({'o': _origin(), 'e': entity, 'i': []})
+        try:
+            self.transport.send(payload)
+            self.published += 1
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠️  Invalidation publish failed, other workers may serve stale {entity} data: {str(e)}")
+
+    def _deliver(self, payload):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        if message.get('o') == _origin():
+            return  # applied when it was published
+        self.received += 1
+        self.dispatch(message.get('e'), tuple(message.get('i') or ()))
+
+    def _connected(self):
+        # Anything published while we weren't listening is lost; start clean
+        if self._needs_resync:
+            self._needs_resync = False
+            self.resync()
+        self.connected = True
+
+    def _listen_loop(self):
+        backoff = 1
+        while True:
+            try:
+                self.transport.listen(self._deliver, self._connected, socketio.sleep)
+            except TransportReset:
+                self.resync()
+                continue
+            except Exception as e:
+                self.errors += 1
+                if self.connected:
+                    backoff = 1  # it was working; retry quickly
+                print(f"⚠️  Invalidation listener stopped: {str(e)}; retrying in {backoff}s")
+            self.connected = False
+            self._needs_resync = True
+            socketio.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+
+    def start(self):
+        """Start listening once, in the server's async mode"""
+        with self._lock:
+            if self._started or self.transport is None:
+                return
+            self._started = True
+        socketio.start_background_task(self._listen_loop)
+        print(f"📣 Cache invalidation bus listening ({self.transport.name})")
+
+    def stats(self):
+        return {
+            'transport': self.transport.name if self.transport else 'none',
+            'listening': bool(self.connected),
+            'published': self.published,
+            'received': self.received,
+            'resyncs': self.resyncs,
+            'errors': self.errors,
+            'handlers': {entity: len(h) for entity, h in self._handlers.items()},
+        }
+
+bus = InvalidationBus()
+
+def make_transport(app, engine):
+    """The transport INVALIDATION_TRANSPORT selects for ``engine``"""
+    kind = app.config.get('INVALIDATION_TRANSPORT', 'auto')
+    backend = engine.dialect.name
+    if kind == 'auto':
+        if backend == 'postgresql':
+            kind = 'postgres'
+        elif backend == 'sqlite' and engine.url.database not in (None, '', ':memory:'):
+            kind = 'file'
+        else:
+            kind = 'none'
+    if kind == 'postgres':
+        return PostgresTransport(engine)
+    if kind == 'file':
+        path = app.config.get('INVALIDATION_FILE') or f"{engine.url.database}.invalidation"
+        return FileTransport(path, app.config.get('INVALIDATION_POLL_INTERVAL', 0.5))
+    return None
+
+def init_invalidation(app):
+    """Pick this app's transport (bus.start() begins receiving)"""
+    with app.app_context():
+        bus.configure(make_transport(app, db.engine))
+    app.extensions['invalidation'] = bus
+    return bus
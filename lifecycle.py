@@ -0,0 +1,179 @@
+"""
+Graceful shutdown (connection draining) and the liveness and readiness probes.
+
+When the process gets SIGTERM (a deploy or restart), it drains instead of
+dropping every chat socket at once:
+
+1. Readiness (/health/ready) starts failing, and new Socket.IO connections
+   are refused, so the load balancer sends new clients to the new instance.
+2. Every connected client gets ``server_draining`` with a reconnect window.
+   Each client waits a random delay inside the window before it reconnects,
+   so the new instance isn't hit by every client at the same moment.
+3. Buffered writes are flushed (the @on_drain hooks, e.g. view counters),
+   and the scheduler stops starting jobs.
+4. The process waits until the clients have left or DRAIN_TIMEOUT has
+   passed. It then disconnects whoever is left, flushes again and exits.
+
+socket.io clients don't reconnect by themselves after a refused
+connection or a server-side disconnect. The chat and products scripts do
+it themselves, after a random delay within the reconnect window.
+
+Under the ASGI server (asgi.py) uvicorn owns SIGTERM, and the sockets live
+on an AsyncServer. asgi.py therefore takes the signal over from uvicorn at
+startup, runs the same steps on the event loop, and then passes the signal
+on to uvicorn.
+
+Under gunicorn, the worker's own SIGTERM handler runs straight after step 1,
+so the worker stops accepting connections. Gunicorn then waits for open
+connections up to --graceful-timeout, which must be longer than
+DRAIN_TIMEOUT. Under ``socketio.run`` nobody else is waiting, so the signal
+is re-raised once the drain has finished.
+
+/health/live answers as long as the process can serve a request at all (no
+database). /health/ready also requires that startup has finished and that
+the process isn't draining. /health still checks the database.
+"""
+
+import os
+import signal
+import threading
+import time
+
+from extensions import db, socketio
+
+NAMESPACES = ('/', '/products')
+
+class Lifecycle:
+    """Startup and shutdown state of this process"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.ready = False
+        self.draining = False
+        self.drained = False
+        self.drain_started_at = None
+        self._hooks = []
+        self._app = None
+        self._previous_handler = None
+        self._lock = threading.Lock()
+        # The Socket.IO server whose clients are drained (asgi.py sets its own)
+        self.server = None
+
+    def on_drain(self, hook):
+        """Decorator: run ``hook()`` (in an app context) when the process drains, and again before it exits"""
+        self._hooks.append(hook)
+        return hook
+
+    def mark_ready(self):
+        self.ready = True
+
+    def install(self, app):
+        """Drain on SIGTERM. Only possible from the main thread; returns whether it was installed."""
+        self._app = app
+        previous = signal.getsignal(signal.SIGTERM)
+        try:
+            signal.signal(signal.SIGTERM, self._handle_sigterm)
+        except ValueError:
+            return False  # not the main thread
+        self._previous_handler = previous
+        return True
+
+    def uninstall(self):
+        """Give SIGTERM back to whoever had it before install()"""
+        if signal.getsignal(signal.SIGTERM) == self._handle_sigterm:
+            signal.signal(signal.SIGTERM, self._previous_handler or signal.SIG_DFL)
+
+    def _handle_sigterm(self, signum, frame):
+        if self.drained and self._previous_handler == signal.SIG_DFL:
+            # Re-raised by _drain(): exit the way the default handler would have
+            raise SystemExit(0)
+        self._defer(self.begin_drain)
+        if callable(self._previous_handler):
+            # A graceful server (gunicorn): it stops accepting and waits for us
+            self._previous_handler(signum, frame)
+
+    def _defer(self, fn):
+        """Call ``fn`` from the signal handler without blocking in it"""
+        try:
+            from eventlet import patcher
+        except ImportError:
+            patcher = None
+        if patcher is not None and patcher.is_monkey_patched('thread'):
+            # Under eventlet the handler runs inside the hub, which can't
+            # switch to another greenlet; spawn_n only schedules one
+            import eventlet
+            eventlet.spawn_n(fn)
+        else:
+            fn()
+
+    def mark_draining(self):
+        """Flip to draining (readiness fails, connections are refused); False if already draining"""
+        with self._lock:
+            if self.draining:
+                return False
+            self.draining = True
+            self.drain_started_at = time.time()
+        print("🚰 Draining: refusing new connections and asking clients to reconnect")
+        return True
+
+    def begin_drain(self):
+        """Stop taking new work and start draining in the background; idempotent"""
+        if not self.mark_draining():
+            return False
+        socketio.start_background_task(self._drain)
+        return True
+
+    def connected_sids(self):
+        """(namespace, sid) of every Socket.IO client connected to this process"""
+        manager = (self.server or socketio.server).manager
+        return [(namespace, sid)
+                for namespace in list(manager.get_namespaces())
+                for sid, _ in manager.get_participants(namespace, None)]
+
+    def run_hooks(self, app):
+        """Run every @on_drain hook, e.g. to flush buffered writes"""
+        with app.app_context():
+            for hook in self._hooks:
+                try:
+                    hook()
+                except Exception as e:
+                    app.logger.error(f"Drain hook {hook.__name__} failed: {str(e)}")
+                finally:
+                    db.session.remove()
+
+    def _drain(self):
+        app = self._app
+        timeout = app.config.get('DRAIN_TIMEOUT', 25)
+        window = app.config.get('DRAIN_RECONNECT_WINDOW', 10)
+        try:
+            for namespace in NAMESPACES:
+                socketio.emit('server_draining', {'reconnect_window_ms': int(window * 1000)}, namespace=namespace)
+            self.run_hooks(app)
+
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline and self.connected_sids():
+                socketio.sleep(0.5)
+
+            remaining = self.connected_sids()
+            for namespace, sid in remaining:
+                socketio.server.disconnect(sid, namespace=namespace)
+            self.run_hooks(app)
+            print(f"🚰 Drained after {time.time() - self.drain_started_at:.1f}s "
+                  f"({len(remaining)} connection(s) closed at the deadline)")
+        finally:
+            self.drained = True
+            if self._previous_handler == signal.SIG_DFL:
+                # Nobody else is waiting to stop the server
+                os.kill(os.getpid(), signal.SIGTERM)
+
+    def status(self):
+        return {
+            'pid': os.getpid(),
+            'uptime': round(time.time() - self.started_at, 1),
+            'ready': self.ready and not self.draining,
+            'draining': self.draining,
+            'drained': self.drained,
+            'connections': len(self.connected_sids()) if self.server or socketio.server else 0,
+        }
+
+lifecycle = Lifecycle()
@@ -0,0 +1,142 @@
+"""
+Listing lifecycle: soft delete, relist and asynchronous purge.
+
+Deleting a listing is a single UPDATE that stamps ``deleted_at``. Listing
+queries go through Product.live(), which the partial indexes on product
+cover. Sellers can delete or relist many listings at once. The
+purge_deleted_products job later removes rows deleted more than
+PRODUCT_PURGE_AFTER_DAYS ago, in batches. The database cascades those
+deletes to wishlists, and the job releases each listing's stored image.
+"""
+
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event, inspect, update, delete, select, text
+
+from extensions import db
+from models import Product, Wishlist
+from image_dedup import release_image
+from scheduler import job
+
+# Bulk requests are capped so one call can't lock the whole table
+MAX_BULK_IDS = 500
+
+def soft_delete_products(seller_id, product_ids):
+    """
+    Mark the seller's live listings among ``product_ids`` as deleted in one
+    UPDATE. Returns the (id, category) pairs that were deleted.
+    """
+    ids = list(product_ids)[:MAX_BULK_IDS]
+    if not ids:
+        return []
+    owned_and_live = (Product.id.in_(ids), Product.seller_id == seller_id, Product.deleted_at.is_(None))
+    stmt = (
+        update(Product).where(*owned_and_live)
+        .values(deleted_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if db.engine.dialect.update_returning:
+        rows = db.session.execute(stmt.returning(Product.id, Product.category)).all()
+    else:
+        # No UPDATE ... RETURNING: read the matching rows first
+        rows = db.session.execute(select(Product.id, Product.category).where(*owned_and_live)).all()
+        db.session.execute(stmt)
+    return [(r.id, r.category) for r in rows]
+
+def relist_products(seller_id, product_ids):
+    """Undo a soft delete for the seller's listings that haven't been purged yet"""
+    ids = list(product_ids)[:MAX_BULK_IDS]
+    if not ids:
+        return []
+    db.session.execute(
+        update(Product)
+        .where(Product.id.in_(ids), Product.seller_id == seller_id, Product.deleted_at.is_not(None))
+        .values(deleted_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    return Product.live().filter(Product.id.in_(ids), Product.seller_id == seller_id).all()
+
+def purge_deleted(older_than, batch_size=500):
+    """
+    Physically delete listings soft-deleted before ``older_than`` and release
+    their images, one batch per transaction. Returns the number purged.
+    """
+    purged = 0
+    cascade = wishlist_cascades()
+    while True:
+        rows = db.session.execute(
+            select(Product.id, Product.image)
+            .where(Product.deleted_at < older_than)
+            .order_by(Product.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        ids = [r.id for r in rows]
+        if not cascade:
+            # Tables created before ON DELETE CASCADE existed
+            db.session.execute(delete(Wishlist).where(Wishlist.product_id.in_(ids)))
+        db.session.execute(delete(Product).where(Product.id.in_(ids)))
+        for row in rows:
+            release_image(row.image)
+        db.session.commit()
+        purged += len(ids)
+    return purged
+
+# ============================================================================
+# SCHEMA SUPPORT
+# ============================================================================
+
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores ON DELETE CASCADE unless foreign keys are switched on
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
+
+def wishlist_cascades():
+    """True if the wishlist -> product foreign key deletes in the database"""
+    for fk in inspect(db.engine).get_foreign_keys('wishlist'):
+        if fk['referred_table'] == 'product':
+            return (fk.get('options') or {}).get('ondelete', '').upper() == 'CASCADE'
+    return False
+
+def ensure_listing_schema():
+    """
+    Bring tables created before soft delete up to date: add
+    product.deleted_at, the partial indexes, and (on PostgreSQL) the
+    cascading wishlist foreign key. create_all() only creates missing tables.
+    """
+    columns = {c['name'] for c in inspect(db.engine).get_columns('product')}
+    if 'deleted_at' not in columns:
+        db.session.execute(text('ALTER TABLE product ADD COLUMN deleted_at TIMESTAMP'))
+        db.session.commit()
+        print("🔧 Added product.deleted_at")
+    for index in Product.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+
+    if db.engine.dialect.name == 'postgresql' and not wishlist_cascades():
+        db.session.execute(text(
+            'ALTER TABLE wishlist DROP CONSTRAINT IF EXISTS wishlist_product_id_fkey, '
+            'ADD CONSTRAINT wishlist_product_id_fkey FOREIGN KEY (product_id) '
+            'REFERENCES product (id) ON DELETE CASCADE'
+        ))
+        db.session.commit()
+        print("🔧 Wishlist rows now cascade with their product")
+
+def init_listings(app):
+    """Turn on SQLite foreign key enforcement for this app's engine"""
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', _enable_sqlite_foreign_keys)
+
+# ============================================================================
+# JOBS
+# ============================================================================
+
+@job('purge_deleted_products', interval=3600)
+def purge_deleted_products_job():
+    """Remove listings past the relist window, with their wishlist rows and images"""
+    days = current_app.config.get('PRODUCT_PURGE_AFTER_DAYS', 7)
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    purged = purge_deleted(cutoff, current_app.config.get('PRODUCT_PURGE_BATCH', 500))
+    return f"purged {purged} listing(s) deleted over {days} days ago"
@@ -0,0 +1,136 @@
+"""
+Message archive tiering and retention.
+
+The hot Message table keeps the last MESSAGE_HOT_DAYS of chat history,
+which is all that the chat page, inbox and Socket.IO handlers read. Older
+rows are moved in batches to archived_message by the archive_messages job.
+They are read back only when a user scrolls past the live window
+(get_conversation with ``before_id``). If MESSAGE_RETENTION_DAYS is set,
+archived messages older than that are deleted by purge_archived_messages.
+"""
+
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select, insert, delete, case, literal, DateTime
+
+from extensions import db
+from models import Message, ArchivedMessage
+from scheduler import job
+
+def pair(a, b):
+    """The (low, high) key used to index a conversation in the archive"""
+    return (a, b) if a <= b else (b, a)
+
+def archive_messages(older_than, batch_size=5000):
+    """
+    Move messages with ``timestamp < older_than`` to the archive table in
+    batches of ``batch_size``, committing after each batch so locks stay
+    short. Returns the number of rows moved.
+    """
+    moved = 0
+    now = datetime.utcnow()
+    sender_first = Message.sender_id <= Message.receiver_id
+    while True:
+        # Oldest first, in ix_message_timestamp order, so the batch is an index range
+        ids = db.session.execute(
+            select(Message.id).where(Message.timestamp < older_than)
+            .order_by(Message.timestamp, Message.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+
+        # INSERT ... SELECT keeps the copy inside the database
+        db.session.execute(insert(ArchivedMessage).from_select(
+            ['id', 'content', 'timestamp', 'sender_id', 'receiver_id', 'user_low', 'user_high', 'archived_at'],
+            select(
+                Message.id, Message.content, Message.timestamp, Message.sender_id, Message.receiver_id,
+                case((sender_first, Message.sender_id), else_=Message.receiver_id),
+                case((sender_first, Message.receiver_id), else_=Message.sender_id),
+                literal(now, DateTime)
+            ).where(Message.id.in_(ids))
+        ))
+        db.session.execute(delete(Message).where(Message.id.in_(ids)))
+        db.session.commit()
+        moved += len(ids)
+        if len(ids) < batch_size:
+            break
+    return moved
+
+def purge_archive(older_than, batch_size=5000):
+    """Delete archived messages with ``timestamp < older_than``; returns the count"""
+    purged = 0
+    while True:
+        ids = db.session.execute(
+            select(ArchivedMessage.id).where(ArchivedMessage.timestamp < older_than).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        db.session.execute(delete(ArchivedMessage).where(ArchivedMessage.id.in_(ids)))
+        db.session.commit()
+        purged += len(ids)
+    return purged
+
+def ensure_archive_schema():
+    """
+    Add the timestamp indexes that the archive and purge batches filter on
+    to tables created before them. create_all() only creates missing tables.
+    """
+    for model in (Message, ArchivedMessage):
+        for index in model.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+
+# ============================================================================
+# READ PATH
+# ============================================================================
+
+def archived_conversation(user_a, user_b, before_id=None, limit=50):
+    """
+    Up to ``limit`` archived messages between two users with an id below
+    ``before_id`` (ids grow with time), returned oldest first.
+    """
+    low, high = pair(user_a, user_b)
+    query = ArchivedMessage.query.filter(
+        ArchivedMessage.user_low == low, ArchivedMessage.user_high == high
+    )
+    if before_id is not None:
+        query = query.filter(ArchivedMessage.id < before_id)
+    rows = query.order_by(ArchivedMessage.id.desc()).limit(limit).all()
+    rows.reverse()
+    return rows
+
+def has_archived(user_a, user_b):
+    low, high = pair(user_a, user_b)
+    return db.session.query(
+        ArchivedMessage.query.filter_by(user_low=low, user_high=high).exists()
+    ).scalar()
+
+def latest_archived(user_a, user_b):
+    """Most recent archived message of a conversation (for the inbox preview)"""
+    low, high = pair(user_a, user_b)
+    return (ArchivedMessage.query.filter_by(user_low=low, user_high=high)
+            .order_by(ArchivedMessage.id.desc()).first())
+
+# ============================================================================
+# JOBS
+# ============================================================================
+
+@job('archive_messages', interval=3600)
+def archive_messages_job():
+    """Move messages past the hot window into the archive"""
+    days = current_app.config.get('MESSAGE_HOT_DAYS')
+    if not days:
+        return 'disabled'
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    moved = archive_messages(cutoff, current_app.config.get('MESSAGE_ARCHIVE_BATCH', 5000))
+    return f"archived {moved} message(s) older than {days} days"
+
+@job('purge_archived_messages', interval=24 * 3600)
+def purge_archived_messages_job():
+    """Apply MESSAGE_RETENTION_DAYS to the archive"""
+    days = current_app.config.get('MESSAGE_RETENTION_DAYS')
+    if not days:
+        return 'disabled (retain forever)'
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    purged = purge_archive(cutoff, current_app.config.get('MESSAGE_ARCHIVE_BATCH', 5000))
+    return f"purged {purged} archived message(s) older than {days} days"
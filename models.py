@@ -0,0 +1,217 @@
+# ============================================================================
+# DATABASE MODELS
+# ============================================================================
+from datetime import datetime
+
+from flask_login import UserMixin
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from extensions import db, login_manager
+
+class Product(db.Model):
+    id             = db.Column(db.Integer, primary_key=True)
+    name           = db.Column(db.String(100), nullable=False)
+    price          = db.Column(db.Float, nullable=False)
+    image          = db.Column(db.String(500), nullable=False)  # Increased length for URLs
+    description    = db.Column(db.Text, nullable=True)
+    category       = db.Column(db.String(50), nullable=False)
+    condition      = db.Column(db.String(50), nullable=False)
+    multiple_items = db.Column(db.Boolean, default=False)
+    seller_id      = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    deleted_at     = db.Column(db.DateTime, nullable=True)  # set when the seller removes the listing
+
+    # Relationship to User (seller)
+    seller = db.relationship('User', backref=db.backref('products', lazy=True))
+
+    # Listing pages only ever read rows that aren't soft-deleted, so the
+    # indexes they use skip deleted rows entirely
+    __table_args__ = (
+        db.Index('ix_product_live_category', 'category', 'id',
+                 postgresql_where=db.text('deleted_at IS NULL'),
+                 sqlite_where=db.text('deleted_at IS NULL')),
+        db.Index('ix_product_live_seller', 'seller_id', 'id',
+                 postgresql_where=db.text('deleted_at IS NULL'),
+                 sqlite_where=db.text('deleted_at IS NULL')),
+        # Faceted browsing (facets.py): price ranges within a category or
+        # condition, and price ranges on their own
+        db.Index('ix_product_live_category_price', 'category', 'price',
+                 postgresql_where=db.text('deleted_at IS NULL'),
+                 sqlite_where=db.text('deleted_at IS NULL')),
+        db.Index('ix_product_live_condition_price', 'condition', 'price',
+                 postgresql_where=db.text('deleted_at IS NULL'),
+                 sqlite_where=db.text('deleted_at IS NULL')),
+        db.Index('ix_product_live_price', 'price',
+                 postgresql_where=db.text('deleted_at IS NULL'),
+                 sqlite_where=db.text('deleted_at IS NULL')),
+    )
+
+    @classmethod
+    def live(cls):
+        """Query over listings that haven't been deleted"""
+        return cls.query.filter(cls.deleted_at.is_(None))
+
+class User(db.Model, UserMixin):
+    id            = db.Column(db.Integer, primary_key=True)
+    student_id    = db.Column(db.String(50), unique=True, nullable=False)
+    student_email = db.Column(db.String(120), unique=True, nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)  # Increased from 128 to 255
+    full_name     = db.Column(db.String(100), nullable=True)
+    profile_picture = db.Column(db.String(500), nullable=True, default='default-avatar.png')  # Increased for URLs
+    messages_sent     = db.relationship('Message', foreign_keys='Message.sender_id', backref='sender', lazy='dynamic')
+    messages_received = db.relationship('Message', foreign_keys='Message.receiver_id', backref='receiver', lazy='dynamic')
+
+    def set_password(self, password):
+        self.password_hash = generate_password_hash(password)
+
+    def check_password(self, password):
+        return check_password_hash(self.password_hash, password)
+
+    def get_profile_picture(self):
+        """Return the profile picture filename or default"""
+        return self.profile_picture if self.profile_picture else 'default-avatar.png'
+
+    def get_display_name(self):
+        """Return full name if available, otherwise student ID"""
+        return self.full_name if self.full_name else self.student_id
+
+    @property
+    def active_products(self):
+        """This user's listings that haven't been deleted, newest first"""
+        return Product.live().filter_by(seller_id=self.id).order_by(Product.id.desc()).all()
+
+class Message(db.Model):
+    id          = db.Column(db.Integer, primary_key=True)
+    content     = db.Column(db.Text, nullable=False)
+    timestamp   = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    sender_id   = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    receiver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
+class ArchivedMessage(db.Model):
+    """
+    Messages moved out of the hot Message table once they pass
+    MESSAGE_HOT_DAYS. Rows keep their original id. ``user_low``/``user_high``
+    is the conversation pair in a fixed order, so one index serves both
+    directions of a conversation.
+    """
+    id          = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    content     = db.Column(db.Text, nullable=False)
+    timestamp   = db.Column(db.DateTime, nullable=False, index=True)
+    sender_id   = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    receiver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_low    = db.Column(db.Integer, nullable=False)
+    user_high   = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    sender = db.relationship('User', foreign_keys=[sender_id])
+
+    __table_args__ = (
+        db.Index('ix_archived_message_pair', 'user_low', 'user_high', 'id'),
+    )
+
+class Wishlist(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), nullable=False)
+    date_added = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # Relationships (the database removes wishlist rows with their product)
+    user = db.relationship('User', backref=db.backref('wishlist_items', lazy=True))
+    product = db.relationship('Product', backref=db.backref('wishlisted_by', lazy=True, passive_deletes=True))
+
+    # Ensure a user can't add the same product twice
+    __table_args__ = (db.UniqueConstraint('user_id', 'product_id', name='unique_user_product'),)
+
+class ProductRecommendation(db.Model):
+    """
+    Precomputed top-K related listings for a product (see recommendations.py).
+    The primary key (product_id, rank) is the index the detail page reads.
+    """
+    product_id  = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), primary_key=True)
+    rank        = db.Column(db.Integer, primary_key=True)
+    similar_id  = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), nullable=False, index=True)
+    score       = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class RecommendationMarker(db.Model):
+    """
+    When a product's neighbours were last computed. Kept even when none
+    scored above zero (no product_recommendation rows), so the incremental
+    refresh doesn't recompute such a product on every run.
+    """
+    product_id  = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), primary_key=True)
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+class ProductStats(db.Model):
+    """
+    Popularity counters for a product (see popularity.py), kept out of the
+    product row so counting views never locks the listing itself.
+    ``recent_*`` is activity not yet folded into ``trend_score``.
+    """
+    product_id       = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), primary_key=True)
+    views            = db.Column(db.Integer, nullable=False, default=0)
+    recent_views     = db.Column(db.Integer, nullable=False, default=0)
+    recent_wishlists = db.Column(db.Integer, nullable=False, default=0)
+    trend_score      = db.Column(db.Float, nullable=False, default=0.0, index=True)
+
+class SavedSearch(db.Model):
+    """
+    A /products search a student wants to hear about: the search box text
+    and facet filters (see facets.ProductFilters). New listings are matched
+    against every saved search as they are uploaded (saved_searches.py).
+    ``conditions`` is '|'-separated. Matching listings with an id above
+    ``seen_product_id`` haven't been shown to the owner on /products yet.
+    """
+    id            = db.Column(db.Integer, primary_key=True)
+    user_id       = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    search        = db.Column(db.String(100), nullable=False, default='')
+    category      = db.Column(db.String(50), nullable=False, default='')
+    conditions    = db.Column(db.String(200), nullable=False, default='')
+    min_price     = db.Column(db.Float, nullable=True)
+    max_price     = db.Column(db.Float, nullable=True)
+    rental        = db.Column(db.Boolean, nullable=False, default=False)
+    created_at    = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    match_count   = db.Column(db.Integer, nullable=False, default=0)
+    last_match_at = db.Column(db.DateTime, nullable=True)
+    seen_product_id = db.Column(db.Integer, nullable=False, default=0)
+
+class ImageBlob(db.Model):
+    """
+    One stored image, shared by every product or profile that uses the same
+    bytes. ``ref`` is the reference returned by the image store and
+    ``ref_count`` the number of rows pointing at it.
+    """
+    id         = db.Column(db.Integer, primary_key=True)
+    sha256     = db.Column(db.String(64), unique=True, nullable=False)
+    ref        = db.Column(db.String(500), unique=True, nullable=False)
+    size       = db.Column(db.Integer, nullable=False)
+    ref_count  = db.Column(db.Integer, nullable=False, default=1)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # 64-bit difference hash, plus its four 16-bit bands for indexed
+    # near-duplicate lookup (two hashes within Hamming distance 3 always
+    # share at least one band)
+    phash      = db.Column(db.String(16), nullable=True)
+    phash_b0   = db.Column(db.Integer, nullable=True, index=True)
+    phash_b1   = db.Column(db.Integer, nullable=True, index=True)
+    phash_b2   = db.Column(db.Integer, nullable=True, index=True)
+    phash_b3   = db.Column(db.Integer, nullable=True, index=True)
+
+class JobRun(db.Model):
+    """One execution of a scheduled job"""
+    id          = db.Column(db.Integer, primary_key=True)
+    name        = db.Column(db.String(100), nullable=False, index=True)
+    worker      = db.Column(db.String(100), nullable=False)
+    status      = db.Column(db.String(20), nullable=False, default='running')  # running, success, failed
+    detail      = db.Column(db.Text, nullable=True)
+    started_at  = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+class JobLock(db.Model):
+    """Lease that stops two workers from running the same job at once"""
+    name         = db.Column(db.String(100), primary_key=True)
+    locked_by    = db.Column(db.String(100), nullable=False)
+    locked_until = db.Column(db.DateTime, nullable=False)
+
+@login_manager.user_loader
+def load_user(user_id):
+    return User.query.get(int(user_id))
@@ -0,0 +1,159 @@
+"""
+Per-user outbox: sequence numbers on chat events, replayed on reconnect.
+
+Events a socket misses while it is disconnected used to be gone for good.
+The only way back was refetching the whole conversation from
+/api/conversations/<user_id>. Now every event sent to a ``user_{id}`` room
+through ``outbox.send`` gets that user's next sequence number (``seq``). The
+last OUTBOX_SIZE events per user stay in memory for OUTBOX_RETENTION
+seconds.
+
+A client remembers the highest ``seq`` it has handled. It sends that, plus
+the outbox ``epoch``, with its ``join`` after every reconnect. That is its
+acknowledgement. The server replays only the events after it, then answers
+``joined`` with the current ``seq``. If the gap is no longer held (or the
+epoch changed because the process restarted), ``joined`` carries
+``resync: true``. The client then falls back to refetching. Clients drop
+any event whose ``seq`` they have already handled, so a replay that
+overlaps live delivery is harmless.
+
+Acknowledgements don't trim the outbox. All of a user's tabs share one
+sequence, and a tab that is offline can't acknowledge anything. Entries
+leave when they are pushed out by newer ones or expire.
+
+Sequences are per process, like the presence registry. With several
+workers behind SOCKETIO_MESSAGE_QUEUE, a resume that reaches a different
+worker sees a different epoch and resyncs.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from extensions import socketio
+from presence import user_room
+
+class Outbox:
+    """Recent events per user, numbered per user"""
+
+    def __init__(self, size=200, retention=900):
+        self.size = size
+        self.retention = retention
+        self._created = int(time.time() * 1000)
+        self._seq = {}          # user_id -> last sequence number (kept for the life of the process)
+        self._events = {}       # user_id -> deque of (seq, sent_at, event, payload)
+        self._lock = threading.RLock()
+        self._pruned_at = time.monotonic()
+        self.replayed = 0
+        self.resyncs = 0
+        # Sends (event, data, room); the ASGI server (asgi.py) emits itself
+        self.emit = lambda event, data, room: socketio.emit(event, data, to=room)
+
+    @property
+    def epoch(self):
+        # Includes the pid: forked workers share the parent's import state
+        return f"{os.getpid()}-{self._created}"
+
+    def configure(self, config):
+        self.size = config.get('OUTBOX_SIZE', self.size)
+        self.retention = config.get('OUTBOX_RETENTION', self.retention)
+
+    def record(self, user_id, event, data):
+        """Number ``data`` for ``user_id`` and keep it; returns the payload to emit"""
+        now = time.monotonic()
+        with self._lock:
+            seq = self._seq.get(user_id, 0) + 1
+            self._seq[user_id] = seq
+            payload = dict(data, seq=seq)
+            events = self._events.get(user_id)
+            if events is None:
+                events = self._events[user_id] = deque(maxlen=self.size)
+            events.append((seq, now, event, payload))
+            if now - self._pruned_at > self.retention:
+                self._prune(now)
+        return payload
+
+    def send(self, user_ids, event, data):
+        """Emit ``data`` to each user's room, numbered in that user's sequence"""
+        for user_id in user_ids:
+            # Held across the emit so a replay can't interleave with it
+            with self._lock:
+                self.emit(event, self.record(user_id, event, data), user_room(user_id))
+
+    def _prune(self, now):
+        cutoff = now - self.retention
+        for user_id in list(self._events):
+            events = self._events[user_id]
+            while events and events[0][1] < cutoff:
+                events.popleft()
+            if not events:
+                del self._events[user_id]
+        self._pruned_at = now
+
+    def head(self, user_id):
+        with self._lock:
+            return self._seq.get(user_id, 0)
+
+    def missed(self, user_id, epoch, last_seq):
+        """
+        Events after ``last_seq`` as [(event, payload)], or None when they
+        can't all be replayed and the client must refetch.
+        """
+        with self._lock:
+            if epoch != self.epoch:
+                return None
+            head = self._seq.get(user_id, 0)
+            if last_seq >= head:
+                return []
+            cutoff = time.monotonic() - self.retention
+            events = [(seq, event, payload) for seq, sent_at, event, payload
+                      in self._events.get(user_id, ()) if seq > last_seq and sent_at >= cutoff]
+            if not events or events[0][0] != last_seq + 1:
+                return None
+            return [(event, payload) for _, event, payload in events]
+
+    def resume(self, user_id, sid, data, joined):
+        """
+        Replay to ``sid`` what it missed, as described by the ``epoch`` and
+        ``last_seq`` in its join ``data``, then send it ``joined`` (the
+        ``joined`` dict plus the epoch, current seq and resync flag).
+        Returns whether the client has to refetch.
+        """
+        data = data or {}
+        with self._lock:
+            resync = False
+            try:
+                last_seq = int(data['last_seq'])
+            except (KeyError, TypeError, ValueError):
+                last_seq = None   # a fresh page: it loads history itself
+            if last_seq is not None:
+                events = self.missed(user_id, data.get('epoch'), last_seq)
+                if events is None:
+                    resync = True
+                    self.resyncs += 1
+                else:
+                    for event, payload in events:
+                        self.emit(event, payload, sid)
+                    self.replayed += len(events)
+            # Inside the lock, so no live event overtakes it
+            self.emit('joined', dict(joined, epoch=self.epoch, seq=self.head(user_id), resync=resync), sid)
+            return resync
+
+    def stats(self):
+        with self._lock:
+            return {
+                'epoch': self.epoch,
+                'users': len(self._events),
+                'events': sum(len(events) for events in self._events.values()),
+                'replayed': self.replayed,
+                'resyncs': self.resyncs,
+            }
+
+outbox = Outbox()
+
+def init_outbox(app):
+    """Apply the app's outbox size and retention"""
+    outbox.configure(app.config)
+    app.extensions['outbox'] = outbox
+    return outbox
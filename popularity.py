@@ -0,0 +1,237 @@
+"""
+Product view counts and the "Trending" ranking on the home page.
+
+Counting each view with ``UPDATE product SET views = views + 1`` would make
+popular listings hot rows that every page load waits to lock. Instead each
+worker counts views and wishlist additions in memory. A background task
+flushes them every VIEW_FLUSH_INTERVAL seconds as one batched upsert into
+product_stats, so a listing gets one write per worker per interval however
+busy it is. Repeat views by the same student within an interval count
+once. Counts still in memory when a worker dies are lost; they are a
+popularity signal, not a ledger.
+
+The trending score is activity with exponential decay:
+
+    score = score * 0.5 ** (elapsed / half-life) + views * w_view + wishlists * w_wishlist
+
+The trending_refresh job applies that to the whole table in a single
+UPDATE. It folds in the activity flushed since its previous run
+(``recent_*``) and zeroes it, so each run costs the same however long the
+history is. The job then tells every worker to reload its cached list.
+"""
+
+import threading
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import select, update, or_
+
+from extensions import db, socketio
+from models import Product, ProductStats, JobRun
+from projections import seller_cards
+from cache import cache
+from invalidation import bus
+from lifecycle import lifecycle
+from scheduler import job
+
+TRENDING_KEY = 'trending_products'
+
+# ============================================================================
+# BUFFERED COUNTERS
+# ============================================================================
+
+def write_activity(views, wishlists):
+    """Add per-product view and wishlist counts to product_stats (no commit)"""
+    ids = set(views) | set(wishlists)
+    # Listings purged since they were counted would fail the foreign key
+    ids = set(db.session.execute(select(Product.id).where(Product.id.in_(ids))).scalars())
+    rows = [{'product_id': pid, 'views': views.get(pid, 0), 'recent_views': views.get(pid, 0),
+             'recent_wishlists': wishlists.get(pid, 0), 'trend_score': 0.0}
+            for pid in sorted(ids)]  # a fixed order keeps concurrent flushes from deadlocking
+    if not rows:
+        return 0
+
+    table = ProductStats.__table__
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        insert = None
+
+    if insert is not None:
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=[table.c.product_id], set_={
+            'views': table.c.views + stmt.excluded.views,
+            'recent_views': table.c.recent_views + stmt.excluded.recent_views,
+            'recent_wishlists': table.c.recent_wishlists + stmt.excluded.recent_wishlists,
+        })
+        db.session.execute(stmt, rows)
+    else:
+        for row in rows:
+            updated = db.session.execute(
+                update(table).where(table.c.product_id == row['product_id']).values(
+                    views=table.c.views + row['views'],
+                    recent_views=table.c.recent_views + row['recent_views'],
+                    recent_wishlists=table.c.recent_wishlists + row['recent_wishlists'])
+            ).rowcount
+            if not updated:
+                db.session.execute(table.insert(), [row])
+    return len(rows)
+
+class ActivityBuffer:
+    """This worker's product views and wishlist additions waiting to be flushed"""
+
+    def __init__(self, max_products=10000):
+        self.max_products = max_products
+        self.views = Counter()
+        self.wishlists = Counter()
+        self._seen = set()   # (user_id, product_id) viewed this interval
+        self._lock = threading.Lock()
+        self._started = False
+        self.flushes = 0
+        self.flushed_views = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def view(self, product_id, user_id=None):
+        with self._lock:
+            if user_id is not None:
+                if (user_id, product_id) in self._seen:
+                    return
+                self._seen.add((user_id, product_id))
+            self.views[product_id] += 1
+
+    def wishlisted(self, product_id):
+        with self._lock:
+            self.wishlists[product_id] += 1
+
+    def take(self):
+        """Swap out the pending counts"""
+        with self._lock:
+            views, wishlists = self.views, self.wishlists
+            self.views, self.wishlists, self._seen = Counter(), Counter(), set()
+        return views, wishlists
+
+    def _restore(self, views, wishlists):
+        # Retry next interval, unless the database has been down long enough
+        # for the buffer to grow past max_products
+        with self._lock:
+            if len(self.views) + len(views) > self.max_products:
+                self.dropped += sum(views.values())
+                return
+            self.views.update(views)
+            self.wishlists.update(wishlists)
+
+    def flush(self):
+        """Write the pending counts in one upsert; returns the number of products written"""
+        views, wishlists = self.take()
+        if not views and not wishlists:
+            return 0
+        try:
+            written = write_activity(views, wishlists)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            self._restore(views, wishlists)
+            raise
+        self.flushes += 1
+        self.flushed_views += sum(views.values())
+        return written
+
+    def _flush_loop(self, app, interval):
+        while True:
+            socketio.sleep(interval)
+            with app.app_context():
+                try:
+                    self.flush()
+                except Exception as e:
+                    self.errors += 1
+                    app.logger.error(f"View counter flush failed: {str(e)}")
+                finally:
+                    db.session.remove()
+
+    def start(self, app):
+        """Flush every VIEW_FLUSH_INTERVAL seconds, in the server's async mode"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.max_products = app.config.get('VIEW_BUFFER_MAX_PRODUCTS', self.max_products)
+        socketio.start_background_task(self._flush_loop, app, app.config.get('VIEW_FLUSH_INTERVAL', 30))
+
+    def stats(self):
+        with self._lock:
+            pending = sum(self.views.values())
+        return {
+            'pending_views': pending,
+            'flushes': self.flushes,
+            'flushed_views': self.flushed_views,
+            'dropped_views': self.dropped,
+            'errors': self.errors,
+        }
+
+activity = ActivityBuffer()
+
+@lifecycle.on_drain
+def _flush_views():
+    # Counts still buffered when the process exits would be lost
+    activity.flush()
+
+# ============================================================================
+# TRENDING
+# ============================================================================
+
+def refresh_trending(elapsed):
+    """Decay every score by ``elapsed`` seconds and add the activity flushed since; returns rows updated"""
+    config = current_app.config
+    decay = 0.5 ** (elapsed / (config.get('TRENDING_HALF_LIFE_HOURS', 24) * 3600))
+    weights = config.get('TRENDING_WEIGHTS', {'view': 1.0, 'wishlist': 5.0})
+    stats = ProductStats
+    updated = db.session.execute(
+        update(stats)
+        .where(or_(stats.trend_score > 0, stats.recent_views > 0, stats.recent_wishlists > 0))
+        .values(trend_score=stats.trend_score * decay
+                + stats.recent_views * weights['view']
+                + stats.recent_wishlists * weights['wishlist'],
+                recent_views=0, recent_wishlists=0)
+    ).rowcount
+    # Scores that have decayed to nothing leave the WHERE above for good
+    db.session.execute(update(stats).where(stats.trend_score > 0, stats.trend_score < 0.01)
+                       .values(trend_score=0.0))
+    return updated
+
+def load_trending_products(limit=4):
+    """Live listings with the highest trending scores, as product cards"""
+    query = (
+        Product.live()
+        .join(ProductStats, ProductStats.product_id == Product.id)
+        .filter(ProductStats.trend_score >= current_app.config.get('TRENDING_MIN_SCORE', 1.0))
+        .order_by(ProductStats.trend_score.desc(), Product.id.desc())
+    )
+    return seller_cards(query, limit)
+
+def trending_products():
+    return cache.get_or_set(TRENDING_KEY, load_trending_products)
+
+@bus.on('trending')
+@bus.on('product')
+def _evict_trending(ids):
+    cache.delete(TRENDING_KEY)
+
+# ============================================================================
+# JOBS
+# ============================================================================
+
+@job('trending_refresh', interval=300)
+def trending_refresh_job():
+    """Fold recent views and wishlist additions into the decayed trending scores"""
+    previous = (JobRun.query.filter_by(name='trending_refresh', status='success')
+                .order_by(JobRun.started_at.desc()).first())
+    elapsed = (datetime.utcnow() - previous.started_at).total_seconds() if previous else 0
+    updated = refresh_trending(elapsed)
+    db.session.commit()
+    bus.publish('trending')
+    return f"rescored {updated} product(s)"
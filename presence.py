@@ -0,0 +1,389 @@
+"""
+Socket.IO connection accounting and presence.
+
+Every connection to the default namespace is recorded in one registry held
+in process memory, with a small ``__slots__`` record per socket. The registry
+enforces a global cap and a per-user cap when a socket connects. A background
+task disconnects sockets that have sent no events for SOCKETIO_IDLE_TIMEOUT
+seconds. The same records answer "is this user online?" and feed the live
+numbers returned by /api/socket_stats. Sockets on the /products feed
+namespace (product_feed.py) are kept in a second registry, ``feed_registry``,
+with the same caps and idle reaping but no presence.
+
+PresenceFanout turns those records into online/typing events on the
+``user_{id}`` rooms. Online changes are coalesced and sent as one
+``presence`` frame per watching user every PRESENCE_FLUSH_INTERVAL seconds.
+Typing events are forwarded only when the state changes, or to refresh it.
+All emits go through the server's emit (socketio.emit, or the AsyncServer
+under asgi.py), so they also work across workers when SOCKETIO_MESSAGE_QUEUE
+is set. The registries themselves are per process.
+"""
+
+import sys
+import threading
+import time
+
+from sqlalchemy import select, union
+
+from extensions import db, socketio
+from models import Message
+
+class Connection:
+    """State kept for one open socket"""
+
+    __slots__ = ('sid', 'user_id', 'connected_at', 'last_seen', 'joined')
+
+    def __init__(self, sid, user_id, now):
+        self.sid = sid
+        self.user_id = user_id
+        self.connected_at = now
+        self.last_seen = now
+        self.joined = False
+
+    def footprint(self):
+        """Approximate bytes held by this record and its values"""
+        return sys.getsizeof(self) + sum(
+            sys.getsizeof(getattr(self, name)) for name in self.__slots__
+        )
+
+class ConnectionLimitError(Exception):
+    """Raised when accepting a socket would exceed a connection cap"""
+
+class PresenceRegistry:
+    """Open sockets indexed by sid and by user"""
+
+    def __init__(self, max_connections=1000, max_per_user=5, idle_timeout=1800, namespace='/'):
+        self.namespace = namespace
+        self.max_connections = max_connections
+        self.max_per_user = max_per_user
+        self.idle_timeout = idle_timeout
+        self._by_sid = {}       # sid -> Connection
+        self._by_user = {}      # user_id -> set of sids
+        self._lock = threading.Lock()
+        self._reaper_started = False
+        self.rejected = 0
+        self.reaped = 0
+        # Called with (user_id, online) when a user's first socket opens or
+        # their last one closes
+        self.on_change = None
+
+    def configure(self, config):
+        self.max_connections = config.get('SOCKETIO_MAX_CONNECTIONS', self.max_connections)
+        self.max_per_user = config.get('SOCKETIO_MAX_CONNECTIONS_PER_USER', self.max_per_user)
+        self.idle_timeout = config.get('SOCKETIO_IDLE_TIMEOUT', self.idle_timeout)
+
+    def register(self, sid, user_id=None):
+        """Record a new socket, or raise ConnectionLimitError if a cap is reached"""
+        with self._lock:
+            if len(self._by_sid) >= self.max_connections:
+                self.rejected += 1
+                raise ConnectionLimitError('Server is at its connection limit')
+            if user_id is not None and len(self._by_user.get(user_id, ())) >= self.max_per_user:
+                self.rejected += 1
+                raise ConnectionLimitError('Too many open connections for this account')
+            self._by_sid[sid] = Connection(sid, user_id, time.monotonic())
+            came_online = user_id is not None and user_id not in self._by_user
+            if user_id is not None:
+                self._by_user.setdefault(user_id, set()).add(sid)
+        if came_online and self.on_change:
+            self.on_change(user_id, True)
+
+    def unregister(self, sid):
+        """Forget a socket; returns its Connection (or None)"""
+        went_offline = False
+        with self._lock:
+            conn = self._by_sid.pop(sid, None)
+            if conn is not None and conn.user_id is not None:
+                sids = self._by_user.get(conn.user_id)
+                if sids is not None:
+                    sids.discard(sid)
+                    if not sids:
+                        del self._by_user[conn.user_id]
+                        went_offline = True
+        if went_offline and self.on_change:
+            self.on_change(conn.user_id, False)
+        return conn
+
+    def touch(self, sid):
+        """Mark a socket as active"""
+        conn = self._by_sid.get(sid)
+        if conn is not None:
+            conn.last_seen = time.monotonic()
+        return conn
+
+    def mark_joined(self, sid):
+        """Return True the first time a socket joins its user room"""
+        conn = self.touch(sid)
+        if conn is None or conn.joined:
+            return False
+        conn.joined = True
+        return True
+
+    def user_for(self, sid):
+        conn = self._by_sid.get(sid)
+        return conn.user_id if conn is not None else None
+
+    def is_online(self, user_id):
+        return user_id in self._by_user
+
+    def online_user_ids(self):
+        with self._lock:
+            return list(self._by_user)
+
+    def sids_for(self, user_id):
+        with self._lock:
+            return list(self._by_user.get(user_id, ()))
+
+    def idle_sids(self, now=None):
+        now = time.monotonic() if now is None else now
+        cutoff = now - self.idle_timeout
+        with self._lock:
+            return [c.sid for c in self._by_sid.values() if c.last_seen < cutoff]
+
+    def bytes_estimate(self):
+        """Approximate bytes held by the registry's own structures"""
+        with self._lock:
+            total = sys.getsizeof(self._by_sid) + sys.getsizeof(self._by_user)
+            total += sum(c.footprint() for c in self._by_sid.values())
+            total += sum(sys.getsizeof(sids) for sids in self._by_user.values())
+            return total
+
+    def stats(self):
+        with self._lock:
+            connections = len(self._by_sid)
+            users = len(self._by_user)
+            anonymous = sum(1 for c in self._by_sid.values() if c.user_id is None)
+        registry_bytes = self.bytes_estimate()
+        rss = process_rss_bytes()
+        return {
+            'connections': connections,
+            'online_users': users,
+            'anonymous_connections': anonymous,
+            'max_connections': self.max_connections,
+            'max_connections_per_user': self.max_per_user,
+            'idle_timeout': self.idle_timeout,
+            'rejected': self.rejected,
+            'reaped': self.reaped,
+            'registry_bytes': registry_bytes,
+            'registry_bytes_per_connection': round(registry_bytes / connections) if connections else 0,
+            # Upper bound: the whole process divided by its sockets
+            'process_rss_bytes': rss,
+            'rss_bytes_per_connection': round(rss / connections) if rss and connections else None
+        }
+
+    # ------------------------------------------------------------------
+    # Idle reaping
+    # ------------------------------------------------------------------
+
+    def reap_idle(self):
+        """Disconnect sockets idle for longer than idle_timeout"""
+        sids = self.idle_sids()
+        for sid in sids:
+            try:
+                # Tells the client this was on purpose, so it reconnects when
+                # someone is looking at the page again
+                socketio.emit('idle_timeout', {}, to=sid, namespace=self.namespace)
+                socketio.server.disconnect(sid, namespace=self.namespace)
+            except Exception as e:
+                print(f"⚠️  Could not disconnect idle socket {sid}: {str(e)}")
+            # disconnect() normally triggers handle_disconnect; make sure
+            # the record is gone even if the socket already vanished
+            self.unregister(sid)
+        self.reaped += len(sids)
+        return len(sids)
+
+    def _reap_loop(self):
+        interval = max(5, min(60, self.idle_timeout // 4))
+        while True:
+            socketio.sleep(interval)
+            reaped = self.reap_idle()
+            if reaped:
+                print(f"🧹 Reaped {reaped} idle socket(s)")
+
+    def start_reaper(self):
+        """Start the idle reaper once, in the server's async mode"""
+        with self._lock:
+            if self._reaper_started or not self.idle_timeout:
+                return
+            self._reaper_started = True
+        socketio.start_background_task(self._reap_loop)
+
+registry = PresenceRegistry()
+# Sockets on the /products feed: capped and reaped, never "online"
+feed_registry = PresenceRegistry(namespace='/products')
+
+# ============================================================================
+# PRESENCE AND TYPING FAN-OUT
+# ============================================================================
+
+# Inbox contacts loaded per user; the inbox lists at most this many threads
+MAX_CONTACTS = 200
+
+def user_room(user_id):
+    return f"user_{user_id}"
+
+def contacts_query(user_id, limit=MAX_CONTACTS):
+    """SELECT of the IDs of everyone ``user_id`` has exchanged messages with"""
+    sent = select(Message.receiver_id.label('contact_id')).where(Message.sender_id == user_id)
+    received = select(Message.sender_id.label('contact_id')).where(Message.receiver_id == user_id)
+    return select(union(sent, received).subquery().c.contact_id).limit(limit)
+
+def load_contacts(user_id, limit=MAX_CONTACTS):
+    return {contact_id for (contact_id,) in db.session.execute(contacts_query(user_id, limit))}
+
+class PresenceFanout:
+    """Coalesces online and typing changes into few Socket.IO frames"""
+
+    def __init__(self, registry, flush_interval=2.0, typing_refresh=3.0):
+        self.registry = registry
+        self.flush_interval = flush_interval
+        self.typing_refresh = typing_refresh
+        self._watching = {}     # watcher_id -> user_ids they see presence for
+        self._watchers = {}     # user_id -> watcher_ids
+        self._changed = {}      # user_id -> latest online state since the last flush
+        self._announced = set() # user_ids last announced as online
+        self._typing = {}       # (sender_id, receiver_id) -> monotonic time last forwarded
+        self._lock = threading.Lock()
+        self._started = False
+        self.frames_sent = 0
+        # Sends (event, data, room); the ASGI server (asgi.py) swaps in its own
+        self.emit = lambda event, data, room: socketio.emit(event, data, to=room)
+        registry.on_change = self.mark
+
+    def configure(self, config):
+        self.flush_interval = config.get('PRESENCE_FLUSH_INTERVAL', self.flush_interval)
+        self.typing_refresh = config.get('TYPING_REFRESH_INTERVAL', self.typing_refresh)
+
+    def mark(self, user_id, online):
+        """Queue an online/offline change for the next flush"""
+        with self._lock:
+            self._changed[user_id] = online
+            if not online:
+                self._drop_watcher(user_id)
+                for key in [k for k in self._typing if k[0] == user_id]:
+                    del self._typing[key]
+
+    def watch(self, watcher_id, user_ids):
+        """Subscribe ``watcher_id`` to the presence of ``user_ids``"""
+        with self._lock:
+            watching = self._watching.setdefault(watcher_id, set())
+            for user_id in user_ids:
+                if user_id == watcher_id:
+                    continue
+                watching.add(user_id)
+                self._watchers.setdefault(user_id, set()).add(watcher_id)
+            return watching
+
+    def is_watching(self, watcher_id, user_id):
+        return user_id in self._watching.get(watcher_id, ())
+
+    def _drop_watcher(self, watcher_id):
+        for user_id in self._watching.pop(watcher_id, ()):
+            watchers = self._watchers.get(user_id)
+            if watchers is not None:
+                watchers.discard(watcher_id)
+                if not watchers:
+                    del self._watchers[user_id]
+
+    def snapshot(self, user_ids):
+        """Current state for a fresh subscriber: {user_id: online}"""
+        return {str(user_id): self.registry.is_online(user_id) for user_id in user_ids}
+
+    def flush(self):
+        """Send one presence frame to each user watching someone who changed"""
+        with self._lock:
+            changed, self._changed = self._changed, {}
+            frames = {}
+            for user_id, online in changed.items():
+                if online == (user_id in self._announced):
+                    continue  # flipped back before anyone was told
+                if online:
+                    self._announced.add(user_id)
+                else:
+                    self._announced.discard(user_id)
+                for watcher_id in self._watchers.get(user_id, ()):
+                    frames.setdefault(watcher_id, {})[str(user_id)] = online
+
+            # Forget typing state nobody has refreshed
+            cutoff = time.monotonic() - 2 * self.typing_refresh
+            for key in [k for k, sent_at in self._typing.items() if sent_at < cutoff]:
+                del self._typing[key]
+
+        for watcher_id, users in frames.items():
+            self.emit('presence', {'users': users}, user_room(watcher_id))
+        self.frames_sent += len(frames)
+        return len(frames)
+
+    def typing(self, sender_id, receiver_id, is_typing):
+        """
+        Forward a typing state to the receiver when it changed, or when the
+        last "typing" frame is older than typing_refresh. Returns True if a
+        frame was sent.
+        """
+        key = (sender_id, receiver_id)
+        now = time.monotonic()
+        with self._lock:
+            sent_at = self._typing.get(key)
+            if is_typing:
+                if sent_at is not None and now - sent_at < self.typing_refresh:
+                    return False
+                self._typing[key] = now
+            else:
+                if sent_at is None:
+                    return False
+                del self._typing[key]
+        self.emit('typing', {'user_id': sender_id, 'typing': is_typing}, user_room(receiver_id))
+        self.frames_sent += 1
+        return True
+
+    def clear_typing(self, sender_id, receiver_id):
+        """Forget typing state without a frame (a new message implies it)"""
+        with self._lock:
+            self._typing.pop((sender_id, receiver_id), None)
+
+    def _flush_loop(self):
+        while True:
+            socketio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️  Presence flush failed: {str(e)}")
+
+    def start(self):
+        """Start the periodic flush once, in the server's async mode"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        socketio.start_background_task(self._flush_loop)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'watchers': len(self._watching),
+                'watched_users': len(self._watchers),
+                'pending_changes': len(self._changed),
+                'typing_pairs': len(self._typing),
+                'presence_frames_sent': self.frames_sent
+            }
+
+fanout = PresenceFanout(registry)
+
+def process_rss_bytes():
+    """Resident memory of this process in bytes (Linux only, else None)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def init_presence(app):
+    """Apply the app's connection limits and presence timing"""
+    registry.configure(app.config)
+    feed_registry.configure(app.config)
+    fanout.configure(app.config)
+    app.extensions['presence'] = registry
+    return registry
@@ -0,0 +1,108 @@
+"""
+Live product feed over Socket.IO.
+
+Clients on the /products page connect to the ``/products`` namespace and
+subscribe to one room per category. upload() and delete_product() publish
+compact insert/delete deltas to the matching room, so open product grids
+update in place instead of reloading the full product query. Events for
+one user (saved-search matches) go to the ``user_{id}`` room on the default
+namespace instead, through the outbox.
+
+Deltas go out through ``emit_to_feed``, which the ASGI server (asgi.py)
+replaces with its own AsyncServer emit, where it also registers the
+handlers for this namespace.
+"""
+
+from flask import request, url_for
+from flask_login import current_user
+from flask_socketio import join_room, leave_room, emit, ConnectionRefusedError
+
+from extensions import socketio
+from lifecycle import lifecycle
+from presence import feed_registry, ConnectionLimitError
+
+NAMESPACE = '/products'
+
+# Categories accepted by upload(); each one has its own feed room
+CATEGORIES = ['Books', 'Tech', 'Clothes', 'Others']
+
+def category_room(category):
+    return f"category_{category}"
+
+def image_url(image):
+    """Absolute image URL for a stored image reference (needs a request context)"""
+    return image if image.startswith('http') else url_for('main.uploads', filename=image)
+
+def product_delta(product):
+    """The fields a product card needs, and nothing else"""
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': round(product.price, 2),
+        'image': image_url(product.image),
+        'category': product.category,
+        'condition': product.condition,
+        'rental': bool(product.multiple_items)
+    }
+
+def emit_to_feed(event, data, room):
+    """Send (event, data) to a room of the /products namespace"""
+    socketio.emit(event, data, namespace=NAMESPACE, to=room)
+
+def publish_product_insert(product):
+    """Tell subscribers of the product's category about a new listing"""
+    emit_to_feed('product_delta', {'op': 'insert', 'product': product_delta(product)},
+                 category_room(product.category))
+
+def publish_product_delete(product_id, category):
+    """Tell subscribers of ``category`` that a listing is gone"""
+    emit_to_feed('product_delta', {'op': 'delete', 'id': product_id}, category_room(category))
+
+def requested_categories(data):
+    """Validate the category list sent by a client; empty means all"""
+    categories = (data or {}).get('categories') or CATEGORIES
+    if isinstance(categories, str):
+        categories = [categories]
+    return [c for c in categories if c in CATEGORIES]
+
+# ============================================================================
+# SOCKET.IO EVENT HANDLERS - /products NAMESPACE
+# ============================================================================
+
+@socketio.on('connect', namespace=NAMESPACE)
+def handle_feed_connect():
+    """Only logged-in users can follow the feed, like the /products page"""
+    if not current_user.is_authenticated:
+        return False
+    if lifecycle.draining:
+        # script_products.js reconnects after a jittered delay on this message
+        raise ConnectionRefusedError('Server restarting')
+    # Same caps as the default namespace, counted separately
+    try:
+        feed_registry.register(request.sid, current_user.id)
+    except ConnectionLimitError as e:
+        print(f"🚫 Feed connection refused for {request.sid}: {e}")
+        raise ConnectionRefusedError(str(e))
+    feed_registry.start_reaper()
+
+@socketio.on('disconnect', namespace=NAMESPACE)
+def handle_feed_disconnect(reason=None):
+    feed_registry.unregister(request.sid)
+
+@socketio.on('subscribe', namespace=NAMESPACE)
+def handle_feed_subscribe(data):
+    """Join the rooms for the requested categories (all of them by default)"""
+    feed_registry.touch(request.sid)
+    categories = requested_categories(data)
+    for category in categories:
+        join_room(category_room(category))
+    emit('subscribed', {'categories': categories})
+
+@socketio.on('unsubscribe', namespace=NAMESPACE)
+def handle_feed_unsubscribe(data):
+    """Leave the rooms for the given categories (all of them by default)"""
+    feed_registry.touch(request.sid)
+    categories = requested_categories(data)
+    for category in categories:
+        leave_room(category_room(category))
+    emit('unsubscribed', {'categories': categories})
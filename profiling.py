@@ -0,0 +1,294 @@
+"""
+On-demand request profiling and memory snapshots for admins.
+
+Profiling a single request
+    An admin adds ``?_profile=1`` to any URL. A script can instead send
+    ``X-Profile-Token: <token>``, using a token from /api/admin/profile_token.
+    Tokens are signed with SECRET_KEY and last PROFILER_TOKEN_MAX_AGE
+    seconds. The request then runs normally while a separate OS thread
+    samples its stack every PROFILER_INTERVAL seconds.
+
+    The response body is replaced by the samples in folded-stack format: one
+    ``frame;frame;frame count`` line per distinct stack. flamegraph.pl,
+    speedscope and inferno read it directly. The page's real status goes in
+    X-Profile-Status.
+
+    Under eventlet every greenlet shares one OS thread. Samples taken while
+    the request's greenlet is switched out (waiting on the database or a
+    socket) count as "[waiting]".
+
+Memory
+    memory_report() takes a tracemalloc snapshot, diffs it against the
+    baseline set by start_memory_baseline(), and lists live objects by
+    type. Use it to find growth in long-lived workers, such as leaked socket
+    sessions or SQLAlchemy identity maps. State is per process: with several
+    workers, each has its own baseline.
+"""
+
+import gc
+import importlib
+import os
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from urllib.parse import parse_qs
+
+from flask import current_app, request
+from flask_login import current_user
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+
+from admin import is_admin
+
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'X-Profile-Token'
+# Holds {'marker': frame, 'sampler': StackSampler}; a dict so it survives the
+# shallow environ copy Flask-SocketIO's middleware makes
+PROFILE_KEY = 'thriftit.profile'
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def _original(name):
+    """A standard library module as it was before any eventlet monkey patch"""
+    if 'eventlet' in sys.modules:
+        from eventlet import patcher
+        if patcher.is_monkey_patched('thread'):
+            return patcher.original(name)
+    return importlib.import_module(name)
+
+def _frame_label(code):
+    path = code.co_filename
+    if path.startswith(REPO_ROOT + os.sep):
+        path = os.path.relpath(path, REPO_ROOT)
+    elif 'site-packages' + os.sep in path:
+        path = path.split('site-packages' + os.sep, 1)[1]
+    return f"{code.co_name} ({path}:{code.co_firstlineno})".replace(';', ':')
+
+# ============================================================================
+# SAMPLING PROFILER
+# ============================================================================
+
+class StackSampler:
+    """
+    Samples one request's stack from a background OS thread. ``marker`` is
+    the frame the request runs under; only frames above it are recorded.
+    """
+
+    def __init__(self, marker, interval=0.005, max_seconds=30):
+        self._thread = _original('_thread')
+        self.thread_id = self._thread.get_ident()
+        self.marker = marker
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks = Counter()
+        self.samples = 0
+        self.duration = 0.0
+        self._running = False
+        self._finished = None
+
+    def start(self):
+        self._running = True
+        self._finished = self._thread.allocate_lock()
+        self._finished.acquire()
+        self._started = time.perf_counter()
+        self._thread.start_new_thread(self._run, ())
+
+    def stop(self):
+        if self._running:
+            self._running = False
+            self._finished.acquire()
+            self.duration = time.perf_counter() - self._started
+
+    def _run(self):
+        sleep = _original('time').sleep
+        deadline = time.perf_counter() + self.max_seconds
+        try:
+            while self._running and time.perf_counter() < deadline:
+                sleep(self.interval)
+                if self._running:
+                    self._sample(sys._current_frames().get(self.thread_id))
+        finally:
+            self._finished.release()
+
+    def _sample(self, frame):
+        stack = []
+        while frame is not None and frame is not self.marker:
+            stack.append(frame.f_code)
+            frame = frame.f_back
+        # Without the marker on the stack, another greenlet is running
+        self.stacks[tuple(reversed(stack)) if frame is not None else ('[waiting]',)] += 1
+        self.samples += 1
+
+    def folded(self):
+        """The samples as folded stacks, most frequent first"""
+        labels = {}
+        lines = []
+        for stack, count in self.stacks.most_common():
+            frames = [f if isinstance(f, str) else labels.setdefault(f, _frame_label(f)) for f in stack]
+            lines.append(f"{';'.join(frames) or '[request]'} {count}")
+        return '\n'.join(lines) + '\n'
+
+class ProfilerMiddleware:
+    """
+    WSGI wrapper that marks requests asking to be profiled. Flask decides
+    whether they may be (start_requested_profile). Profiled requests get
+    their folded stacks back instead of the page.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        # parse_qs, not a substring test: ?my_profile=1 is not a request to profile
+        if PROFILE_PARAM not in parse_qs(environ.get('QUERY_STRING', '')) and 'HTTP_X_PROFILE_TOKEN' not in environ:
+            return self.wsgi_app(environ, start_response)
+
+        profile = environ[PROFILE_KEY] = {'marker': sys._getframe()}
+        captured = {}
+        written = []
+
+        def capture(status, headers, exc_info=None):
+            captured['args'] = (status, headers, exc_info)
+            return written.append
+
+        body = self.wsgi_app(environ, capture)
+        sampler = profile.get('sampler')
+        if sampler is None:
+            # Not allowed to profile: pass the response through untouched
+            start_response(*captured['args'])
+            if written:
+                return written + list(body)
+            return body
+
+        try:
+            for _ in body:
+                pass
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+            sampler.stop()
+
+        payload = sampler.folded().encode()
+        start_response('200 OK', [
+            ('Content-Type', 'text/plain; charset=utf-8'),
+            ('Content-Length', str(len(payload))),
+            ('Cache-Control', 'no-store'),
+            ('X-Profile-Status', captured['args'][0]),
+            ('X-Profile-Samples', str(sampler.samples)),
+            ('X-Profile-Interval-Ms', f"{sampler.interval * 1000:g}"),
+            ('X-Profile-Duration-Ms', f"{sampler.duration * 1000:.1f}"),
+        ])
+        return [payload]
+
+def _token_serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt='thriftit-profile')
+
+def issue_profile_token(user):
+    """A signed token that lets scripts profile requests as ``user``"""
+    return _token_serializer().dumps(user.student_id)
+
+def _profile_allowed():
+    token = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_PARAM)
+    if not token:
+        return False
+    if token == '1':
+        return is_admin(current_user)
+    try:
+        student_id = _token_serializer().loads(token, max_age=current_app.config['PROFILER_TOKEN_MAX_AGE'])
+    except (BadSignature, TypeError):
+        return False
+    return student_id in current_app.config.get('ADMIN_STUDENT_IDS', ())
+
+def start_requested_profile():
+    """before_request hook: start sampling if the request asked and is allowed to"""
+    profile = request.environ.get(PROFILE_KEY)
+    if profile is None or 'sampler' in profile or not _profile_allowed():
+        return
+    sampler = StackSampler(profile['marker'], current_app.config['PROFILER_INTERVAL'],
+                           current_app.config['PROFILER_MAX_SECONDS'])
+    profile['sampler'] = sampler
+    sampler.start()
+    current_app.logger.info(f"🔬 Profiling {request.method} {request.path}")
+
+def init_profiler(app):
+    app.wsgi_app = ProfilerMiddleware(app.wsgi_app)
+    app.before_request(start_requested_profile)
+
+# ============================================================================
+# MEMORY SNAPSHOTS
+# ============================================================================
+
+_memory = {'snapshot': None, 'objects': None, 'taken_at': None}
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<unknown>'),
+    ))
+
+def object_counts():
+    """Live garbage-collected objects by type"""
+    return Counter(f"{type(o).__module__}.{type(o).__qualname__}" for o in gc.get_objects())
+
+def start_memory_baseline(frames=25):
+    """Start tracing allocations (if needed) and remember the current state as the baseline"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    gc.collect()
+    _memory.update(snapshot=_snapshot(), objects=object_counts(), taken_at=datetime.utcnow())
+    return memory_status()
+
+def stop_memory_tracing():
+    """Stop tracing allocations and drop the baseline"""
+    tracemalloc.stop()
+    _memory.update(snapshot=None, objects=None, taken_at=None)
+
+def memory_status():
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        'pid': os.getpid(),
+        'tracing': tracemalloc.is_tracing(),
+        'traceback_frames': tracemalloc.get_traceback_limit(),
+        'traced_kb': round(current / 1024, 1),
+        'peak_kb': round(peak / 1024, 1),
+        'baseline_taken_at': _memory['taken_at'],
+    }
+
+def _allocation(stat, group_by):
+    entry = {
+        'location': str(stat.traceback[0]) if len(stat.traceback) else '?',
+        'size_kb': round(stat.size / 1024, 1),
+        'count': stat.count,
+    }
+    if hasattr(stat, 'size_diff'):
+        entry['size_diff_kb'] = round(stat.size_diff / 1024, 1)
+        entry['count_diff'] = stat.count_diff
+    if group_by == 'traceback':
+        entry['traceback'] = stat.traceback.format(most_recent_first=True)
+    return entry
+
+def memory_report(limit=25, group_by='lineno'):
+    """Top allocation sites (growth since the baseline when there is one) and object counts"""
+    gc.collect()
+    report = memory_status()
+
+    if tracemalloc.is_tracing():
+        snapshot = _snapshot()
+        if _memory['snapshot'] is not None:
+            stats = snapshot.compare_to(_memory['snapshot'], group_by)
+        else:
+            stats = snapshot.statistics(group_by)
+        report['allocations'] = [_allocation(s, group_by) for s in stats[:limit]]
+
+    counts = object_counts()
+    baseline = _memory['objects']
+    if baseline is not None:
+        growth = Counter({name: counts[name] - baseline.get(name, 0) for name in counts})
+        report['objects'] = [{'type': name, 'count': counts[name], 'diff': diff}
+                             for name, diff in growth.most_common(limit)]
+    else:
+        report['objects'] = [{'type': name, 'count': count} for name, count in counts.most_common(limit)]
+    report['gc_objects'] = sum(counts.values())
+    return report
@@ -0,0 +1,57 @@
+"""
+Column projections for the list pages.
+
+/products, the wishlist, the profile page and the home page cards show a
+listing's name, price, image and a few short fields. Loading them as
+Product entities also loads ``description`` (unbounded text). It builds a
+full ORM object per row and registers it, with a snapshot of its loaded
+state, in the session's identity map until the request ends. On a page of
+thousands of listings that's most of the query time and memory.
+
+These helpers select only the columns a card renders. Each row becomes a
+ProductCard, a namedtuple (no ``__dict__``, no session, no lazy loads).
+Templates read it with the same ``product.name`` / ``product.price``
+syntax. Detail pages and anything that writes still use Product.
+
+    cards = product_cards(Product.live().order_by(Product.id.desc()))
+
+benchmarks/bench_projections.py compares both paths on a 10k-row page.
+"""
+
+from collections import namedtuple
+
+from models import Product, User, Wishlist
+
+# Everything a listing card shows, and the seller for "contact seller"
+ProductCard = namedtuple('ProductCard', 'id name price image category condition multiple_items seller_id')
+
+CARD_COLUMNS = [getattr(Product, field) for field in ProductCard._fields]
+
+def product_cards(query):
+    """Run a Product query (filters, order, limit) as ProductCard tuples"""
+    make = ProductCard._make
+    return [make(row) for row in query.with_entities(*CARD_COLUMNS)]
+
+def seller_cards(query, limit):
+    """
+    The first ``limit`` rows of a Product query as the dicts cached for the
+    home page, with the seller's student ID joined in. Shaped like the
+    Product attributes home.html reads (``item.seller.student_id``).
+    """
+    rows = (query.join(User, User.id == Product.seller_id)
+            .with_entities(Product.id, Product.name, Product.price, Product.image, Product.category,
+                           User.student_id)
+            .limit(limit))
+    return [{'id': id, 'name': name, 'price': price, 'image': image, 'category': category,
+             'seller': {'student_id': student_id}}
+            for id, name, price, image, category, student_id in rows]
+
+def wishlist_cards(user_id):
+    """The live listings on ``user_id``'s wishlist as ProductCards, in the order they were added"""
+    query = (Product.live().join(Wishlist, Wishlist.product_id == Product.id)
+             .filter(Wishlist.user_id == user_id).order_by(Wishlist.id))
+    return product_cards(query)
+
+def seller_listing_cards(user_id):
+    """``user_id``'s live listings as ProductCards, newest first"""
+    return product_cards(Product.live().filter(Product.seller_id == user_id).order_by(Product.id.desc()))
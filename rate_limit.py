@@ -0,0 +1,227 @@
+"""
+Token-bucket rate limiting for Flask routes and Socket.IO events.
+
+Each (rule, key) pair owns a bucket holding up to ``capacity`` tokens. The
+bucket refills at ``capacity / period`` tokens per second, and each request
+takes one token. A check is O(1): it reads one bucket, refills it from the
+time elapsed, and writes it back.
+
+Buckets live in a store:
+
+* MemoryBucketStore (default): an LRU-bounded OrderedDict per process.
+  RATE_LIMIT_MAX_KEYS caps its memory. The least recently used buckets are
+  evicted first, and an evicted bucket simply starts out full again.
+* RedisBucketStore: one hash per bucket, updated atomically by a Lua
+  script. It is shared by every worker. Set
+  RATE_LIMIT_STORAGE_URL=redis://... to use it.
+
+Limits are configured in RATE_LIMITS as {rule: (capacity, period_seconds)}.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request, jsonify, flash, redirect
+from flask_login import current_user
+
+class MemoryBucketStore:
+    """Per-process buckets in an LRU of at most ``max_keys`` entries"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()   # key -> [tokens, updated_at]
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def take(self, key, capacity, rate, cost=1, now=None):
+        """Take ``cost`` tokens; returns (allowed, seconds until allowed)"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [capacity, now]
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return True, 0
+            return False, (cost - bucket[0]) / rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+class RedisBucketStore:
+    """Buckets shared by all workers through Redis"""
+
+    SCRIPT = """
+    local capacity, rate, cost, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens, ts = tonumber(state[1]) or capacity, tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + (now - ts) * rate)
+    local allowed = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url, prefix='thriftit:rl:'):
+        # Only needed when a shared store is configured
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._script = self.client.register_script(self.SCRIPT)
+        self.evicted = 0
+
+    def take(self, key, capacity, rate, cost=1, now=None):
+        now = time.time() if now is None else now
+        allowed, tokens = self._script(keys=[self.prefix + key], args=[capacity, rate, cost, now])
+        if allowed:
+            return True, 0
+        return False, (cost - float(tokens)) / rate
+
+    def __len__(self):
+        return 0  # not tracked for the shared store
+
+class RateLimiter:
+    """Applies the configured rules to a bucket store"""
+
+    def __init__(self, store=None, rules=None):
+        self.store = store or MemoryBucketStore()
+        self.rules = rules or {}
+        self.enabled = True
+        self.limited = 0
+
+    def configure(self, config):
+        url = config.get('RATE_LIMIT_STORAGE_URL') or 'memory://'
+        if url.startswith('redis'):
+            self.store = RedisBucketStore(url)
+        else:
+            self.store = MemoryBucketStore(config.get('RATE_LIMIT_MAX_KEYS', 100000))
+        self.rules = dict(config.get('RATE_LIMITS', {}))
+        self.enabled = config.get('RATE_LIMIT_ENABLED', True)
+        self.limited = 0
+
+    def hit(self, rule, key):
+        """Count one request for ``key`` under ``rule``; returns (allowed, retry_after)"""
+        if not self.enabled or rule not in self.rules:
+            return True, 0
+        capacity, period = self.rules[rule]
+        allowed, retry_after = self.store.take(f"{rule}:{key}", capacity, capacity / period)
+        if not allowed:
+            self.limited += 1
+        return allowed, retry_after
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'store': type(self.store).__name__,
+            'buckets': len(self.store),
+            'evicted': self.store.evicted,
+            'limited': self.limited
+        }
+
+limiter = RateLimiter()
+
+def init_rate_limiter(app):
+    limiter.configure(app.config)
+    app.extensions['rate_limiter'] = limiter
+    return limiter
+
+# ============================================================================
+# KEYS
+# ============================================================================
+
+def client_ip():
+    """
+    The client address. Behind RATE_LIMIT_PROXY_COUNT trusted proxies the
+    address is taken from X-Forwarded-For, counting from the right, so
+    clients can't spoof it.
+    """
+    proxies = current_app.config.get('RATE_LIMIT_PROXY_COUNT', 0)
+    forwarded = request.headers.get('X-Forwarded-For', '')
+    if proxies and forwarded:
+        hops = [h.strip() for h in forwarded.split(',') if h.strip()]
+        if len(hops) >= proxies:
+            return hops[-proxies]
+    return request.remote_addr or 'unknown'
+
+def user_or_ip():
+    if current_user.is_authenticated:
+        return f"user:{current_user.id}"
+    return f"ip:{client_ip()}"
+
+KEY_FUNCS = {
+    'ip': lambda: f"ip:{client_ip()}",
+    'user': user_or_ip,
+}
+
+# ============================================================================
+# DECORATORS
+# ============================================================================
+
+def too_many_requests(retry_after, message='Too many requests. Please slow down.'):
+    """429 for API calls; pages get a flash message and a redirect back"""
+    retry_after = max(1, math.ceil(retry_after))
+    if request.path.startswith('/api/') or request.is_json:
+        response = jsonify({'success': False, 'message': message, 'retry_after': retry_after})
+        response.status_code = 429
+    else:
+        flash(f"{message} Try again in {retry_after} seconds.", 'error')
+        response = redirect(request.url)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def rate_limit(rule, key='user', methods=None):
+    """
+    Limit a view under ``rule``, keyed by 'ip' or 'user' (the user id, or
+    the IP when logged out). ``methods`` restricts the check to e.g. POST.
+    """
+    key_func = KEY_FUNCS[key]
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if methods is None or request.method in methods:
+                allowed, retry_after = limiter.hit(rule, key_func())
+                if not allowed:
+                    current_app.logger.warning(f"🚦 Rate limited {rule} for {key_func()}")
+                    return too_many_requests(retry_after)
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+def socket_rate_limit(rule, key_func=None, notify=True):
+    """
+    Limit a Socket.IO event handler under ``rule``. Over the limit, the
+    event is dropped and, if ``notify``, the client gets an 'error' event
+    (the chat pages already display those).
+    """
+    def decorator(handler):
+        @wraps(handler)
+        def wrapped(*args, **kwargs):
+            key = key_func() if key_func else f"sid:{request.sid}"
+            allowed, retry_after = limiter.hit(rule, key)
+            if not allowed:
+                if notify:
+                    from flask_socketio import emit
+                    retry_after = max(1, math.ceil(retry_after))
+                    emit('error', {'message': f'Too many requests. Try again in {retry_after} seconds.',
+                                   'retry_after': retry_after})
+                return None
+            return handler(*args, **kwargs)
+        return wrapped
+    return decorator
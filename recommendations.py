@@ -0,0 +1,347 @@
+"""
+Related-listing recommendations for the product detail page.
+
+Two listings count as similar when they share words in their name and
+description (TF-IDF cosine), were wishlisted by the same students
+(co-wishlist cosine), have the same category or condition, or sit in
+nearby price bands. The weights come from RECOMMENDATION_WEIGHTS. Every
+listing's top RECOMMENDATIONS_TOP_K neighbours are stored in the
+product_recommendation table, so the detail page reads them in a single
+indexed lookup.
+
+The matrices are sparse (SciPy), and scores are computed one block of rows
+at a time, which bounds memory at about block x listings floats. The
+recommendations_refresh job only recomputes listings that changed: new
+listings, listings wishlisted since the last run, and listings whose
+neighbours could now include one of those. Each computed listing gets a
+RecommendationMarker, including listings with no neighbours at all.
+
+The model stays cached in the process between runs. A refresh only
+tokenizes and vectorizes listings it hasn't seen, using the vocabulary and
+IDF weights of the last full build. Deleted listings are masked out and
+new wishlist rows are added to the incidence matrix. recommendations_rebuild
+rebuilds the model from scratch and recomputes everything once a day,
+which also picks up vocabulary drift and removed wishlist rows.
+"""
+
+import re
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import select, insert, delete, func
+
+from extensions import db
+from models import Product, Wishlist, ProductRecommendation, RecommendationMarker
+from scheduler import job
+
+DEFAULT_WEIGHTS = {'text': 0.45, 'wishlist': 0.25, 'category': 0.15, 'condition': 0.05, 'price': 0.10}
+
+STOPWORDS = frozenset(
+    'a an and are as at be by for from has in is it its of on or that the this to with '
+    'was were will very new used good only one can'.split()
+)
+
+# Cap on block rows x listings, i.e. on the size of one dense score block
+BLOCK_CELLS = 4_000_000
+
+def tokenize(text):
+    return [t for t in re.findall(r'[a-z0-9]+', (text or '').lower())
+            if len(t) > 1 and t not in STOPWORDS]
+
+class SimilarityModel:
+    """Feature matrices for a snapshot of live listings, extendable with new ones"""
+
+    def __init__(self, products, wishlist_pairs, weights=None, max_terms=20000):
+        import numpy as np
+
+        self.np = np
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.synced_at = None
+
+        # TF-IDF over name (counted twice, it is the stronger signal) and description
+        docs = [self._doc(p) for p in products]
+        df = Counter(term for doc in docs for term in doc)
+        self.vocab = {term: i for i, (term, _) in enumerate(df.most_common(max_terms))}
+        self.idf = np.log((1.0 + len(products)) /
+                          (1.0 + np.array([df[t] for t in self.vocab], dtype=np.float32))) + 1.0
+
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.position = {}
+        self.alive = np.zeros(0, dtype=bool)
+        self.text = None
+        self._category_codes, self._condition_codes = {}, {}
+        self.category = np.zeros(0, dtype=np.int32)
+        self.condition = np.zeros(0, dtype=np.int32)
+        self.price_band = np.zeros(0, dtype=np.float32)
+        self._users, self._pairs = {}, set()
+        self._w_rows, self._w_cols = [], []
+        self.wishlist = None
+
+        self._append(products, docs)
+        self.add_wishlist(wishlist_pairs)
+
+    @staticmethod
+    def _doc(product):
+        return Counter(tokenize(f"{product.name} {product.name} {product.description or ''}"))
+
+    def _append(self, products, docs):
+        """Vectorize ``products`` with the existing vocabulary and add them as rows"""
+        np = self.np
+        from scipy import sparse
+
+        start = len(self.ids)
+        rows, cols, vals = [], [], []
+        for row, doc in enumerate(docs):
+            for term, count in doc.items():
+                col = self.vocab.get(term)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+                    vals.append(1.0 + np.log(count))
+        tf = sparse.csr_matrix((np.array(vals, dtype=np.float32), (rows, cols)),
+                               shape=(len(products), len(self.vocab)))
+        text = self._normalize(tf.multiply(self.idf.reshape(1, -1)).tocsr())
+        self.text = text if self.text is None else sparse.vstack([self.text, text]).tocsr()
+
+        self.ids = np.concatenate([self.ids, np.array([p.id for p in products], dtype=np.int64)])
+        self.position.update((p.id, start + i) for i, p in enumerate(products))
+        self.alive = np.concatenate([self.alive, np.ones(len(products), dtype=bool)])
+        self.category = np.concatenate([self.category, self._codes([p.category for p in products], self._category_codes)])
+        self.condition = np.concatenate([self.condition, self._codes([p.condition for p in products], self._condition_codes)])
+        # Bands double in width: RM0-1, 1-3, 3-7, 7-15, ...
+        prices = np.array([p.price for p in products], dtype=np.float32)
+        self.price_band = np.concatenate([self.price_band, np.floor(np.log2(np.maximum(prices, 0) + 1))])
+
+    def add_products(self, products):
+        """Add listings the model hasn't seen; only these are tokenized"""
+        products = [p for p in products if p.id not in self.position]
+        if products:
+            self._append(products, [self._doc(p) for p in products])
+            self._rebuild_wishlist()
+        return len(products)
+
+    def set_live(self, live_ids):
+        """Mask out listings that were deleted, and back in ones that were relisted"""
+        self.alive = self.np.isin(self.ids, self.np.fromiter(live_ids, dtype=self.np.int64))
+
+    def add_wishlist(self, pairs):
+        """Add (user_id, product_id) wishlist rows to the listing x student incidence"""
+        added = False
+        for user_id, product_id in pairs:
+            row = self.position.get(product_id)
+            if row is None or (user_id, product_id) in self._pairs:
+                continue
+            self._pairs.add((user_id, product_id))
+            self._w_rows.append(row)
+            self._w_cols.append(self._users.setdefault(user_id, len(self._users)))
+            added = True
+        if added or self.wishlist is None:
+            self._rebuild_wishlist()
+
+    def _rebuild_wishlist(self):
+        np = self.np
+        from scipy import sparse
+        self.wishlist = self._normalize(sparse.csr_matrix(
+            (np.ones(len(self._w_rows), dtype=np.float32), (self._w_rows, self._w_cols)),
+            shape=(len(self.ids), max(1, len(self._users)))
+        ))
+
+    def _normalize(self, matrix):
+        norms = self.np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1
+        norms[norms == 0] = 1.0
+        from scipy import sparse
+        return (sparse.diags(1.0 / norms) @ matrix).tocsr()
+
+    def _codes(self, values, lookup):
+        return self.np.array([lookup.setdefault(v, len(lookup)) for v in values], dtype=self.np.int32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def scores(self, rows):
+        """Dense similarity of listings at positions ``rows`` against every listing"""
+        np, w = self.np, self.weights
+        s = w['text'] * (self.text[rows] @ self.text.T).toarray()
+        s += w['wishlist'] * (self.wishlist[rows] @ self.wishlist.T).toarray()
+        s += w['category'] * (self.category[rows, None] == self.category[None, :])
+        s += w['condition'] * (self.condition[rows, None] == self.condition[None, :])
+        s += w['price'] * np.clip(1.0 - np.abs(self.price_band[rows, None] - self.price_band[None, :]) / 2.0, 0.0, None)
+        s[np.arange(len(rows)), rows] = -np.inf  # never recommend the listing itself
+        s[:, ~self.alive] = -np.inf                # nor one deleted since the model was built
+        return s
+
+    def blocks(self, rows):
+        """Yield (rows, scores) in blocks small enough to keep memory bounded"""
+        size = max(1, BLOCK_CELLS // max(1, len(self)))
+        for start in range(0, len(rows), size):
+            block = rows[start:start + size]
+            yield block, self.scores(block)
+
+    def top_k(self, rows, k):
+        """{product_id: [(similar_id, score), ...]} best first, for the listings at ``rows``"""
+        np = self.np
+        k = min(k, len(self) - 1)
+        result = {}
+        if k <= 0:
+            return {int(self.ids[r]): [] for r in rows}
+        for block, s in self.blocks(rows):
+            best = np.argpartition(-s, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(s, best, axis=1)
+            order = np.argsort(-best_scores, axis=1)
+            best = np.take_along_axis(best, order, axis=1)
+            best_scores = np.take_along_axis(best_scores, order, axis=1)
+            for i, row in enumerate(block):
+                result[int(self.ids[row])] = [
+                    (int(self.ids[j]), float(score))
+                    for j, score in zip(best[i], best_scores[i]) if score > 0
+                ]
+        return result
+
+# ============================================================================
+# REFRESH
+# ============================================================================
+
+PRODUCT_COLUMNS = (Product.id, Product.name, Product.description, Product.category,
+                   Product.condition, Product.price)
+
+# The model built by the last refresh in this process, extended by the next
+_model = None
+
+def load_model():
+    """Build the model from every live listing and wishlist row"""
+    config = current_app.config
+    synced_at = datetime.utcnow()
+    products = db.session.execute(
+        select(*PRODUCT_COLUMNS).where(Product.deleted_at.is_(None)).order_by(Product.id)
+    ).all()
+    pairs = db.session.execute(select(Wishlist.user_id, Wishlist.product_id)).all()
+    model = SimilarityModel(products, pairs, config.get('RECOMMENDATION_WEIGHTS'),
+                            config.get('RECOMMENDATION_MAX_TERMS', 20000))
+    model.synced_at = synced_at
+    return model
+
+def update_model(model):
+    """Bring a cached model up to date, vectorizing only listings it hasn't seen"""
+    synced_at = datetime.utcnow()
+    live_ids = set(db.session.execute(select(Product.id).where(Product.deleted_at.is_(None))).scalars())
+    new_ids = sorted(pid for pid in live_ids if pid not in model.position)
+    for start in range(0, len(new_ids), 500):
+        model.add_products(db.session.execute(
+            select(*PRODUCT_COLUMNS).where(Product.id.in_(new_ids[start:start + 500])).order_by(Product.id)
+        ).all())
+    model.set_live(live_ids)
+    model.add_wishlist(db.session.execute(
+        select(Wishlist.user_id, Wishlist.product_id).where(Wishlist.date_added > model.synced_at)
+    ).all())
+    model.synced_at = synced_at
+    return model
+
+def store_recommendations(top):
+    """Replace the stored neighbours of every product in ``top`` and mark them computed"""
+    now = datetime.utcnow()
+    product_ids = list(top)
+    for start in range(0, len(product_ids), 500):
+        chunk = product_ids[start:start + 500]
+        db.session.execute(delete(ProductRecommendation).where(ProductRecommendation.product_id.in_(chunk)))
+        db.session.execute(delete(RecommendationMarker).where(RecommendationMarker.product_id.in_(chunk)))
+    rows = [
+        {'product_id': pid, 'rank': rank, 'similar_id': sid, 'score': score, 'computed_at': now}
+        for pid, neighbours in top.items()
+        for rank, (sid, score) in enumerate(neighbours)
+    ]
+    for start in range(0, len(rows), 5000):
+        db.session.execute(insert(ProductRecommendation), rows[start:start + 5000])
+    markers = [{'product_id': pid, 'computed_at': now} for pid in product_ids]
+    for start in range(0, len(markers), 5000):
+        db.session.execute(insert(RecommendationMarker), markers[start:start + 5000])
+    db.session.commit()
+
+def changed_products(model):
+    """Positions of live listings never computed, or wishlisted since the last refresh"""
+    have = set(db.session.execute(select(RecommendationMarker.product_id)).scalars())
+    since = db.session.query(func.max(RecommendationMarker.computed_at)).scalar()
+    dirty = {pid for pid in model.position if pid not in have}
+    if since is not None:
+        dirty.update(db.session.execute(
+            select(Wishlist.product_id).where(Wishlist.date_added > since).distinct()
+        ).scalars())
+    return sorted(model.position[pid] for pid in dirty
+                  if pid in model.position and model.alive[model.position[pid]])
+
+def refresh_recommendations(full=False):
+    """
+    Recompute stored neighbours. A full refresh rebuilds the model and
+    redoes every listing; otherwise only changed listings and the listings
+    whose top-K a changed listing now beats. Returns the number of listings
+    recomputed.
+    """
+    import numpy as np
+    global _model
+
+    if full or _model is None:
+        _model = load_model()
+    else:
+        update_model(_model)
+    model = _model
+    k = current_app.config.get('RECOMMENDATIONS_TOP_K', 10)
+    if full:
+        targets = np.flatnonzero(model.alive)
+    else:
+        dirty = np.array(changed_products(model), dtype=np.int64)
+        if not len(dirty):
+            return 0
+        # The score a new neighbour must beat to get in: the weakest stored
+        # one once a listing has K, else 0 (top_k keeps only positive scores)
+        threshold = np.zeros(len(model))
+        kth = db.session.execute(
+            select(ProductRecommendation.product_id, func.min(ProductRecommendation.score),
+                   func.count())
+            .group_by(ProductRecommendation.product_id)
+        ).all()
+        for pid, weakest, count in kth:
+            position = model.position.get(pid)
+            if position is not None and count >= k:
+                threshold[position] = weakest
+        affected = np.zeros(len(model), dtype=bool)
+        affected[dirty] = True
+        for _, s in model.blocks(dirty):
+            affected |= (s > threshold[None, :]).any(axis=0)
+        targets = np.flatnonzero(affected & model.alive)
+
+    store_recommendations(model.top_k(targets, k))
+    return len(targets)
+
+# ============================================================================
+# READ PATH
+# ============================================================================
+
+def related_products(product, limit=10):
+    """Stored neighbours of ``product`` that are still live, best first"""
+    related = (
+        Product.live()
+        .join(ProductRecommendation, ProductRecommendation.similar_id == Product.id)
+        .filter(ProductRecommendation.product_id == product.id)
+        .order_by(ProductRecommendation.rank)
+        .limit(limit).all()
+    )
+    if not related:
+        # Listed since the last refresh: same category, newest first
+        related = (Product.live()
+                   .filter(Product.category == product.category, Product.id != product.id)
+                   .order_by(Product.id.desc()).limit(limit).all())
+    return related
+
+# ============================================================================
+# JOBS
+# ============================================================================
+
+@job('recommendations_refresh', interval=900)
+def recommendations_refresh_job():
+    """Update neighbours for new and newly wishlisted listings"""
+    return f"recomputed {refresh_recommendations()} listing(s)"
+
+@job('recommendations_rebuild', interval=24 * 3600, timeout=3600)
+def recommendations_rebuild_job():
+    """Recompute every listing, dropping neighbours that were deleted"""
+    return f"recomputed {refresh_recommendations(full=True)} listing(s)"
@@ -4,9 +4,21 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
-from app import app, socketio
+from config import config
+from eventlet_setup import setup_eventlet
+
+config_name = os.environ.get('FLASK_ENV', 'default')
+if config.get(config_name, config['default']).SOCKETIO_ASYNC_MODE == 'eventlet':
+    # Must run before Flask, SQLAlchemy and Socket.IO are imported
+    setup_eventlet()
+
+from app import create_app, initialize_app
+from extensions import socketio
 
 if __name__ == "__main__":
+    app = create_app(config_name)
+    initialize_app(app)
+
     # Get port from environment or default to 5000
     port = int(os.environ.get('PORT', 5000))
     
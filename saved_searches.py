@@ -0,0 +1,261 @@
+"""
+Saved searches, matched against new listings as they are uploaded.
+
+A student saves the /products search they keep reloading (search box text
+plus facet filters). When upload() creates a listing it is matched
+against every saved search at once, and the owners of the matching
+searches get a ``saved_search_match`` event in their ``user_{id}`` room,
+sent through the outbox (outbox.py) so a tab that was reconnecting gets it
+replayed. Nobody needs to reload the page to find out.
+
+A user who had no page open still sees the match: each saved search keeps
+the id of the newest listing its owner has been shown (``seen_product_id``).
+/products lists the matches above it (unseen_matches) and moves it up
+(mark_seen).
+
+Matching is a percolator, i.e. a reverse index from keys to saved search
+ids, held in memory:
+
+* A search with text is filed under one trigram of that text. It uses the
+  trigram with the fewest searches already filed under it, so the buckets
+  stay even. Text of one or two characters is filed under itself.
+* A search without text is filed under its category, or under ``*``.
+
+A listing is looked up under every trigram, one- and two-character piece of
+its name, and under its category and ``*``. A listing can only contain a
+search's text if it contains the trigram that search is filed under, so
+only those candidates are checked against the full filters
+(ProductFilters.matches). The cost grows with the length of the name and
+the number of near misses, not with the number of saved searches.
+
+The index is built on first use and extended with new searches on every
+match. Searches edited or deleted in other workers arrive as
+'saved_search' events on the invalidation bus.
+"""
+
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import func, update
+
+from extensions import db
+from facets import ProductFilters
+from invalidation import bus
+from models import Product, SavedSearch
+from outbox import outbox
+from product_feed import product_delta
+from projections import product_cards
+
+def search_filters(saved):
+    """The ProductFilters a SavedSearch row stands for"""
+    return ProductFilters(
+        search=saved.search,
+        category=saved.category,
+        conditions=[c for c in saved.conditions.split('|') if c],
+        min_price=saved.min_price,
+        max_price=saved.max_price,
+        rental=saved.rental
+    )
+
+def describe(filters):
+    """A short label such as '"desk lamp" in Tech, RM10-RM50'"""
+    parts = [f'"{filters.search}"' if filters.search else 'Anything']
+    if filters.category:
+        parts.append(f"in {filters.category}")
+    label = ' '.join(parts)
+    extras = list(filters.conditions)
+    if filters.min_price is not None or filters.max_price is not None:
+        low = f"RM{filters.min_price:g}" if filters.min_price is not None else ''
+        high = f"RM{filters.max_price:g}" if filters.max_price is not None else ''
+        extras.append(f"{low}-{high}" if low and high else (f"from {low}" if low else f"up to {high}"))
+    if filters.rental:
+        extras.append('for rent')
+    return ', '.join([label] + extras)
+
+def _grams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+def listing_keys(name, category):
+    """Every key a listing is looked up under"""
+    name = name.lower()
+    keys = {('t', gram) for gram in _grams(name, 3)}
+    keys.update(('g', gram) for gram in _grams(name, 1) | _grams(name, 2))
+    keys.add(('c', category))
+    keys.add(('*',))
+    return keys
+
+class Percolator:
+    """Reverse index: key -> saved search ids, with each search's owner and filters"""
+
+    def __init__(self):
+        self._by_key = defaultdict(set)
+        self._searches = {}     # search_id -> (user_id, filters, key)
+        self._max_id = 0
+        self._loaded = False
+        self._stale = set()     # search ids to reload on the next refresh
+        self._lock = threading.RLock()
+
+    def _anchor(self, filters):
+        text = filters.search.lower()
+        if len(text) >= 3:
+            return min((('t', gram) for gram in sorted(_grams(text, 3))),
+                       key=lambda key: len(self._by_key.get(key, ())))
+        if text:
+            return ('g', text)
+        return ('c', filters.category) if filters.category else ('*',)
+
+    def add(self, search_id, user_id, filters):
+        with self._lock:
+            self.remove(search_id)
+            key = self._anchor(filters)
+            self._by_key[key].add(search_id)
+            self._searches[search_id] = (user_id, filters, key)
+            self._max_id = max(self._max_id, search_id)
+
+    def remove(self, search_id):
+        with self._lock:
+            entry = self._searches.pop(search_id, None)
+            if entry is not None:
+                bucket = self._by_key[entry[2]]
+                bucket.discard(search_id)
+                if not bucket:
+                    del self._by_key[entry[2]]
+
+    def mark_stale(self, search_ids):
+        """Reload these searches on the next refresh (no ids: rebuild the index)"""
+        with self._lock:
+            if not search_ids:
+                self._by_key, self._searches = defaultdict(set), {}
+                self._max_id = 0
+                self._loaded = False
+                self._stale.clear()
+                return
+            if self._loaded:
+                self._stale.update(search_ids)
+
+    def refresh(self):
+        """Load searches saved since the last refresh (all of them the first time)"""
+        with self._lock:
+            if self._stale:
+                stale, self._stale = self._stale, set()
+                for saved in SavedSearch.query.filter(SavedSearch.id.in_(stale)):
+                    self.add(saved.id, saved.user_id, search_filters(saved))
+                    stale.discard(saved.id)
+                for search_id in stale:
+                    self.remove(search_id)
+            for saved in SavedSearch.query.filter(SavedSearch.id > self._max_id).order_by(SavedSearch.id):
+                self.add(saved.id, saved.user_id, search_filters(saved))
+            self._loaded = True
+
+    def match(self, product):
+        """{user_id: [(search_id, filters), ...]} for the saved searches ``product`` satisfies"""
+        with self._lock:
+            candidates = set()
+            for key in listing_keys(product.name, product.category):
+                candidates.update(self._by_key.get(key, ()))
+            matches = defaultdict(list)
+            for search_id in sorted(candidates):
+                user_id, filters, _ = self._searches[search_id]
+                if user_id != product.seller_id and filters.matches(product):
+                    matches[user_id].append((search_id, filters))
+            return dict(matches)
+
+    def stats(self):
+        with self._lock:
+            return {'searches': len(self._searches), 'keys': len(self._by_key),
+                    'largest_bucket': max((len(b) for b in self._by_key.values()), default=0)}
+
+_percolator = Percolator()
+
+# ============================================================================
+# PUBLIC API
+# ============================================================================
+
+def newest_listing_id():
+    """The id of the newest listing, live or not (0 if there are none)"""
+    return db.session.query(func.max(Product.id)).scalar() or 0
+
+def save_search(user_id, filters):
+    """Store ``filters`` as a saved search for ``user_id`` (no commit)"""
+    saved = SavedSearch(
+        user_id=user_id,
+        search=filters.search,
+        category=filters.category,
+        conditions='|'.join(filters.conditions),
+        min_price=filters.min_price,
+        max_price=filters.max_price,
+        rental=filters.rental,
+        # Only listings uploaded from now on count as matches
+        seen_product_id=newest_listing_id()
+    )
+    db.session.add(saved)
+    return saved
+
+def saved_search_changed(*search_ids):
+    """Call after saved searches are created or deleted; every worker updates its index"""
+    bus.publish('saved_search', *search_ids)
+
+def notify_matches(product):
+    """
+    Match a new listing against every saved search and notify the owners.
+    Needs a request context (for image URLs). Returns the number of users notified.
+    """
+    _percolator.refresh()
+    matches = _percolator.match(product)
+    if not matches:
+        return 0
+
+    search_ids = [sid for searches in matches.values() for sid, _ in searches]
+    db.session.execute(
+        update(SavedSearch).where(SavedSearch.id.in_(search_ids))
+        .values(match_count=SavedSearch.match_count + 1, last_match_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+    delta = product_delta(product)
+    for user_id, searches in matches.items():
+        outbox.send([user_id], 'saved_search_match', {
+            'product': delta,
+            'searches': [{'id': sid, 'label': describe(filters)} for sid, filters in searches]
+        })
+    return len(matches)
+
+def unseen_matches(user_id, up_to, limit=5):
+    """
+    The live listings (id <= ``up_to``) matching ``user_id``'s saved searches
+    that haven't been shown yet, as [(label, [ProductCard, ...])], newest
+    first, at most ``limit`` per search.
+    """
+    searches = (SavedSearch.query
+                .filter(SavedSearch.user_id == user_id, SavedSearch.last_match_at.isnot(None),
+                        SavedSearch.seen_product_id < up_to)
+                .order_by(SavedSearch.id.desc()))
+    alerts = []
+    for saved in searches:
+        filters = search_filters(saved)
+        query = (filters.apply(Product.live())
+                 .filter(Product.id > saved.seen_product_id, Product.id <= up_to,
+                         Product.seller_id != user_id)
+                 .order_by(Product.id.desc()).limit(limit))
+        cards = product_cards(query)
+        if cards:
+            alerts.append((describe(filters), cards))
+    return alerts
+
+def mark_seen(user_id, up_to):
+    """Record that ``user_id`` has been shown every match up to listing ``up_to`` (no commit)"""
+    db.session.execute(
+        update(SavedSearch)
+        .where(SavedSearch.user_id == user_id, SavedSearch.seen_product_id < up_to)
+        .values(seen_product_id=up_to)
+        .execution_options(synchronize_session=False)
+    )
+
+def percolator_stats():
+    return _percolator.stats()
+
+@bus.on('saved_search')
+def _reload_saved_searches(search_ids):
+    _percolator.mark_stale(search_ids)
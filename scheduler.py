@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Background job scheduler for ThriftIt maintenance work.
+
+Jobs register themselves with the ``@job`` decorator. The scheduler runs
+inside the web process as a Socket.IO background task
+(SCHEDULER_ENABLED=true), or on its own as a worker:
+
+    python scheduler.py              # run due jobs forever
+    python scheduler.py --list       # show registered jobs and their last run
+    python scheduler.py --once orphan_image_gc
+
+Every run is recorded in the job_run table. A job only runs after its
+lease in the job_lock table has been taken. That way two web workers, or a
+web worker and a standalone worker, never run the same job at once. A job is
+due when its last recorded start is older than its interval. Because that is
+read from the database, all processes share one schedule.
+"""
+
+import argparse
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app, g
+from sqlalchemy import update, func
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db, socketio
+from lifecycle import lifecycle
+from models import Product, User, Wishlist, ImageBlob, JobRun, JobLock
+from cache import cache, load_newest_products, load_site_stats, NEWEST_PRODUCTS_KEY, SITE_STATS_KEY, SITE_STATS_TTL
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+class Job:
+    """A registered periodic job"""
+
+    def __init__(self, name, func, interval, timeout):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.timeout = timeout
+
+JOBS = {}
+
+def job(name, interval, timeout=None):
+    """Register the decorated function as a job that runs every ``interval`` seconds"""
+    def decorator(func):
+        JOBS[name] = Job(name, func, interval, timeout or max(60, interval // 2))
+        return func
+    return decorator
+
+# ============================================================================
+# LOCKING AND RUN HISTORY
+# ============================================================================
+
+def acquire_lock(name, ttl):
+    """Take the lease for ``name`` if it is free or expired; returns True on success"""
+    now = datetime.utcnow()
+    until = now + timedelta(seconds=ttl)
+    taken = db.session.execute(
+        update(JobLock)
+        .where(JobLock.name == name, JobLock.locked_until < now)
+        .values(locked_by=WORKER_ID, locked_until=until)
+    ).rowcount
+    if not taken:
+        try:
+            with db.session.begin_nested():
+                db.session.add(JobLock(name=name, locked_by=WORKER_ID, locked_until=until))
+            taken = 1
+        except IntegrityError:
+            taken = 0  # someone else holds it
+    db.session.commit()
+    return bool(taken)
+
+def release_lock(name):
+    db.session.execute(
+        update(JobLock)
+        .where(JobLock.name == name, JobLock.locked_by == WORKER_ID)
+        .values(locked_until=datetime.utcnow())
+    )
+    db.session.commit()
+
+def last_started(name):
+    return db.session.query(func.max(JobRun.started_at)).filter(JobRun.name == name).scalar()
+
+def is_due(job_, now=None):
+    now = now or datetime.utcnow()
+    last = last_started(job_.name)
+    return last is None or (now - last).total_seconds() >= job_.interval
+
+def run_job(name, only_if_due=False):
+    """
+    Run one job under its lock and record the run. Returns the JobRun, or
+    None if another worker holds the lock (or, with ``only_if_due``, if the
+    job is no longer due once the lock is held).
+    """
+    job_ = JOBS[name]
+    if not acquire_lock(name, job_.timeout):
+        return None
+    # Another worker may have run it between our is_due() and the lock:
+    # its lease is released as soon as it finishes. Check again, against a
+    # fresh read of job_run.
+    db.session.expire_all()
+    if only_if_due and not is_due(job_):
+        release_lock(name)
+        return None
+
+    g.job_name = name  # attributes the job's slow queries (slow_queries.py)
+    run = JobRun(name=name, worker=WORKER_ID, status='running', started_at=datetime.utcnow())
+    db.session.add(run)
+    db.session.commit()
+
+    try:
+        detail = job_.func()
+        db.session.commit()
+        run.status = 'success'
+        run.detail = str(detail) if detail is not None else None
+    except Exception as e:
+        db.session.rollback()
+        run.status = 'failed'
+        run.detail = str(e)[:1000]
+        current_app.logger.error(f"Job {name} failed: {str(e)}")
+    finally:
+        run.finished_at = datetime.utcnow()
+        db.session.commit()
+        release_lock(name)
+
+    print(f"⏱️  Job {name}: {run.status} in {(run.finished_at - run.started_at).total_seconds():.2f}s")
+    return run
+
+def run_due_jobs():
+    """Run every job whose interval has elapsed; returns the names that ran"""
+    ran = []
+    for name, job_ in list(JOBS.items()):
+        if is_due(job_) and run_job(name, only_if_due=True) is not None:
+            ran.append(name)
+    return ran
+
+def job_status():
+    """Registered jobs with their schedule and latest run"""
+    status = []
+    for name, job_ in sorted(JOBS.items()):
+        last = JobRun.query.filter_by(name=name).order_by(JobRun.started_at.desc()).first()
+        status.append({
+            'name': name,
+            'interval': job_.interval,
+            'last_status': last.status if last else None,
+            'last_started': last.started_at.isoformat() if last else None,
+            'last_finished': last.finished_at.isoformat() if last and last.finished_at else None,
+            'last_detail': last.detail if last else None
+        })
+    return status
+
+# ============================================================================
+# SCHEDULER LOOP
+# ============================================================================
+
+class Scheduler:
+    """Polls for due jobs every ``tick`` seconds"""
+
+    def __init__(self, app, tick=30):
+        self.app = app
+        self.tick = tick
+        self.running = False
+
+    def run_once(self):
+        with self.app.app_context():
+            try:
+                return run_due_jobs()
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.error(f"Scheduler tick failed: {str(e)}")
+                return []
+            finally:
+                db.session.remove()
+
+    def loop(self, sleep=time.sleep):
+        self.running = True
+        while self.running:
+            self.run_once()
+            sleep(self.tick)
+
+    def stop(self):
+        self.running = False
+
+@lifecycle.on_drain
+def _stop_scheduler():
+    # Jobs already running finish and release their leases
+    scheduler = current_app.extensions.get('scheduler')
+    if scheduler is not None:
+        scheduler.stop()
+
+def start_scheduler(app):
+    """Run the scheduler inside this process, in the server's async mode"""
+    if not app.config.get('SCHEDULER_ENABLED'):
+        return None
+    scheduler = app.extensions.get('scheduler')
+    if scheduler is None:
+        scheduler = Scheduler(app, tick=app.config.get('SCHEDULER_TICK', 30))
+        app.extensions['scheduler'] = scheduler
+        socketio.start_background_task(scheduler.loop, socketio.sleep)
+        print(f"⏱️  Scheduler started in-process ({len(JOBS)} jobs)")
+    return scheduler
+
+# ============================================================================
+# MAINTENANCE JOBS
+# ============================================================================
+
+@job('orphan_image_gc', interval=6 * 3600)
+def orphan_image_gc():
+    """Delete files in UPLOAD_FOLDER that no product, profile or blob refers to"""
+    folder = current_app.config['UPLOAD_FOLDER']
+    grace = current_app.config.get('ORPHAN_IMAGE_GRACE', 3600)
+    referenced = {'default-avatar.png'}
+    referenced.update(r for (r,) in db.session.query(Product.image))
+    referenced.update(r for (r,) in db.session.query(User.profile_picture) if r)
+    referenced.update(r for (r,) in db.session.query(ImageBlob.ref))
+
+    if len(referenced) == 1:
+        return 'skipped (no images referenced; empty database?)'
+
+    cutoff = time.time() - grace
+    delete = current_app.config.get('ORPHAN_IMAGE_GC_DELETE', True)
+    orphans = 0
+    for entry in os.scandir(folder):
+        # Files younger than the grace period may belong to an upload in flight
+        if not entry.is_file() or entry.name in referenced or entry.stat().st_mtime > cutoff:
+            continue
+        orphans += 1
+        if delete:
+            os.remove(entry.path)
+    if not delete:
+        return f"found {orphans} orphaned file(s) (report only)"
+    return f"removed {orphans} orphaned file(s)"
+
+@job('stale_wishlist_cleanup', interval=24 * 3600)
+def stale_wishlist_cleanup():
+    """Remove wishlist rows whose product no longer exists"""
+    existing = db.session.query(Product.id)
+    removed = (Wishlist.query.filter(~Wishlist.product_id.in_(existing))
+               .delete(synchronize_session=False))
+    return f"removed {removed} stale wishlist row(s)"
+
+@job('stats_refresh', interval=300)
+def stats_refresh():
+    """Recompute marketplace counts before the cached copy expires"""
+    cache.set(SITE_STATS_KEY, load_site_stats(), ttl=SITE_STATS_TTL)
+    return 'refreshed'
+
+@job('cache_warmup', interval=120)
+def cache_warmup():
+    """Keep the newest products cached for the home page"""
+    products = cache.set(NEWEST_PRODUCTS_KEY, load_newest_products())
+    return f"cached {len(products)} product(s)"
+
+def _run_autocommit(sql):
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.exec_driver_sql(sql)
+
+@job('db_analyze', interval=24 * 3600)
+def db_analyze():
+    """Refresh planner statistics"""
+    _run_autocommit('ANALYZE')
+    return f"analyzed ({db.engine.dialect.name})"
+
+@job('db_vacuum', interval=7 * 24 * 3600, timeout=3600)
+def db_vacuum():
+    """Reclaim free pages (SQLite only; PostgreSQL relies on autovacuum)"""
+    if db.engine.dialect.name != 'sqlite':
+        return 'skipped (not sqlite)'
+    _run_autocommit('VACUUM')
+    return 'vacuumed'
+
+@job('prune_job_history', interval=24 * 3600)
+def prune_job_history():
+    """Keep 30 days of job runs"""
+    cutoff = datetime.utcnow() - timedelta(days=30)
+    removed = JobRun.query.filter(JobRun.started_at < cutoff).delete(synchronize_session=False)
+    return f"removed {removed} old run(s)"
+
+# ============================================================================
+# STANDALONE WORKER
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Run ThriftIt background jobs")
+    parser.add_argument('--list', action='store_true', help="Show jobs and their last run")
+    parser.add_argument('--once', metavar='JOB', help="Run a single job now and exit")
+    args = parser.parse_args()
+
+    # Importing the app registers every job defined across the code base
+    from app import create_app
+    app = create_app()
+
+    with app.app_context():
+        db.create_all()
+        if args.list:
+            for entry in job_status():
+                print(f"{entry['name']:<24} every {entry['interval']:>7}s   "
+                      f"last: {entry['last_status'] or '-'} {entry['last_started'] or ''}")
+            return
+        if args.once:
+            if args.once not in JOBS:
+                parser.error(f"Unknown job: {args.once}")
+            run = run_job(args.once)
+            print(f"{args.once}: {run.status if run else 'locked by another worker'}")
+            return
+
+    print(f"⏱️  Scheduler worker {WORKER_ID} running {len(JOBS)} jobs")
+    Scheduler(app, tick=app.config.get('SCHEDULER_TICK', 30)).loop()
+
+if __name__ == '__main__':
+    # Re-import under the module name so jobs registered by other modules
+    # (which import ``scheduler``) land in the same JOBS registry
+    import scheduler
+    scheduler.main()
@@ -0,0 +1,90 @@
+"""
+Pluggable encoders for HTTP JSON and Socket.IO packets.
+
+JSON_ENCODER picks the provider behind jsonify():
+
+* 'orjson' (default when installed): encodes in C and writes the response
+  body as bytes. It serializes datetimes natively.
+* 'json': the standard library encoder.
+
+Both encode datetimes as ISO 8601 without an offset
+("2026-01-31T14:05:09"), so routes can return model timestamps as they are.
+Socket.IO payloads use socket_timestamp() for the same format.
+
+SOCKETIO_SERIALIZER='msgpack' switches Socket.IO packets from JSON text
+frames to binary msgpack frames. It is opt-in: every page must then load
+the msgpack parser (see socketio_client_options), and all clients of a
+server must speak the same format.
+"""
+
+import importlib.util
+from datetime import date, datetime
+
+from flask.json.provider import DefaultJSONProvider
+
+def socket_timestamp(value):
+    """A datetime as sent in Socket.IO payloads (same format as the JSON APIs)"""
+    return value.isoformat(timespec='seconds')
+
+def _default(obj):
+    if isinstance(obj, datetime):
+        return socket_timestamp(obj)
+    if isinstance(obj, date):
+        return obj.isoformat()
+    return DefaultJSONProvider.default(obj)
+
+class IsoJSONProvider(DefaultJSONProvider):
+    """The standard library provider, with ISO 8601 datetimes and no key sorting"""
+
+    default = staticmethod(_default)
+    sort_keys = False
+
+class OrjsonProvider(IsoJSONProvider):
+    """jsonify() through orjson"""
+
+    def __init__(self, app):
+        super().__init__(app)
+        import orjson
+        self._orjson = orjson
+        self._option = orjson.OPT_NON_STR_KEYS | orjson.OPT_OMIT_MICROSECONDS
+
+    def _encode(self, obj, indent=False):
+        option = self._option | (self._orjson.OPT_INDENT_2 if indent else 0)
+        return self._orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        # Used by the tojson template filter; options other than indent
+        # don't apply to orjson
+        return self._encode(obj, indent=bool(kwargs.get('indent'))).decode()
+
+    def loads(self, s, **kwargs):
+        return self._orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self._encode(obj, indent) + b'\n', mimetype=self.mimetype)
+
+JSON_PROVIDERS = {
+    'json': IsoJSONProvider,
+    'orjson': OrjsonProvider,
+}
+
+def init_serialization(app):
+    """Install the configured JSON provider, falling back to the standard library"""
+    name = app.config.get('JSON_ENCODER') or 'orjson'
+    if name == 'orjson' and importlib.util.find_spec('orjson') is None:
+        app.logger.warning("⚠️  orjson not installed, using the standard json encoder")
+        name = 'json'
+    provider = JSON_PROVIDERS.get(name, IsoJSONProvider)
+    app.json_provider_class = provider
+    app.json = provider(app)
+    return app.json
+
+def socketio_serializer(app):
+    """The python-socketio ``serializer`` argument for SOCKETIO_SERIALIZER"""
+    name = app.config.get('SOCKETIO_SERIALIZER') or 'default'
+    if name == 'msgpack' and importlib.util.find_spec('msgpack') is None:
+        app.logger.warning("⚠️  msgpack not installed, Socket.IO stays on JSON packets")
+        return 'default'
+    return name if name in ('default', 'msgpack') else 'default'
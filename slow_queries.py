@@ -0,0 +1,268 @@
+"""
+Slow-query log: records SQL statements that take longer than
+SLOW_QUERY_THRESHOLD_MS, in any environment.
+
+SQLAlchemy's before/after_cursor_execute events time every statement. A
+slow statement is normalized into a fingerprint: literals and bound
+parameters become ``?``, and IN lists and multi-row VALUES collapse. The
+statement is then recorded against the route, Socket.IO event or job that
+ran it.
+
+* ``recent``: a ring buffer of the last SLOW_QUERY_LOG_SIZE slow executions
+* ``queries``: per-fingerprint totals, bounded to SLOW_QUERY_MAX_FINGERPRINTS
+  (least recently seen evicted first)
+
+The first time a fingerprint is seen, its plan is captured with EXPLAIN
+(EXPLAIN QUERY PLAN on SQLite) on a background task and its own
+connection, so the slow request isn't held up. Parameters are kept only
+until that EXPLAIN runs. EXPLAIN without ANALYZE doesn't execute the
+statement.
+
+State is per process; /api/admin/slow_queries shows this worker's log.
+"""
+
+import hashlib
+import queue
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from datetime import datetime
+
+from flask import g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+
+from extensions import db, socketio
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|(?<!:):\w+|\$\d+")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_ROWS = re.compile(r"(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+")
+_SPACE = re.compile(r"\s+")
+
+EXPLAINABLE = ('select', 'with', 'update', 'delete')
+
+def normalize_sql(statement):
+    """The statement with literals and parameters replaced, for grouping"""
+    sql = _STRING.sub('?', statement)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _SPACE.sub(' ', sql).strip()
+    sql = _VALUES_ROWS.sub(r'\1, ...', sql)
+    return _IN_LIST.sub('(...)', sql)
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+def query_context():
+    """What ran the current statement: a route, a Socket.IO event or a job"""
+    if has_request_context():
+        socket_event = getattr(request, 'event', None)
+        if socket_event:
+            return f"socket {getattr(request, 'namespace', '/')} {socket_event.get('message')}"
+        rule = request.url_rule.rule if request.url_rule else request.path
+        return f"{request.method} {rule}"
+    if has_app_context() and g.get('job_name'):
+        return f"job {g.job_name}"
+    return 'background'
+
+class SlowQueryLog:
+    """Per-process slow statement recorder"""
+
+    def __init__(self):
+        self.enabled = True
+        self.threshold = 0.2
+        self.max_fingerprints = 200
+        self.explain = True
+        self.logger = None
+        self.recent = deque(maxlen=500)
+        self.queries = OrderedDict()   # fingerprint -> aggregate
+        self.recorded = 0
+        self.evicted = 0
+        self.explained = 0
+        self.explain_dropped = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._explain_queue = None
+
+    def configure(self, config, logger=None):
+        self.enabled = config.get('SLOW_QUERY_ENABLED', True)
+        self.threshold = config.get('SLOW_QUERY_THRESHOLD_MS', 200) / 1000
+        self.max_fingerprints = config.get('SLOW_QUERY_MAX_FINGERPRINTS', 200)
+        self.explain = config.get('SLOW_QUERY_EXPLAIN', True)
+        self.logger = logger
+        size = config.get('SLOW_QUERY_LOG_SIZE', 500)
+        if size != self.recent.maxlen:
+            self.recent = deque(self.recent, maxlen=size)
+
+    def instrument(self, engine, context=None, explain=True):
+        """
+        Time statements on ``engine``. ``context`` labels every statement
+        instead of query_context(); ``explain=False`` skips plan capture
+        (e.g. for an asyncio engine's sync facade).
+        """
+        if getattr(engine, '_slow_query_log', False):
+            return
+        engine._slow_query_log = True
+        # A single shared connection (e.g. in-memory SQLite) would run the
+        # EXPLAIN inside the slow request's own transaction
+        explain = explain and not isinstance(engine.pool, StaticPool)
+
+        def before(conn, cursor, statement, parameters, exec_context, executemany):
+            if exec_context is not None:
+                exec_context._slow_query_start = time.perf_counter()
+
+        def after(conn, cursor, statement, parameters, exec_context, executemany):
+            started = getattr(exec_context, '_slow_query_start', None)
+            if started is None or not self.enabled or getattr(self._local, 'explaining', False):
+                return
+            elapsed = time.perf_counter() - started
+            if elapsed >= self.threshold:
+                self.record(statement, elapsed, context or query_context(),
+                            rows=cursor.rowcount,
+                            explain=(engine, None if executemany else parameters) if explain else None)
+
+        event.listen(engine, 'before_cursor_execute', before)
+        event.listen(engine, 'after_cursor_execute', after)
+
+    def record(self, statement, elapsed, context, rows=-1, explain=None):
+        normalized = normalize_sql(statement)
+        key = fingerprint(normalized)
+        ms = elapsed * 1000
+        now = datetime.utcnow()
+        with self._lock:
+            entry = self.queries.get(key)
+            new = entry is None
+            if new:
+                entry = self.queries[key] = {
+                    'fingerprint': key,
+                    'statement': normalized[:2000],
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'first_seen': now,
+                    'contexts': Counter(),
+                    'plan': None,
+                }
+                if len(self.queries) > self.max_fingerprints:
+                    self.queries.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self.queries.move_to_end(key)
+            entry['count'] += 1
+            entry['total_ms'] += ms
+            entry['max_ms'] = max(entry['max_ms'], ms)
+            entry['last_ms'] = ms
+            entry['last_seen'] = now
+            entry['contexts'][context] += 1
+            self.recent.append({'at': now, 'ms': round(ms, 1), 'fingerprint': key,
+                                'context': context, 'rows': rows if rows >= 0 else None})
+            self.recorded += 1
+
+        if self.logger is not None:
+            self.logger.warning(f"🐢 Slow query {ms:.0f} ms [{context}] {key}: {normalized[:200]}")
+        if new and explain is not None and self.explain:
+            self._queue_explain(key, statement, *explain)
+
+    # ------------------------------------------------------------------
+    # EXPLAIN capture
+    # ------------------------------------------------------------------
+
+    def _queue_explain(self, key, statement, engine, parameters):
+        if not statement.lstrip().lower().startswith(EXPLAINABLE):
+            return
+        if self._explain_queue is None:
+            with self._lock:
+                if self._explain_queue is None:
+                    self._explain_queue = queue.Queue(maxsize=100)
+                    socketio.start_background_task(self._explain_worker)
+        try:
+            self._explain_queue.put_nowait((key, statement, engine, parameters))
+        except queue.Full:
+            self.explain_dropped += 1
+
+    def _explain_worker(self):
+        while True:
+            key, statement, engine, parameters = self._explain_queue.get()
+            try:
+                plan = self.explain_plan(engine, statement, parameters)
+            except Exception as e:
+                plan = [f"EXPLAIN failed: {str(e)[:500]}"]
+            with self._lock:
+                if key in self.queries:
+                    self.queries[key]['plan'] = plan
+                    self.explained += 1
+
+    def explain_plan(self, engine, statement, parameters=None):
+        """The plan for ``statement`` as text lines"""
+        sqlite = engine.dialect.name == 'sqlite'
+        prefix = 'EXPLAIN QUERY PLAN ' if sqlite else 'EXPLAIN '
+        self._local.explaining = True
+        try:
+            with engine.connect() as conn:
+                rows = conn.exec_driver_sql(prefix + statement, parameters or ()).all()
+        finally:
+            self._local.explaining = False
+        if not sqlite:
+            return [row[0] for row in rows]
+        # SQLite rows are (id, parent, notused, detail); indent children
+        depth = {0: -1}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append('  ' * depth[node_id] + detail)
+        return lines
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+
+    SORT_KEYS = {
+        'total': lambda q: q['total_ms'],
+        'max': lambda q: q['max_ms'],
+        'count': lambda q: q['count'],
+        'recent': lambda q: q['last_seen'],
+    }
+
+    def report(self, limit=50, sort='total'):
+        with self._lock:
+            queries = sorted(self.queries.values(), key=self.SORT_KEYS[sort], reverse=True)[:limit]
+            queries = [dict(q, total_ms=round(q['total_ms'], 1), max_ms=round(q['max_ms'], 1),
+                            last_ms=round(q['last_ms'], 1), avg_ms=round(q['total_ms'] / q['count'], 1),
+                            contexts=dict(q['contexts'].most_common(5)))
+                       for q in queries]
+            recent = list(self.recent)[-limit:][::-1]
+        return {
+            'stats': self.stats(),
+            'queries': queries,
+            'recent': recent,
+        }
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'threshold_ms': self.threshold * 1000,
+            'recorded': self.recorded,
+            'fingerprints': len(self.queries),
+            'evicted': self.evicted,
+            'explained': self.explained,
+            'explain_dropped': self.explain_dropped,
+        }
+
+    def reset(self):
+        with self._lock:
+            self.queries.clear()
+            self.recent.clear()
+            self.recorded = self.evicted = self.explained = self.explain_dropped = 0
+
+slow_queries = SlowQueryLog()
+
+def init_slow_query_log(app):
+    """Apply the app's settings and time statements on its engine"""
+    slow_queries.configure(app.config, app.logger)
+    with app.app_context():
+        slow_queries.instrument(db.engine)
+    app.extensions['slow_queries'] = slow_queries
+    return slow_queries
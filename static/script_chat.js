@@ -37,6 +37,17 @@ const statusDisplay = document.getElementById('connectionStatus');
 const chat = document.getElementById("chat");
 const input = document.getElementById("messageInput");
 const sendBtn = document.getElementById("sendBtn");
+const userStatus = document.getElementById('userStatus');
+const onlineIndicator = document.getElementById('onlineIndicator');
+const typingIndicator = document.getElementById('typingIndicator');
+
+// Typing: the server forwards at most one "typing" frame per refresh
+// interval, so only re-send while typing at that pace
+const TYPING_REFRESH_MS = 3000;
+const TYPING_IDLE_MS = 3000;
+let typingSentAt = 0;
+let typingIdleTimer = null;
+let typingHideTimer = null;
 
 // Connection state tracking
 let isConnected = false;
@@ -45,19 +56,55 @@ let socket = null;
 let connectionAttempts = 0;
 const maxConnectionAttempts = 5;
 
+// Outbox position: the server numbers the events it sends us, and on every
+// (re)join we tell it the last one we handled so it replays only the gap
+let outboxEpoch = null;
+let lastSeq = 0;
+
+function joinPayload() {
+    const payload = { user_id: currentUserId, timestamp: Date.now() };
+    if (outboxEpoch !== null) {
+        payload.epoch = outboxEpoch;
+        payload.last_seq = lastSeq;
+    }
+    return payload;
+}
+
+// Transport policy from the server (websocket first, polling as fallback)
+function socketTransportOptions() {
+    const meta = document.querySelector('meta[name="socketio-options"]');
+    let options;
+    try {
+        options = meta ? JSON.parse(meta.content) : { transports: ['websocket', 'polling'] };
+    } catch (e) {
+        options = { transports: ['websocket', 'polling'] };
+    }
+    // The server sends msgpack packets (SOCKETIO_SERIALIZER=msgpack)
+    if (options.msgpack && window.socketioMsgpackParser) {
+        options.parser = window.socketioMsgpackParser;
+    }
+    delete options.msgpack;
+    return options;
+}
+
+// If the WebSocket handshake fails (e.g. a proxy blocks it), retry with
+// long-polling first and let the client upgrade once connected
+function fallBackToPolling(sock) {
+    const transports = sock.io.opts.transports;
+    if (transports[0] === 'websocket' && transports.includes('polling')) {
+        sock.io.opts.transports = ['polling', 'websocket'];
+        sock.io.opts.upgrade = true;
+    }
+}
+
 // Initialize Socket.IO connection with Render-specific configuration
 function initializeSocket() {
     try {
         debugLog('Initializing Socket.IO connection for Render...');
         
-        // IMPORTANT: Render-specific configuration
         const socketConfig = {
-            // Use polling first, then upgrade to websocket
-            transports: ['polling', 'websocket'],
-            upgrade: true,
-            rememberUpgrade: false, // Don't remember upgrades for Render
+            ...socketTransportOptions(),
             timeout: 30000, // Longer timeout for Render
-            forceNew: true,
             reconnection: true,
             reconnectionDelay: 2000, // Longer delay
             reconnectionAttempts: maxConnectionAttempts,
@@ -69,8 +116,7 @@ function initializeSocket() {
             
             // Query parameters for debugging
             query: {
-                user_id: currentUserId,
-                timestamp: Date.now()
+                user_id: currentUserId
             }
         };
 
@@ -92,7 +138,11 @@ function initializeSocket() {
         socket.on('joined', handleJoined);
         socket.on('error', handleSocketError);
         socket.on('new_message', handleNewMessage);
-        socket.on('message_sent', handleMessageSent);
+        socket.on('saved_search_match', handleSavedSearchMatch);
+        socket.on('presence', handlePresence);
+        socket.on('typing', handleTyping);
+        socket.on('server_draining', handleServerDraining);
+        socket.on('idle_timeout', handleIdleTimeout);
 
         debugLog('Socket.IO initialized successfully');
         
@@ -112,10 +162,7 @@ function handleConnect() {
     
     // Join personal room
     debugLog('Joining room for user', currentUserId);
-    socket.emit('join', { 
-        user_id: currentUserId,
-        timestamp: Date.now()
-    });
+    socket.emit('join', joinPayload());
     
     // Load conversation history if not already loaded
     if (!conversationLoaded) {
@@ -138,6 +185,13 @@ function handleConnectionConfirmed(data) {
 
 function handleConnectError(error) {
     debugLog('Connection error', error);
+    if (error.message === 'Server restarting') {
+        // Refused while the server drains; socket.io won't retry this itself
+        updateStatusDisplay('error', '<i class="fas fa-exclamation-triangle"></i> Server restarting. Reconnecting...');
+        reconnectAfterServerDisconnect();
+        return;
+    }
+    fallBackToPolling(socket);
     connectionAttempts++;
     isConnected = false;
     
@@ -168,13 +222,16 @@ function handleDisconnect(reason) {
     }
     
     updateStatusDisplay('error', `<i class="fas fa-exclamation-triangle"></i> ${message}. Reconnecting...`);
+    if (reason === 'io server disconnect') {
+        reconnectAfterServerDisconnect();
+    }
 }
 
 function handleReconnect(attemptNumber) {
     debugLog('Reconnected after attempts', attemptNumber);
     updateStatusDisplay('connected', '<i class="fas fa-check-circle"></i> Reconnected!');
     
-    socket.emit('join', { user_id: currentUserId });
+    socket.emit('join', joinPayload());
     
     if (!conversationLoaded) {
         loadConversation(otherUserId);
@@ -191,8 +248,58 @@ function handleReconnectFailed() {
     showConnectionError();
 }
 
+// The server closed the socket on purpose (an idle timeout, or a restart
+// that outlived its drain window). socket.io doesn't reconnect after that on
+// its own. An idle tab in the background waits until it is shown again;
+// otherwise reconnect at a random moment so clients don't all arrive at once.
+const RECONNECT_WINDOW_MS = 10000;
+let reconnectWindowMs = RECONNECT_WINDOW_MS;
+let idleDisconnected = false;
+
+function handleIdleTimeout() {
+    debugLog('Disconnected by the server after being idle');
+    idleDisconnected = true;
+}
+
+function reconnectAfterServerDisconnect() {
+    if (idleDisconnected && document.hidden) {
+        document.addEventListener('visibilitychange', function onVisible() {
+            if (document.hidden) return;
+            document.removeEventListener('visibilitychange', onVisible);
+            idleDisconnected = false;
+            socket.connect();
+        });
+        return;
+    }
+    idleDisconnected = false;
+    setTimeout(() => socket.connect(), Math.random() * reconnectWindowMs);
+}
+
+// The server is shutting down for a deploy. Reconnect at a random moment
+// within the window it gives, so clients don't all hit the new instance at once
+function handleServerDraining(data) {
+    reconnectWindowMs = data.reconnect_window_ms || RECONNECT_WINDOW_MS;
+    const delay = Math.random() * reconnectWindowMs;
+    debugLog('Server restarting, reconnecting in ms', Math.round(delay));
+    setTimeout(() => {
+        socket.disconnect();
+        socket.connect();
+    }, delay);
+}
+
 function handleJoined(data) {
     debugLog('Successfully joined room', data);
+    if (data.epoch !== undefined) {
+        lastSeq = data.epoch === outboxEpoch ? Math.max(lastSeq, data.seq) : data.seq;
+        outboxEpoch = data.epoch;
+        if (data.resync) {
+            // Missed more than the server still holds: reload the history
+            debugLog('Outbox gap, reloading conversation');
+            loadConversation(otherUserId);
+        }
+    }
+    // Follow the other user's presence even if they aren't an inbox contact yet
+    socket.emit('watch', { user_ids: [otherUserId] });
     if (data.message) {
         showNotification(data.message, 'success');
     }
@@ -203,18 +310,85 @@ function handleSocketError(data) {
     showNotification(data.message || 'Server error occurred', 'error');
 }
 
+function handlePresence(data) {
+    const online = data.users ? data.users[otherUserId] : undefined;
+    if (online === undefined) return;
+    
+    debugLog('Presence update', data.users);
+    if (userStatus) {
+        userStatus.textContent = online ? 'Active now' : 'Offline';
+    }
+    if (onlineIndicator) {
+        onlineIndicator.classList.toggle('offline', !online);
+    }
+    if (!online) {
+        showTypingIndicator(false);
+    }
+}
+
+function handleTyping(data) {
+    if (data.user_id != otherUserId) return;
+    showTypingIndicator(data.typing);
+}
+
+function showTypingIndicator(visible) {
+    if (!typingIndicator) return;
+    clearTimeout(typingHideTimer);
+    typingIndicator.style.display = visible ? 'block' : 'none';
+    if (visible) {
+        // Hide it if the sender stops refreshing (e.g. closed the tab)
+        typingHideTimer = setTimeout(() => showTypingIndicator(false), TYPING_REFRESH_MS * 2);
+    }
+}
+
+function notifyTyping() {
+    if (!isConnected || !socket) return;
+    
+    const now = Date.now();
+    if (now - typingSentAt >= TYPING_REFRESH_MS) {
+        socket.emit('typing', { receiver_id: otherUserId, typing: true });
+        typingSentAt = now;
+    }
+    clearTimeout(typingIdleTimer);
+    typingIdleTimer = setTimeout(stopTyping, TYPING_IDLE_MS);
+}
+
+function stopTyping() {
+    clearTimeout(typingIdleTimer);
+    if (typingSentAt && isConnected && socket) {
+        socket.emit('typing', { receiver_id: otherUserId, typing: false });
+    }
+    typingSentAt = 0;
+}
+
+// One new_message event goes to both people in the conversation; our own
+// messages come back as the send confirmation
 function handleNewMessage(msg) {
     debugLog('Received new message', msg);
-    if (msg.sender_id == otherUserId) {
+    if (msg.seq !== undefined) {
+        if (msg.seq <= lastSeq) return;   // already handled (replay overlap)
+        lastSeq = msg.seq;
+    }
+    if (msg.sender_id == currentUserId) {
+        if (msg.receiver_id == otherUserId) {
+            appendMessage('sent', msg.content, 'You', msg.timestamp);
+        }
+    } else if (msg.sender_id == otherUserId) {
+        showTypingIndicator(false);
         appendMessage('received', msg.content, msg.sender_name || 'User', msg.timestamp);
     }
 }
 
-function handleMessageSent(msg) {
-    debugLog('Message sent confirmation', msg);
-    if (msg.receiver_id == otherUserId) {
-        appendMessage('sent', msg.content, 'You', msg.timestamp);
+// One of our saved searches matched a listing uploaded just now. It shares
+// the outbox sequence with new_message, so replays are dropped the same way
+function handleSavedSearchMatch(match) {
+    debugLog('Saved search match', match);
+    if (match.seq !== undefined) {
+        if (match.seq <= lastSeq) return;   // already handled (replay overlap)
+        lastSeq = match.seq;
     }
+    const labels = match.searches.map((s) => s.label).join(', ');
+    showNotification(`🔔 New listing for ${labels}: ${match.product.name}`, 'info');
 }
 
 // Utility functions
@@ -251,14 +425,17 @@ function loadConversation(userId) {
         if (!response.ok) {
             throw new Error(`HTTP ${response.status}: ${response.statusText}`);
         }
+        hasOlderMessages = response.headers.get('X-Has-Older') === 'true';
         return response.json();
     })
     .then(messages => {
         debugLog('Loaded messages', `${messages.length} messages`);
         conversationLoaded = true;
         chat.innerHTML = '';
+        oldestMessageId = messages.length ? messages[0].id : null;
+        updateLoadEarlierButton();
         
-        if (messages.length === 0) {
+        if (messages.length === 0 && !hasOlderMessages) {
             showEmptyConversation();
         } else {
             let currentDate = null;
@@ -294,12 +471,96 @@ function loadConversation(userId) {
     });
 }
 
+// Older messages live in the archive and are fetched a page at a time
+const EARLIER_PAGE_SIZE = 50;
+let hasOlderMessages = false;
+let oldestMessageId = null;
+let loadingEarlier = false;
+
+function updateLoadEarlierButton() {
+    let button = document.getElementById('loadEarlierBtn');
+    if (!hasOlderMessages) {
+        if (button) button.remove();
+        return;
+    }
+    if (!button) {
+        button = document.createElement('button');
+        button.id = 'loadEarlierBtn';
+        button.className = 'load-earlier-btn';
+        button.textContent = 'Load earlier messages';
+        button.addEventListener('click', loadEarlierMessages);
+    }
+    chat.prepend(button);
+}
+
+function loadEarlierMessages() {
+    if (loadingEarlier || !hasOlderMessages) return;
+    loadingEarlier = true;
+    
+    const params = new URLSearchParams({ limit: EARLIER_PAGE_SIZE });
+    if (oldestMessageId !== null) {
+        params.set('before_id', oldestMessageId);
+    } else {
+        params.set('before_id', Number.MAX_SAFE_INTEGER);
+    }
+    
+    fetch(`/api/conversations/${otherUserId}?${params}`, { credentials: 'same-origin' })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        }
+        hasOlderMessages = response.headers.get('X-Has-Older') === 'true';
+        return response.json();
+    })
+    .then(messages => {
+        debugLog('Loaded earlier messages', `${messages.length} messages`);
+        if (messages.length) {
+            oldestMessageId = messages[0].id;
+            prependMessages(messages);
+        }
+        updateLoadEarlierButton();
+    })
+    .catch(error => {
+        debugLog('Error loading earlier messages', error);
+        showNotification('Could not load earlier messages', 'error');
+    })
+    .finally(() => {
+        loadingEarlier = false;
+    });
+}
+
+function prependMessages(messages) {
+    // Render at the end with the usual helpers, then move the new nodes to
+    // the top, keeping the reader's scroll position
+    const previousHeight = chat.scrollHeight;
+    const firstExisting = document.getElementById('loadEarlierBtn')?.nextSibling || chat.firstChild;
+    const start = chat.children.length;
+    
+    let currentDate = null;
+    messages.forEach(msg => {
+        const msgDate = new Date(msg.timestamp).toDateString();
+        if (msgDate !== currentDate) {
+            addDateDivider(msgDate);
+            currentDate = msgDate;
+        }
+        appendMessage(msg.is_sender ? 'sent' : 'received', msg.content, msg.sender_name, msg.timestamp, false);
+    });
+    
+    Array.from(chat.children).slice(start).forEach(node => chat.insertBefore(node, firstExisting));
+    chat.scrollTop += chat.scrollHeight - previousHeight;
+}
+
 // Auto-resize textarea
 if (input) {
     input.addEventListener('input', function() {
         this.style.height = 'auto';
         this.style.height = Math.min(this.scrollHeight, 120) + 'px';
         updateSendButton();
+        if (this.value.trim()) {
+            notifyTyping();
+        } else {
+            stopTyping();
+        }
     });
 }
 
@@ -336,7 +597,9 @@ function sendMessage() {
         sendBtn.disabled = true;
     }
     
-    // Send via socket
+    // Send via socket; the server clears our typing state with the message
+    clearTimeout(typingIdleTimer);
+    typingSentAt = 0;
     socket.emit('send_message', data);
     
     // Re-enable input after a delay
@@ -381,7 +644,7 @@ if (input) {
 }
 
 // Message display functions
-function appendMessage(type, text, senderName, timestamp) {
+function appendMessage(type, text, senderName, timestamp, scroll = true) {
     if (!chat) return;
     
     const messageDiv = document.createElement("div");
@@ -406,7 +669,9 @@ function appendMessage(type, text, senderName, timestamp) {
     messageDiv.appendChild(content);
     
     chat.appendChild(messageDiv);
-    scrollToBottom();
+    if (scroll) {
+        scrollToBottom();
+    }
 }
 
 function addDateDivider(dateString) {
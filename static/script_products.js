@@ -0,0 +1,237 @@
+// Live product grid: applies insert/delete deltas pushed over Socket.IO
+
+const grid = document.getElementById('productGrid');
+const emptyMessage = document.getElementById('noProducts');
+
+const activeCategory = grid ? grid.dataset.category : '';
+const activeSearch = grid ? grid.dataset.search.toLowerCase() : '';
+const activeConditions = grid && grid.dataset.conditions ? grid.dataset.conditions.split('|') : [];
+const rentalOnly = grid ? grid.dataset.rental === '1' : false;
+const minPrice = grid && grid.dataset.minPrice !== '' ? Number(grid.dataset.minPrice) : null;
+const maxPrice = grid && grid.dataset.maxPrice !== '' ? Number(grid.dataset.maxPrice) : null;
+
+const userMeta = document.querySelector('meta[name="current-user-id"]');
+const currentUserId = userMeta ? parseInt(userMeta.content) : null;
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+function updateEmptyState() {
+    const hasProducts = grid.querySelector('.product-card') !== null;
+    grid.hidden = !hasProducts;
+    emptyMessage.hidden = hasProducts;
+}
+
+// Same markup as the server-rendered cards in products.html
+function buildCard(product) {
+    const card = document.createElement('article');
+    card.className = 'product-card';
+    card.dataset.productId = product.id;
+    card.innerHTML = `
+        <a href="/product/${product.id}">
+            <figure>
+                <img src="${escapeHtml(product.image)}" alt="${escapeHtml(product.name)}">
+            </figure>
+            <div class="product-info">
+                <h2 class="product-name">${escapeHtml(product.name)}</h2>
+                <p class="product-price">RM${Number(product.price).toFixed(2)}</p>
+            </div>
+        </a>
+    `;
+    return card;
+}
+
+// Same filters the page was rendered with (search box and facets)
+function matchesFilters(product) {
+    if (activeSearch && !product.name.toLowerCase().includes(activeSearch)) return false;
+    if (activeConditions.length && !activeConditions.includes(product.condition)) return false;
+    if (rentalOnly && !product.rental) return false;
+    if (minPrice !== null && product.price < minPrice) return false;
+    if (maxPrice !== null && product.price > maxPrice) return false;
+    return true;
+}
+
+function handleInsert(product) {
+    if (!matchesFilters(product)) return;
+    if (grid.querySelector(`[data-product-id="${product.id}"]`)) return;
+
+    grid.prepend(buildCard(product));
+    updateEmptyState();
+}
+
+function handleDelete(productId) {
+    const card = grid.querySelector(`[data-product-id="${productId}"]`);
+    if (card) {
+        card.remove();
+        updateEmptyState();
+    }
+}
+
+// A saved search of ours matched a listing uploaded just now. Matches we
+// miss while disconnected are listed on the next page load instead
+function handleSavedSearchMatch(match) {
+    const alerts = document.getElementById('matchAlerts');
+    if (!alerts) return;
+    const product = match.product;
+    const labels = match.searches.map((s) => escapeHtml(s.label)).join(', ');
+    const alert = document.createElement('div');
+    alert.className = 'match-alert';
+    alert.innerHTML = `🔔 New listing for ${labels}: ` +
+        `<a href="/product/${product.id}">${escapeHtml(product.name)}</a> ` +
+        `RM${Number(product.price).toFixed(2)}`;
+    alerts.prepend(alert);
+}
+
+// Save the search this page was rendered with
+function initializeSaveSearch() {
+    const button = document.getElementById('saveSearchBtn');
+    const status = document.getElementById('saveSearchStatus');
+    if (!button) return;
+
+    button.addEventListener('click', async () => {
+        button.disabled = true;
+        try {
+            const response = await fetch('/api/saved_searches' + window.location.search, { method: 'POST' });
+            const result = await response.json();
+            status.textContent = result.success
+                ? "Saved. We'll let you know when a matching item is listed."
+                : result.message;
+            button.disabled = result.success;
+        } catch (e) {
+            status.textContent = 'Could not save this search. Please try again.';
+            button.disabled = false;
+        }
+    });
+}
+
+// Transport policy from the server (websocket first, polling as fallback)
+function socketTransportOptions() {
+    const meta = document.querySelector('meta[name="socketio-options"]');
+    let options;
+    try {
+        options = meta ? JSON.parse(meta.content) : { transports: ['websocket', 'polling'] };
+    } catch (e) {
+        options = { transports: ['websocket', 'polling'] };
+    }
+    // The server sends msgpack packets (SOCKETIO_SERIALIZER=msgpack)
+    if (options.msgpack && window.socketioMsgpackParser) {
+        options.parser = window.socketioMsgpackParser;
+    }
+    delete options.msgpack;
+    return options;
+}
+
+// If the WebSocket handshake fails (e.g. a proxy blocks it), retry with
+// long-polling first and let the client upgrade once connected
+function fallBackToPolling(sock) {
+    const transports = sock.io.opts.transports;
+    if (transports[0] === 'websocket' && transports.includes('polling')) {
+        sock.io.opts.transports = ['polling', 'websocket'];
+        sock.io.opts.upgrade = true;
+    }
+}
+
+function initializeProductFeed() {
+    if (!grid || typeof io === 'undefined') return;
+
+    const socket = io('/products', socketTransportOptions());
+
+    socket.on('connect_error', (error) => {
+        if (error.message === 'Server restarting') {
+            reconnectSoon(socket);   // refused while the server drains
+        } else {
+            fallBackToPolling(socket);
+        }
+    });
+
+    socket.on('connect', () => {
+        // Rooms are dropped on reconnect, so (re)subscribe every time
+        socket.emit('subscribe', {
+            categories: activeCategory ? [activeCategory] : []
+        });
+    });
+
+    socket.on('product_delta', (delta) => {
+        if (delta.op === 'insert') {
+            handleInsert(delta.product);
+        } else if (delta.op === 'delete') {
+            handleDelete(delta.id);
+        }
+    });
+
+    followServerRestarts(socket);
+}
+
+// Saved-search matches are sent to our user room on the default namespace,
+// like chat messages
+function initializeMatchAlerts() {
+    if (!document.getElementById('matchAlerts') || !currentUserId || typeof io === 'undefined') return;
+
+    const socket = io(socketTransportOptions());
+
+    socket.on('connect_error', (error) => {
+        if (error.message === 'Server restarting') {
+            reconnectSoon(socket);   // refused while the server drains
+        } else {
+            fallBackToPolling(socket);
+        }
+    });
+
+    socket.on('connect', () => {
+        socket.emit('join', { user_id: currentUserId });
+    });
+
+    socket.on('saved_search_match', handleSavedSearchMatch);
+
+    followServerRestarts(socket);
+}
+
+// Reconnect at a random moment within the window the server gives, so
+// clients don't all hit the new instance at once
+const RECONNECT_WINDOW_MS = 10000;
+let reconnectWindowMs = RECONNECT_WINDOW_MS;
+
+// socket.io doesn't reconnect by itself after the server refused the
+// connection or closed the socket on purpose (a restart that outlived its
+// drain window, an idle timeout)
+function reconnectSoon(socket) {
+    setTimeout(() => socket.connect(), Math.random() * reconnectWindowMs);
+}
+
+function followServerRestarts(socket) {
+    // The server is shutting down for a deploy
+    socket.on('server_draining', (data) => {
+        reconnectWindowMs = data.reconnect_window_ms || RECONNECT_WINDOW_MS;
+        setTimeout(() => {
+            socket.disconnect();
+            socket.connect();
+        }, Math.random() * reconnectWindowMs);
+    });
+
+    // An idle tab in the background waits until it is shown again
+    let idleDisconnected = false;
+    socket.on('idle_timeout', () => { idleDisconnected = true; });
+
+    socket.on('disconnect', (reason) => {
+        if (reason !== 'io server disconnect') return;
+        if (idleDisconnected && document.hidden) {
+            document.addEventListener('visibilitychange', function onVisible() {
+                if (document.hidden) return;
+                document.removeEventListener('visibilitychange', onVisible);
+                socket.connect();
+            });
+        } else {
+            reconnectSoon(socket);
+        }
+        idleDisconnected = false;
+    });
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    initializeProductFeed();
+    initializeMatchAlerts();
+    initializeSaveSearch();
+});
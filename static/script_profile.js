@@ -37,7 +37,7 @@
 
         // Fixed delete product function
         function deleteProduct(productId, productName) {
-            if (confirm(`Are you sure you want to delete "${productName}"? This action cannot be undone.`)) {
+            if (confirm(`Are you sure you want to delete "${productName}"?`)) {
                 fetch(`/api/products/delete/${productId}`, {
                     method: 'DELETE',
                     headers: {
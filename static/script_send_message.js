@@ -8,16 +8,59 @@ function debugLog(message, data = null) {
 // Global variables - FIXED: Remove template literals since this is a static file
 const currentUserId = parseInt(document.querySelector('meta[name="current-user-id"]').content);
 let selectedRecipient = null;
+let selectedRecipientName = '';
 let socket = null;
 let isConnected = false;
 
+// Outbox position: the server numbers the events it sends us, and on every
+// (re)join we tell it the last one we handled so it replays only the gap
+let outboxEpoch = null;
+let lastSeq = 0;
+
+function joinPayload() {
+    const payload = { user_id: currentUserId };
+    if (outboxEpoch !== null) {
+        payload.epoch = outboxEpoch;
+        payload.last_seq = lastSeq;
+    }
+    return payload;
+}
+
 // DOM elements
 const chat = document.getElementById("chat");
 const input = document.getElementById("messageInput");
-const recipient = document.getElementById("recipient");
+const recipientSearch = document.getElementById("recipientSearch");
+const recipientResults = document.getElementById("recipientResults");
 const sendBtn = document.getElementById("sendBtn");
 const statusDisplay = document.getElementById('connectionStatus');
 
+// Transport policy from the server (websocket first, polling as fallback)
+function socketTransportOptions() {
+    const meta = document.querySelector('meta[name="socketio-options"]');
+    let options;
+    try {
+        options = meta ? JSON.parse(meta.content) : { transports: ['websocket', 'polling'] };
+    } catch (e) {
+        options = { transports: ['websocket', 'polling'] };
+    }
+    // The server sends msgpack packets (SOCKETIO_SERIALIZER=msgpack)
+    if (options.msgpack && window.socketioMsgpackParser) {
+        options.parser = window.socketioMsgpackParser;
+    }
+    delete options.msgpack;
+    return options;
+}
+
+// If the WebSocket handshake fails (e.g. a proxy blocks it), retry with
+// long-polling first and let the client upgrade once connected
+function fallBackToPolling(sock) {
+    const transports = sock.io.opts.transports;
+    if (transports[0] === 'websocket' && transports.includes('polling')) {
+        sock.io.opts.transports = ['polling', 'websocket'];
+        sock.io.opts.upgrade = true;
+    }
+}
+
 // Initialize Socket.IO connection
 function initializeSocket() {
     try {
@@ -25,11 +68,8 @@ function initializeSocket() {
         
         // Create socket connection with enhanced configuration
         socket = io({
-            transports: ['websocket', 'polling'],
-            upgrade: true,
-            rememberUpgrade: true,
+            ...socketTransportOptions(),
             timeout: 20000,
-            forceNew: true,
             reconnection: true,
             reconnectionDelay: 1000,
             reconnectionAttempts: 5,
@@ -48,7 +88,9 @@ function initializeSocket() {
         socket.on('joined', handleJoined);
         socket.on('error', handleSocketError);
         socket.on('new_message', handleNewMessage);
-        socket.on('message_sent', handleMessageSent);
+        socket.on('saved_search_match', handleSavedSearchMatch);
+        socket.on('server_draining', handleServerDraining);
+        socket.on('idle_timeout', handleIdleTimeout);
 
         debugLog('Socket.IO initialized successfully');
         
@@ -68,7 +110,7 @@ function handleConnect() {
     
     // Join personal room
     debugLog('Joining room for user', currentUserId);
-    socket.emit('join', { user_id: currentUserId });
+    socket.emit('join', joinPayload());
     
     // Hide status after 2 seconds
     setTimeout(() => {
@@ -78,6 +120,15 @@ function handleConnect() {
 
 function handleConnectError(error) {
     debugLog('Connection error', error);
+    if (error.message === 'Server restarting') {
+        // Refused while the server drains; socket.io won't retry this itself
+        statusDisplay.innerHTML = '<i class="fas fa-exclamation-triangle"></i> Server restarting. Reconnecting...';
+        statusDisplay.className = 'status-indicator error';
+        statusDisplay.style.display = 'block';
+        reconnectAfterServerDisconnect();
+        return;
+    }
+    fallBackToPolling(socket);
     isConnected = false;
     statusDisplay.innerHTML = '<i class="fas fa-exclamation-triangle"></i> Connection failed. Retrying...';
     statusDisplay.className = 'status-indicator error';
@@ -91,6 +142,9 @@ function handleDisconnect(reason) {
     statusDisplay.innerHTML = '<i class="fas fa-exclamation-triangle"></i> Connection lost. Reconnecting...';
     statusDisplay.className = 'status-indicator error';
     statusDisplay.style.display = 'block';
+    if (reason === 'io server disconnect') {
+        reconnectAfterServerDisconnect();
+    }
 }
 
 function handleReconnect(attemptNumber) {
@@ -98,7 +152,46 @@ function handleReconnect(attemptNumber) {
     statusDisplay.innerHTML = '<i class="fas fa-check-circle"></i> Reconnected!';
     statusDisplay.className = 'status-indicator connected';
     
-    socket.emit('join', { user_id: currentUserId });
+    socket.emit('join', joinPayload());
+}
+
+// The server closed the socket on purpose (an idle timeout, or a restart
+// that outlived its drain window). socket.io doesn't reconnect after that on
+// its own. An idle tab in the background waits until it is shown again;
+// otherwise reconnect at a random moment so clients don't all arrive at once.
+const RECONNECT_WINDOW_MS = 10000;
+let reconnectWindowMs = RECONNECT_WINDOW_MS;
+let idleDisconnected = false;
+
+function handleIdleTimeout() {
+    debugLog('Disconnected by the server after being idle');
+    idleDisconnected = true;
+}
+
+function reconnectAfterServerDisconnect() {
+    if (idleDisconnected && document.hidden) {
+        document.addEventListener('visibilitychange', function onVisible() {
+            if (document.hidden) return;
+            document.removeEventListener('visibilitychange', onVisible);
+            idleDisconnected = false;
+            socket.connect();
+        });
+        return;
+    }
+    idleDisconnected = false;
+    setTimeout(() => socket.connect(), Math.random() * reconnectWindowMs);
+}
+
+// The server is shutting down for a deploy. Reconnect at a random moment
+// within the window it gives, so clients don't all hit the new instance at once
+function handleServerDraining(data) {
+    reconnectWindowMs = data.reconnect_window_ms || RECONNECT_WINDOW_MS;
+    const delay = Math.random() * reconnectWindowMs;
+    debugLog('Server restarting, reconnecting in ms', Math.round(delay));
+    setTimeout(() => {
+        socket.disconnect();
+        socket.connect();
+    }, delay);
 }
 
 function handleReconnectError(error) {
@@ -114,6 +207,15 @@ function handleReconnectFailed() {
 
 function handleJoined(data) {
     debugLog('Successfully joined room', data.room);
+    if (data.epoch !== undefined) {
+        lastSeq = data.epoch === outboxEpoch ? Math.max(lastSeq, data.seq) : data.seq;
+        outboxEpoch = data.epoch;
+        if (data.resync && selectedRecipient) {
+            // Missed more than the server still holds: reload the history
+            debugLog('Outbox gap, reloading conversation');
+            loadConversation(selectedRecipient);
+        }
+    }
 }
 
 function handleSocketError(data) {
@@ -121,19 +223,35 @@ function handleSocketError(data) {
     showNotification(data.message || 'An error occurred', 'error');
 }
 
+// One new_message event goes to both people in the conversation; our own
+// messages come back as the send confirmation
 function handleNewMessage(msg) {
     debugLog('Received new message', msg);
-    if (selectedRecipient && msg.sender_id == selectedRecipient) {
-        const senderName = recipient.options[recipient.selectedIndex]?.text || 'User';
+    if (msg.seq !== undefined) {
+        if (msg.seq <= lastSeq) return;   // already handled (replay overlap)
+        lastSeq = msg.seq;
+    }
+    if (!selectedRecipient) return;
+    if (msg.sender_id == currentUserId) {
+        if (msg.receiver_id == selectedRecipient) {
+            appendMessage('sent', msg.content, 'You', msg.timestamp);
+        }
+    } else if (msg.sender_id == selectedRecipient) {
+        const senderName = selectedRecipientName || 'User';
         appendMessage('received', msg.content, senderName, msg.timestamp);
     }
 }
 
-function handleMessageSent(msg) {
-    debugLog('Message sent confirmation', msg);
-    if (selectedRecipient && msg.receiver_id == selectedRecipient) {
-        appendMessage('sent', msg.content, 'You', msg.timestamp);
+// One of our saved searches matched a listing uploaded just now. It shares
+// the outbox sequence with new_message, so replays are dropped the same way
+function handleSavedSearchMatch(match) {
+    debugLog('Saved search match', match);
+    if (match.seq !== undefined) {
+        if (match.seq <= lastSeq) return;   // already handled (replay overlap)
+        lastSeq = match.seq;
     }
+    const labels = match.searches.map((s) => s.label).join(', ');
+    showNotification(`🔔 New listing for ${labels}: ${match.product.name}`, 'info');
 }
 
 // Auto-resize textarea
@@ -143,28 +261,96 @@ input.addEventListener('input', function() {
     updateSendButton();
 });
 
-// Update selected recipient when dropdown changes
-recipient.addEventListener('change', () => {
-    selectedRecipient = recipient.value;
+// Recipient typeahead: debounced lookups against /api/users/search
+const SEARCH_DEBOUNCE_MS = 200;
+let searchTimer = null;
+let searchController = null;
+
+function renderRecipientResults(users) {
+    recipientResults.innerHTML = '';
     
-    if (selectedRecipient) {
-        // Enable input and send button
-        input.disabled = false;
-        input.placeholder = `Message ${recipient.options[recipient.selectedIndex].text}...`;
-        updateSendButton();
-        
-        // Clear chat and load conversation
-        loadConversation(selectedRecipient);
-        input.focus();
-    } else {
-        // Disable input and send button
-        input.disabled = true;
-        input.placeholder = "Select a contact first...";
-        sendBtn.disabled = true;
-        showEmptyState();
+    if (users.length === 0) {
+        recipientResults.innerHTML = '<li class="recipient-result empty">No matching students</li>';
+    }
+    
+    users.forEach(user => {
+        const item = document.createElement('li');
+        item.className = 'recipient-result';
+        const name = document.createElement('strong');
+        name.textContent = user.display_name;
+        item.appendChild(name);
+        if (user.full_name) {
+            const studentId = document.createElement('span');
+            studentId.textContent = user.student_id;
+            item.appendChild(studentId);
+        }
+        item.addEventListener('mousedown', (e) => {
+            e.preventDefault();
+            selectRecipient(user.id, user.display_name);
+        });
+        recipientResults.appendChild(item);
+    });
+    
+    recipientResults.hidden = false;
+}
+
+function searchRecipients(query) {
+    // Cancel the previous request so stale results never overwrite newer ones
+    if (searchController) {
+        searchController.abort();
     }
+    searchController = new AbortController();
+    
+    fetch(`/api/users/search?q=${encodeURIComponent(query)}`, {
+        credentials: 'same-origin',
+        signal: searchController.signal
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        return response.json();
+    })
+    .then(renderRecipientResults)
+    .catch(error => {
+        if (error.name !== 'AbortError') {
+            debugLog('User search failed', error);
+        }
+    });
+}
+
+recipientSearch.addEventListener('input', () => {
+    const query = recipientSearch.value.trim();
+    clearTimeout(searchTimer);
+    
+    if (!query) {
+        recipientResults.hidden = true;
+        return;
+    }
+    searchTimer = setTimeout(() => searchRecipients(query), SEARCH_DEBOUNCE_MS);
 });
 
+recipientSearch.addEventListener('blur', () => {
+    recipientResults.hidden = true;
+});
+
+// Update selected recipient when a search result is picked
+function selectRecipient(userId, displayName) {
+    selectedRecipient = String(userId);
+    selectedRecipientName = displayName;
+    recipientSearch.value = displayName;
+    recipientResults.hidden = true;
+    
+    // Enable input and send button
+    input.disabled = false;
+    input.placeholder = `Message ${displayName}...`;
+    updateSendButton();
+    
+    // Clear chat and load conversation
+    loadConversation(selectedRecipient);
+    input.focus();
+}
+
 // Send message function
 function sendMessage() {
     const content = input.value.trim();
@@ -0,0 +1,242 @@
+// Socket.IO msgpack parser (loaded only when SOCKETIO_SERIALIZER=msgpack)
+//
+// Speaks the same packet format as python-socketio's msgpack serializer:
+// every packet is one binary frame holding a msgpack map of
+// {type, nsp, data, id}. Exposed as window.socketioMsgpackParser and
+// passed to io() as the `parser` option by socketTransportOptions().
+
+(function () {
+    const textEncoder = new TextEncoder();
+    const textDecoder = new TextDecoder();
+
+    // ---------------------------------------------------------------- encode
+
+    function encode(value) {
+        const bytes = [];
+        write(value, bytes);
+        return new Uint8Array(bytes).buffer;
+    }
+
+    function pushUint(bytes, value, size) {
+        for (let shift = (size - 1) * 8; shift >= 0; shift -= 8) {
+            bytes.push(Math.floor(value / 2 ** shift) & 0xff);
+        }
+    }
+
+    function writeHeader(bytes, length, fix, fixMax, codes) {
+        if (fix !== null && length <= fixMax) {
+            bytes.push(fix | length);
+        } else if (codes[0] !== null && length < 0x100) {
+            bytes.push(codes[0], length);
+        } else if (length < 0x10000) {
+            bytes.push(codes[1]);
+            pushUint(bytes, length, 2);
+        } else {
+            bytes.push(codes[2]);
+            pushUint(bytes, length, 4);
+        }
+    }
+
+    function write(value, bytes) {
+        if (value === null || value === undefined) {
+            bytes.push(0xc0);
+        } else if (value === false || value === true) {
+            bytes.push(value ? 0xc3 : 0xc2);
+        } else if (typeof value === 'number') {
+            writeNumber(value, bytes);
+        } else if (typeof value === 'string') {
+            const utf8 = textEncoder.encode(value);
+            writeHeader(bytes, utf8.length, 0xa0, 31, [0xd9, 0xda, 0xdb]);
+            for (const b of utf8) bytes.push(b);
+        } else if (value instanceof ArrayBuffer || ArrayBuffer.isView(value)) {
+            const raw = value instanceof ArrayBuffer
+                ? new Uint8Array(value)
+                : new Uint8Array(value.buffer, value.byteOffset, value.byteLength);
+            writeHeader(bytes, raw.length, null, 0, [0xc4, 0xc5, 0xc6]);
+            for (const b of raw) bytes.push(b);
+        } else if (Array.isArray(value)) {
+            writeHeader(bytes, value.length, 0x90, 15, [null, 0xdc, 0xdd]);
+            value.forEach(item => write(item, bytes));
+        } else if (value instanceof Date) {
+            write(value.toISOString(), bytes);
+        } else if (typeof value === 'object') {
+            const keys = Object.keys(value).filter(k => value[k] !== undefined && typeof value[k] !== 'function');
+            writeHeader(bytes, keys.length, 0x80, 15, [null, 0xde, 0xdf]);
+            keys.forEach(key => {
+                write(key, bytes);
+                write(value[key], bytes);
+            });
+        } else {
+            throw new TypeError(`Cannot encode ${typeof value} as msgpack`);
+        }
+    }
+
+    function writeNumber(value, bytes) {
+        if (Number.isInteger(value) && Math.abs(value) <= 0xffffffff) {
+            if (value >= 0) {
+                if (value < 0x80) bytes.push(value);
+                else if (value < 0x100) bytes.push(0xcc, value);
+                else if (value < 0x10000) { bytes.push(0xcd); pushUint(bytes, value, 2); }
+                else { bytes.push(0xce); pushUint(bytes, value, 4); }
+                return;
+            }
+            if (value >= -0x20) { bytes.push(value & 0xff); return; }
+            if (value >= -0x80) { bytes.push(0xd0, value & 0xff); return; }
+            if (value >= -0x8000) { bytes.push(0xd1); pushUint(bytes, value & 0xffff, 2); return; }
+            if (value >= -0x80000000) { bytes.push(0xd2); pushUint(bytes, value >>> 0, 4); return; }
+        }
+        const view = new DataView(new ArrayBuffer(8));
+        view.setFloat64(0, value);
+        bytes.push(0xcb);
+        for (let i = 0; i < 8; i++) bytes.push(view.getUint8(i));
+    }
+
+    // ---------------------------------------------------------------- decode
+
+    function decode(buffer) {
+        const bytes = buffer instanceof Uint8Array ? buffer : new Uint8Array(buffer);
+        const state = { bytes, view: new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength), pos: 0 };
+        const value = read(state);
+        if (state.pos !== bytes.length) throw new Error('Trailing bytes in msgpack packet');
+        return value;
+    }
+
+    function take(state, length) {
+        if (state.pos + length > state.bytes.length) throw new Error('Truncated msgpack packet');
+        const start = state.pos;
+        state.pos += length;
+        return start;
+    }
+
+    function readUint(state, size) {
+        const at = take(state, size);
+        if (size === 1) return state.view.getUint8(at);
+        if (size === 2) return state.view.getUint16(at);
+        if (size === 4) return state.view.getUint32(at);
+        return Number(state.view.getBigUint64(at));
+    }
+
+    function readInt(state, size) {
+        const at = take(state, size);
+        if (size === 1) return state.view.getInt8(at);
+        if (size === 2) return state.view.getInt16(at);
+        if (size === 4) return state.view.getInt32(at);
+        return Number(state.view.getBigInt64(at));
+    }
+
+    function readString(state, length) {
+        const at = take(state, length);
+        return textDecoder.decode(state.bytes.subarray(at, at + length));
+    }
+
+    function readBinary(state, length) {
+        const at = take(state, length);
+        return state.bytes.slice(at, at + length).buffer;
+    }
+
+    function readArray(state, length) {
+        const items = new Array(length);
+        for (let i = 0; i < length; i++) items[i] = read(state);
+        return items;
+    }
+
+    function readMap(state, length) {
+        const map = {};
+        for (let i = 0; i < length; i++) {
+            const key = read(state);
+            map[key] = read(state);
+        }
+        return map;
+    }
+
+    function read(state) {
+        const code = readUint(state, 1);
+        if (code < 0x80) return code;
+        if (code < 0x90) return readMap(state, code & 0x0f);
+        if (code < 0xa0) return readArray(state, code & 0x0f);
+        if (code < 0xc0) return readString(state, code & 0x1f);
+        if (code >= 0xe0) return code - 0x100;
+        switch (code) {
+            case 0xc0: return null;
+            case 0xc2: return false;
+            case 0xc3: return true;
+            case 0xc4: return readBinary(state, readUint(state, 1));
+            case 0xc5: return readBinary(state, readUint(state, 2));
+            case 0xc6: return readBinary(state, readUint(state, 4));
+            case 0xca: return state.view.getFloat32(take(state, 4));
+            case 0xcb: return state.view.getFloat64(take(state, 8));
+            case 0xcc: return readUint(state, 1);
+            case 0xcd: return readUint(state, 2);
+            case 0xce: return readUint(state, 4);
+            case 0xcf: return readUint(state, 8);
+            case 0xd0: return readInt(state, 1);
+            case 0xd1: return readInt(state, 2);
+            case 0xd2: return readInt(state, 4);
+            case 0xd3: return readInt(state, 8);
+            case 0xd9: return readString(state, readUint(state, 1));
+            case 0xda: return readString(state, readUint(state, 2));
+            case 0xdb: return readString(state, readUint(state, 4));
+            case 0xdc: return readArray(state, readUint(state, 2));
+            case 0xdd: return readArray(state, readUint(state, 4));
+            case 0xde: return readMap(state, readUint(state, 2));
+            case 0xdf: return readMap(state, readUint(state, 4));
+            default: throw new Error(`Unsupported msgpack type 0x${code.toString(16)}`);
+        }
+    }
+
+    // ---------------------------------------------------------------- parser
+
+    const PACKET_TYPES = [0, 1, 2, 3, 4, 5, 6];
+
+    class Encoder {
+        encode(packet) {
+            const { type, nsp, data, id } = packet;
+            return [encode({ type, nsp, data, id })];
+        }
+    }
+
+    class Decoder {
+        constructor() {
+            this.listeners = {};
+        }
+
+        on(event, fn) {
+            (this.listeners[event] = this.listeners[event] || []).push(fn);
+            return this;
+        }
+
+        off(event, fn) {
+            if (!event) {
+                this.listeners = {};
+            } else if (!fn) {
+                delete this.listeners[event];
+            } else if (this.listeners[event]) {
+                this.listeners[event] = this.listeners[event].filter(l => l !== fn);
+            }
+            return this;
+        }
+
+        emit(event, ...args) {
+            (this.listeners[event] || []).slice().forEach(fn => fn.apply(this, args));
+            return this;
+        }
+
+        add(chunk) {
+            if (typeof chunk === 'string') throw new Error('Expected a binary msgpack frame');
+            const packet = decode(chunk);
+            if (!PACKET_TYPES.includes(packet.type) || typeof packet.nsp !== 'string') {
+                throw new Error('Invalid Socket.IO packet');
+            }
+            if (packet.id === null) delete packet.id;
+            this.emit('decoded', packet);
+        }
+
+        destroy() {
+            this.off();
+        }
+    }
+
+    const parser = { protocol: 5, Encoder, Decoder, encode, decode };
+    if (typeof window !== 'undefined') window.socketioMsgpackParser = parser;
+    if (typeof module !== 'undefined' && module.exports) module.exports = parser;
+})();
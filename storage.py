@@ -0,0 +1,300 @@
+"""
+Image storage backends for ThriftIt.
+
+Every uploaded image (product photos and profile pictures) goes through one
+ImageStore. The store returns a reference that is saved on the model: a bare
+filename for local disk, or an absolute URL for Cloudinary and S3-compatible
+stores, which the templates already render directly.
+
+Select the backend with IMAGE_STORE = 'local' | 'cloudinary' | 's3'. When
+unset, Cloudinary is used if its credentials exist, otherwise local disk.
+For development, the S3 store works against a local MinIO server:
+
+    IMAGE_STORE=s3 S3_BUCKET=thriftit S3_ENDPOINT_URL=http://localhost:9000
+    S3_ACCESS_KEY_ID=minioadmin S3_SECRET_ACCESS_KEY=minioadmin
+
+benchmarks/bench_s3_store.py runs the S3 store's save/owns/delete round
+trip against such a server, or against an in-process moto stand-in.
+"""
+
+import os
+import secrets
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from urllib.parse import urlparse
+
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+# Read/write size used when streaming uploads
+CHUNK_SIZE = 64 * 1024
+
+def timestamped_filename(filename):
+    """Return a safe, unique, timestamp-prefixed filename for a new upload"""
+    # The random part keeps two uploads within the same second apart
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
+    return f"{timestamp}{secrets.token_hex(4)}_{secure_filename(filename)}"
+
+class ImageStore(ABC):
+    """Interface implemented by every image storage backend"""
+
+    name = 'base'
+
+    @abstractmethod
+    def save(self, file, kind):
+        """
+        Store an uploaded werkzeug FileStorage and return its reference.
+        ``kind`` is 'products' or 'profiles'.
+        """
+
+    @abstractmethod
+    def delete(self, ref):
+        """Remove a stored image; returns True if this store owned it"""
+
+    @abstractmethod
+    def owns(self, ref):
+        """Return True if ``ref`` was produced by this store"""
+
+class LocalImageStore(ImageStore):
+    """Images written to a directory and served by the /uploads route"""
+
+    name = 'local'
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, ref):
+        return os.path.join(self.root, ref)
+
+    def save(self, file, kind):
+        filename = timestamped_filename(file.filename)
+        # FileStorage.save copies the (spooled) upload in fixed-size chunks
+        file.save(self.path_for(filename), buffer_size=CHUNK_SIZE)
+        print(f"📁 Image saved locally: {filename}")
+        return filename
+
+    def owns(self, ref):
+        return bool(ref) and not ref.startswith('http') and '/' not in ref and '\\' not in ref
+
+    def delete(self, ref):
+        if not self.owns(ref):
+            return False
+        try:
+            os.remove(self.path_for(ref))
+        except FileNotFoundError:
+            pass
+        return True
+
+class CloudinaryImageStore(ImageStore):
+    """Images uploaded to Cloudinary with per-kind transformations"""
+
+    name = 'cloudinary'
+
+    TRANSFORMATIONS = {
+        'products': [
+            {"width": 800, "height": 600, "crop": "limit"},
+            {"quality": "auto:good"}
+        ],
+        'profiles': [
+            {"width": 200, "height": 200, "crop": "fill", "gravity": "face"},
+            {"quality": "auto:good"}
+        ],
+    }
+
+    def __init__(self, cloud_name, api_key, api_secret):
+        # The SDK is only imported when Cloudinary is actually configured
+        import cloudinary
+        cloudinary.config(
+            cloud_name=cloud_name,
+            api_key=api_key,
+            api_secret=api_secret,
+            secure=True
+        )
+        self.cloud_name = cloud_name
+
+    def save(self, file, kind):
+        import cloudinary.uploader
+        upload_result = cloudinary.uploader.upload(
+            file,
+            folder=f"thriftit/{kind}",
+            transformation=self.TRANSFORMATIONS.get(kind),
+            resource_type="image"
+        )
+        image_url = upload_result['secure_url']
+        print(f"✅ Image uploaded to Cloudinary: {image_url}")
+        return image_url
+
+    def owns(self, ref):
+        return bool(ref) and ref.startswith('http') and f"/{self.cloud_name}/" in ref
+
+    def public_id(self, ref):
+        """Extract the Cloudinary public_id from a delivery URL"""
+        path = urlparse(ref).path
+        _, _, tail = path.partition('/upload/')
+        parts = tail.split('/')
+        # Drop transformation and version segments such as c_limit,w_800/ v1712/
+        while parts and (',' in parts[0] or (parts[0].startswith('v') and parts[0][1:].isdigit())):
+            parts.pop(0)
+        return os.path.splitext('/'.join(parts))[0]
+
+    def delete(self, ref):
+        if not self.owns(ref):
+            return False
+        import cloudinary.uploader
+        cloudinary.uploader.destroy(self.public_id(ref), resource_type="image")
+        return True
+
+class S3ImageStore(ImageStore):
+    """
+    Images stored in an S3-compatible bucket (AWS S3, MinIO, R2, ...).
+    One boto3 client, and therefore one HTTP connection pool, is shared by all
+    requests. Uploads are streamed with multipart transfers, so a file is never
+    held in memory as a whole.
+    """
+
+    name = 's3'
+
+    def __init__(self, bucket, endpoint_url=None, region=None, access_key=None,
+                 secret_key=None, public_url=None, multipart_threshold=8 * 1024 * 1024,
+                 multipart_chunksize=8 * 1024 * 1024, max_pool_connections=10):
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.public_url = (public_url or self._default_public_url()).rstrip('/')
+        self.multipart_threshold = multipart_threshold
+        self.multipart_chunksize = multipart_chunksize
+        self.max_pool_connections = max_pool_connections
+        self._client = None
+        self._transfer_config = None
+        self._lock = threading.Lock()
+
+    def _default_public_url(self):
+        if self.endpoint_url:
+            return f"{self.endpoint_url.rstrip('/')}/{self.bucket}"
+        region = self.region or 'us-east-1'
+        return f"https://{self.bucket}.s3.{region}.amazonaws.com"
+
+    @property
+    def client(self):
+        """Create the boto3 client once and reuse it for every request"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import boto3
+                    from boto3.s3.transfer import TransferConfig
+                    from botocore.config import Config as BotoConfig
+
+                    self._transfer_config = TransferConfig(
+                        multipart_threshold=self.multipart_threshold,
+                        multipart_chunksize=self.multipart_chunksize,
+                        io_chunksize=CHUNK_SIZE,
+                        use_threads=False
+                    )
+                    client_config = {'max_pool_connections': self.max_pool_connections}
+                    if self.endpoint_url:
+                        # MinIO and most self-hosted stores expect path-style URLs
+                        client_config['s3'] = {'addressing_style': 'path'}
+                    self._client = boto3.client(
+                        's3',
+                        endpoint_url=self.endpoint_url,
+                        region_name=self.region,
+                        aws_access_key_id=self.access_key,
+                        aws_secret_access_key=self.secret_key,
+                        config=BotoConfig(**client_config)
+                    )
+        return self._client
+
+    def key_for(self, ref):
+        return ref[len(self.public_url) + 1:]
+
+    def save(self, file, kind):
+        key = f"{kind}/{timestamped_filename(file.filename)}"
+        self.client.upload_fileobj(
+            file.stream, self.bucket, key,
+            ExtraArgs={'ContentType': file.mimetype or 'application/octet-stream'},
+            Config=self._transfer_config
+        )
+        image_url = f"{self.public_url}/{key}"
+        print(f"✅ Image uploaded to object storage: {image_url}")
+        return image_url
+
+    def owns(self, ref):
+        return bool(ref) and ref.startswith(self.public_url + '/')
+
+    def delete(self, ref):
+        if not self.owns(ref):
+            return False
+        self.client.delete_object(Bucket=self.bucket, Key=self.key_for(ref))
+        return True
+
+# ============================================================================
+# STORE SELECTION
+# ============================================================================
+
+def build_image_store(app):
+    """Create the image store configured for ``app``"""
+    backend = app.config.get('IMAGE_STORE') or (
+        'cloudinary' if app.config.get('CLOUDINARY_CLOUD_NAME') else 'local'
+    )
+
+    if backend == 'cloudinary':
+        return CloudinaryImageStore(
+            cloud_name=app.config['CLOUDINARY_CLOUD_NAME'],
+            api_key=app.config.get('CLOUDINARY_API_KEY'),
+            api_secret=app.config.get('CLOUDINARY_API_SECRET')
+        )
+    if backend == 's3':
+        return S3ImageStore(
+            bucket=app.config['S3_BUCKET'],
+            endpoint_url=app.config.get('S3_ENDPOINT_URL'),
+            region=app.config.get('S3_REGION'),
+            access_key=app.config.get('S3_ACCESS_KEY_ID'),
+            secret_key=app.config.get('S3_SECRET_ACCESS_KEY'),
+            public_url=app.config.get('S3_PUBLIC_URL'),
+            multipart_threshold=app.config.get('S3_MULTIPART_THRESHOLD', 8 * 1024 * 1024),
+            multipart_chunksize=app.config.get('S3_MULTIPART_CHUNKSIZE', 8 * 1024 * 1024)
+        )
+    if backend == 'local':
+        return LocalImageStore(app.config['UPLOAD_FOLDER'])
+    raise ValueError(f"Unknown IMAGE_STORE: {backend}")
+
+def init_image_store(app):
+    """Attach the configured image store (and a local fallback) to ``app``"""
+    store = build_image_store(app)
+    local = store if isinstance(store, LocalImageStore) else LocalImageStore(app.config['UPLOAD_FOLDER'])
+    app.extensions['image_store'] = store
+    app.extensions['local_image_store'] = local
+    app.logger.info(f"🖼️  Image store: {store.name}")
+    return store
+
+def get_image_store():
+    return current_app.extensions['image_store']
+
+def save_image(file, kind):
+    """
+    Save an upload with the configured store. If a remote store fails the
+    image is written to local disk instead, so the upload still succeeds.
+    """
+    store = get_image_store()
+    try:
+        return store.save(file, kind)
+    except Exception as e:
+        local = current_app.extensions['local_image_store']
+        if store is local:
+            raise
+        print(f"⚠️ {store.name} upload failed: {str(e)}")
+        file.stream.seek(0)
+        return local.save(file, kind)
+
+def delete_image(ref):
+    """Delete an image from whichever store produced it"""
+    if not ref or ref == 'default-avatar.png':
+        return False
+    for store in (current_app.extensions['image_store'], current_app.extensions['local_image_store']):
+        if store.owns(ref):
+            return store.delete(ref)
+    return False
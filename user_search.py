@@ -0,0 +1,241 @@
+"""
+Typeahead search over the user directory.
+
+Matches a query prefix against student_id, full_name and each of its
+words, student_email and its local part (search_keys), and returns the
+top-K users, ordered by the smallest key that matched. Both backends
+return the same users in the same order.
+
+* PostgreSQL: a pg_trgm GIN index over the searchable columns narrows the
+  rows with ``LIKE '%q%'``. The prefix conditions are then checked on
+  those rows only.
+* Everything else (SQLite in development): an in-memory sorted prefix index
+  answered with a binary search. It is built on first use and extended
+  with newly registered users on every lookup, so it never rescans the table.
+  Users edited in other workers arrive as 'user' events on the invalidation
+  bus and are reloaded on the next lookup.
+"""
+
+import bisect
+import threading
+
+from sqlalchemy import select, text, literal_column, func, case
+
+from extensions import db
+from invalidation import bus
+from models import User
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+MIN_QUERY_LENGTH = 1
+
+def normalize(value):
+    return (value or '').strip().lower()
+
+def search_keys(student_id, full_name, student_email):
+    """Lower-cased strings a user can be found by"""
+    keys = {normalize(student_id), normalize(student_email)}
+    name = normalize(full_name)
+    if name:
+        keys.add(name)
+        keys.update(name.split())
+    email_local = normalize(student_email).split('@', 1)[0]
+    if email_local:
+        keys.add(email_local)
+    keys.discard('')
+    return keys
+
+class PrefixIndex:
+    """Sorted (key, user_id) pairs supporting prefix range scans"""
+
+    def __init__(self):
+        self._entries = []          # sorted list of (key, user_id)
+        self._keys_by_user = {}     # user_id -> set of keys
+        self._users = {}            # user_id -> (student_id, full_name)
+        self._max_id = 0
+        self._loaded = False
+        self._stale = set()         # user ids to reload on the next refresh
+        self._lock = threading.RLock()
+
+    def add(self, user_id, student_id, full_name, student_email, keep_sorted=True):
+        with self._lock:
+            self.remove(user_id)
+            keys = search_keys(student_id, full_name, student_email)
+            for key in keys:
+                if keep_sorted:
+                    bisect.insort(self._entries, (key, user_id))
+                else:
+                    self._entries.append((key, user_id))
+            self._keys_by_user[user_id] = keys
+            self._users[user_id] = (student_id, full_name)
+            self._max_id = max(self._max_id, user_id)
+
+    def remove(self, user_id):
+        with self._lock:
+            for key in self._keys_by_user.pop(user_id, ()):
+                i = bisect.bisect_left(self._entries, (key, user_id))
+                if i < len(self._entries) and self._entries[i] == (key, user_id):
+                    del self._entries[i]
+            self._users.pop(user_id, None)
+
+    def mark_stale(self, user_ids):
+        """Reload these users on the next refresh (no ids: rebuild the index)"""
+        with self._lock:
+            if not user_ids:
+                self._entries, self._keys_by_user, self._users = [], {}, {}
+                self._max_id = 0
+                self._loaded = False
+                self._stale.clear()
+                return
+            if self._loaded:
+                self._stale.update(user_ids)
+
+    def refresh(self):
+        """Load users registered since the last refresh (all of them the first time)"""
+        with self._lock:
+            if self._stale:
+                stale, self._stale = self._stale, set()
+                rows = db.session.execute(
+                    select(User.id, User.student_id, User.full_name, User.student_email)
+                    .where(User.id.in_(stale))
+                ).all()
+                for row in rows:
+                    self.add(*row)
+                    stale.discard(row[0])
+                for user_id in stale:
+                    self.remove(user_id)
+            rows = db.session.execute(
+                select(User.id, User.student_id, User.full_name, User.student_email)
+                .where(User.id > self._max_id)
+                .order_by(User.id)
+            ).all()
+            # The initial load appends everything and sorts once
+            for row in rows:
+                self.add(*row, keep_sorted=self._loaded)
+            if not self._loaded:
+                self._entries.sort()
+            self._loaded = True
+
+    def search(self, query, limit, exclude_id=None):
+        """
+        Up to ``limit`` (user_id, student_id, full_name) in key order, so an
+        exact match comes before longer keys sharing the prefix. Only the
+        entries actually returned are visited after the binary search.
+        """
+        with self._lock:
+            i = bisect.bisect_left(self._entries, (query,))
+            results, seen = [], set()
+            while i < len(self._entries) and self._entries[i][0].startswith(query):
+                user_id = self._entries[i][1]
+                i += 1
+                if user_id == exclude_id or user_id in seen:
+                    continue
+                seen.add(user_id)
+                results.append((user_id, *self._users[user_id]))
+                if len(results) >= limit:
+                    break
+            return results
+
+_prefix_index = PrefixIndex()
+
+# ============================================================================
+# POSTGRESQL TRIGRAM INDEX
+# ============================================================================
+
+SEARCH_DOCUMENT_SQL = (
+    "lower(student_id) || ' ' || lower(coalesce(full_name, '')) || ' ' || lower(student_email)"
+)
+
+def ensure_search_indexes():
+    """Create the pg_trgm index used by PostgreSQL searches (no-op elsewhere)"""
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    try:
+        db.session.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        db.session.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_user_search_trgm ON "user" '
+            f"USING gin (({SEARCH_DOCUMENT_SQL}) gin_trgm_ops)"
+        ))
+        db.session.commit()
+        return True
+    except Exception as e:
+        db.session.rollback()
+        print(f"⚠️  Could not create user search index: {str(e)}")
+        return False
+
+def _search_postgres(query, limit, exclude_id):
+    """The same matches, in the same order, as PrefixIndex.search"""
+    pattern = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    document = literal_column(f"({SEARCH_DOCUMENT_SQL})")
+    student_id = func.lower(User.student_id)
+    email = func.lower(User.student_email)
+    email_local = func.split_part(email, '@', 1)
+    name = func.lower(func.trim(func.coalesce(User.full_name, '')))
+    prefix = pattern + '%'
+    # The smallest word of the name starting with the query
+    words = func.regexp_split_to_table(name, r'\s+').table_valued('word')
+    name_word = (
+        select(func.min(words.c.word.collate('C')))
+        .where(words.c.word.like(prefix, escape='\\'))
+        .scalar_subquery()
+    )
+
+    def key_if(condition, key):
+        return case((condition, key))
+
+    matched_keys = [
+        key_if(student_id.like(prefix, escape='\\'), student_id),
+        key_if(email.like(prefix, escape='\\'), email),
+        key_if(email_local.like(prefix, escape='\\'), email_local),
+        key_if(name.like(prefix, escape='\\'), name),
+        name_word,
+    ]
+    # LEAST() skips NULLs: the smallest key that starts with the query,
+    # compared bytewise like Python strings
+    first_key = func.least(*matched_keys).collate('C')
+    stmt = (
+        select(User.id, User.student_id, User.full_name)
+        .where(document.like(f"%{pattern}%", escape='\\'), first_key.isnot(None))
+        .order_by(first_key, User.id)
+        .limit(limit)
+    )
+    if exclude_id is not None:
+        stmt = stmt.where(User.id != exclude_id)
+    return db.session.execute(stmt).all()
+
+# ============================================================================
+# PUBLIC API
+# ============================================================================
+
+def search_users(query, limit=DEFAULT_LIMIT, exclude_id=None):
+    """Return up to ``limit`` dicts describing users matching ``query``"""
+    query = normalize(query)[:100]
+    if len(query) < MIN_QUERY_LENGTH:
+        return []
+    limit = max(1, min(int(limit), MAX_LIMIT))
+
+    if db.engine.dialect.name == 'postgresql':
+        rows = _search_postgres(query, limit, exclude_id)
+    else:
+        _prefix_index.refresh()
+        rows = _prefix_index.search(query, limit, exclude_id)
+
+    return [
+        {
+            'id': user_id,
+            'student_id': student_id,
+            'full_name': full_name,
+            'display_name': full_name or student_id
+        }
+        for user_id, student_id, full_name in rows
+    ]
+
+def index_user(user):
+    """Update the in-memory index after a user is created or edited, here and in other workers"""
+    if _prefix_index._loaded:
+        _prefix_index.add(user.id, user.student_id, user.full_name, user.student_email)
+    bus.publish('user', user.id, local=False)
+
+@bus.on('user')
+def _reload_users(user_ids):
+    _prefix_index.mark_stale(user_ids)
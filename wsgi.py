@@ -1,14 +1,20 @@
 import os
-from app import app, socketio
 
-# This is what Gunicorn will serve
-application = socketio
+# Load environment variables before the configuration classes read them
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
 
-# Debug information
-print(f"🔌 WSGI: SocketIO async mode: {socketio.async_mode}")
-print(f"🌐 WSGI: Environment: {os.environ.get('FLASK_ENV', 'development')}")
-print(f"📡 WSGI: Port: {os.environ.get('PORT', 'not set')}")
+from app import create_app, initialize_app
+
+# This is what Gunicorn will serve. The gunicorn eventlet worker applies its
+# own monkey patch, and Socket.IO is mounted on app.wsgi_app by create_app().
+application = create_app(os.environ.get('FLASK_ENV', 'production'))
+initialize_app(application)
 
 if __name__ == "__main__":
+    from extensions import socketio
     port = int(os.environ.get('PORT', 5000))
-    socketio.run(app, host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
+    socketio.run(application, host='0.0.0.0', port=port, debug=False)